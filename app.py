@@ -1,10 +1,31 @@
 from flask import Flask, jsonify, request
 from flask_cors import CORS
+import logging
 import os
+from services import compression, metrics
+from services.json_provider import FastJSONProvider
+from services.logging_config import configure_logging, truncated
 from services.database import Database
+from services.autocomplete import autocomplete
+from services.catalog_cache import catalog_cache
+from services.locality_index import locality_index
+from services.result_cache import analytics_cache
+from services.table_versions import table_versions
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# Encode Decimal/date/time columns directly (with orjson when installed)
+app.json = FastJSONProvider(app)
+
+# Per-endpoint latency and database histograms, served at /metrics
+metrics.init_app(app)
+
+# gzip/brotli for large responses, negotiated with Accept-Encoding
+compression.init_app(app)
+
 # Configure CORS
 CORS(app, resources={
     r"/*": {
@@ -28,6 +49,8 @@ try:
     from routes.user_routes import user_routes
     from routes.order_routes import order_routes
     from routes.shopping_category_routes import shopping_category_routes
+    from routes.query_routes import query_routes
+    from routes.admin_routes import admin_routes
     
     app.register_blueprint(pet_routes, url_prefix='/api/pets')
     app.register_blueprint(product_routes, url_prefix='/api/products')
@@ -35,13 +58,13 @@ try:
     app.register_blueprint(user_routes, url_prefix='/api/users')
     app.register_blueprint(order_routes, url_prefix='/api/orders')
     app.register_blueprint(shopping_category_routes, url_prefix='/api/shopping-categories')
+    app.register_blueprint(query_routes, url_prefix='/api/queries')
+    app.register_blueprint(admin_routes, url_prefix='/api/admin')
     
-    print("All blueprints registered successfully!")
+    logger.info("All blueprints registered successfully!")
     
 except Exception as e:
-    print(f"Error importing/registering blueprints: {e}")
-    import traceback
-    traceback.print_exc()
+    logger.exception("Error importing/registering blueprints: %s", e)
 
 @app.route('/')
 def index():
@@ -52,6 +75,7 @@ def index():
         "timestamp": f"{os.environ.get('PORT', '5000')}",
         "endpoints": {
             "health": "/health",
+            "metrics": "/metrics",
             "test": "/api/test-direct",
             "auth": "/api/users/login and /api/users/register"
         }
@@ -63,12 +87,29 @@ def index():
 
 @app.route('/health')
 def health_check():
-    return jsonify({"status": "healthy", "api_version": "2.2"})
+    return jsonify({
+        "status": "healthy",
+        "api_version": "2.2",
+        "catalog_cache": catalog_cache.stats(),
+        "analytics_cache": analytics_cache.stats(),
+        "database_pool": Database().pool_stats(),
+        "compression_cache": compression.compressed_cache.stats(),
+        "autocomplete": autocomplete.stats(),
+        "locality_index": locality_index.stats(),
+        "table_versions": table_versions.stats()
+    })
+
+@app.route('/ready')
+def readiness_check():
+    """Readiness probe: 200 only when a pooled connection can run a query"""
+    result = Database().execute_query("SELECT 1")
+    if not result:
+        return jsonify({"status": "unavailable"}), 503
+    return jsonify({"status": "ready"})
 
 @app.before_request
 def log_request_info():
-    print(f"Request: {request.method} {request.url}")
-    print(f"Endpoint: {request.endpoint}")
+    logger.debug("Request: %s %s -> %s", request.method, request.url, request.endpoint)
 
 @app.route('/api/test-direct')
 def test_direct():
@@ -169,7 +210,7 @@ def test_db():
             "breed_lower": breed_lower
         })
     except Exception as e:
-        print(f"Database error: {str(e)}")
+        logger.error("Database error: %s", e)
         return jsonify({
             "status": "error",
             "message": str(e)
@@ -180,8 +221,7 @@ def test_breeds(pet_type_id):
     """Test breeds endpoint in app.py - should work like test-db"""
     try:
         db = Database()
-        print(f"=== TEST BREEDS ENDPOINT ===")
-        print(f"Pet Type ID: {pet_type_id}")
+        logger.debug("Test breeds endpoint called with pet_type_id %s", pet_type_id)
         
         # Use same approach as test-db endpoint
         query = """
@@ -193,14 +233,12 @@ def test_breeds(pet_type_id):
         """
         
         breeds = db.execute_query_with_column_names(query, (pet_type_id,))
-        print(f"Direct query result: {breeds}")
+        logger.debug("Direct query result: %s", truncated(breeds))
         
         return jsonify(breeds)
         
     except Exception as e:
-        print(f"Test breeds error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Test breeds error: %s", e)
         return jsonify({"error": str(e)}), 500
         
 @app.route('/debug-breeds/<int:pet_type_id>', methods=['GET'])
@@ -211,13 +249,12 @@ def debug_breeds(pet_type_id):
         db = Database()
         
         # Test the exact query used in pet_routes.py
-        print(f"=== DEBUG BREEDS ENDPOINT ===")
-        print(f"Pet Type ID: {pet_type_id}")
+        logger.debug("Debug breeds endpoint called with pet_type_id %s", pet_type_id)
         
         # First, let's check if pet type exists
         type_query = "SELECT * FROM PetType WHERE PetTypeID = %s"
         pet_type = db.execute_query_with_column_names(type_query, (pet_type_id,))
-        print(f"Pet Type Query Result: {pet_type}")
+        logger.debug("Pet Type Query Result: %s", truncated(pet_type))
         
         # Check breeds table structure
         structure_query = """
@@ -226,12 +263,12 @@ def debug_breeds(pet_type_id):
             WHERE table_name = 'breed'
         """
         structure = db.execute_query_with_column_names(structure_query)
-        print(f"Breed Table Structure: {structure}")
+        logger.debug("Breed Table Structure: %s", truncated(structure))
         
         # Test basic breed query
         basic_query = "SELECT * FROM Breed LIMIT 5"
         basic_breeds = db.execute_query_with_column_names(basic_query)
-        print(f"Basic Breed Query (first 5): {basic_breeds}")
+        logger.debug("Basic Breed Query (first 5): %s", truncated(basic_breeds))
         
         # Test breed count by pet type
         count_query = """
@@ -240,7 +277,7 @@ def debug_breeds(pet_type_id):
             GROUP BY PetTypeID
         """
         counts = db.execute_query_with_column_names(count_query)
-        print(f"Breed counts by pet type: {counts}")
+        logger.debug("Breed counts by pet type: %s", truncated(counts))
         
         # Test the exact problematic query
         problem_query = """
@@ -251,7 +288,7 @@ def debug_breeds(pet_type_id):
             WHERE b.PetTypeID = %s
         """
         problem_result = db.execute_query_with_column_names(problem_query, (pet_type_id,))
-        print(f"Problem Query Result: {problem_result}")
+        logger.debug("Problem Query Result: %s", truncated(problem_result))
         
         return jsonify({
             "pet_type": pet_type,
@@ -263,9 +300,7 @@ def debug_breeds(pet_type_id):
         })
         
     except Exception as e:
-        print(f"Debug error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Debug error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 if __name__ == '__main__':
@@ -274,22 +309,29 @@ if __name__ == '__main__':
         db = Database()
         db.initialize_db()
         
-        print("Starting Flask server...")
+        # Start filling in missing breed images in the background
+        from routes.pet_routes import image_prefetcher
+        image_prefetcher.start()
+        
+        # Poll the table versions behind the HTTP validators and catalog
+        # cache, and load the name autocomplete and store/vet location
+        # indexes before the first request
+        table_versions.start()
+        autocomplete.start(wait=True)
+        locality_index.start(wait=True)
+        
+        logger.info("Starting Flask server...")
         
-        # Print all registered routes for debugging
-        print("\n=== REGISTERED ROUTES ===")
+        # Log all registered routes for debugging
         for rule in app.url_map.iter_rules():
-            print(f"Route: {rule.rule} -> Methods: {rule.methods} -> Endpoint: {rule.endpoint}")
-        print("=== END ROUTES ===\n")
+            logger.debug("Route: %s -> Methods: %s -> Endpoint: %s", rule.rule, rule.methods, rule.endpoint)
         
         # Get port from environment variable for deployment
         port = int(os.environ.get('PORT', 5000))
         # Run the Flask application
         app.run(debug=False, host='0.0.0.0', port=port)
     except Exception as e:
-        print(f"Error starting server: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error starting server: %s", e)
 
 db_host = os.environ.get('DB_HOST', 'localhost')
 db_name = os.environ.get('DB_NAME', 'Project')
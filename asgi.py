@@ -0,0 +1,159 @@
+"""ASGI entry point for the HappyTails API.
+
+Serves the same Flask app and blueprints as app.py on an ASGI server:
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+Hot read endpoints with an async def twin (services/async_views.py) run
+on the event loop and query PostgreSQL through the asyncpg pool of
+services.async_database, which the lifespan events open and close. They
+hold no thread while they wait, so a process can keep thousands of them
+in flight, bounded only by the async pool for the time each spends in
+the database. Flask's before/after request hooks (metrics, compression,
+CORS) still run for them.
+
+Every other request runs the synchronous Flask handler and psycopg2
+queries in a thread of its own, so a slow request never holds up the
+event loop or other requests. ASGI_MAX_CONCURRENCY bounds those threaded
+requests (default 100). The lifespan events also run the same startup
+and shutdown work as app.py.
+"""
+import asyncio
+import io
+import logging
+import os
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from flask import request, request_started
+from werkzeug.exceptions import HTTPException
+
+from app import app
+from services.async_database import async_db
+from services.async_views import ASYNC_VIEWS
+from services.autocomplete import autocomplete
+from services.database import Database
+from services.locality_index import locality_index
+from services.table_versions import table_versions
+
+logger = logging.getLogger(__name__)
+
+
+class FlaskASGI:
+    """Adapt the Flask app to ASGI and manage startup/shutdown via lifespan"""
+
+    def __init__(self, flask_app, max_concurrency=None, async_views=None):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.async_views = ASYNC_VIEWS if async_views is None else async_views
+        self.max_concurrency = int(max_concurrency or os.environ.get('ASGI_MAX_CONCURRENCY', 100))
+        self._slots = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        view = self.async_view(scope)
+        if view is not None:
+            await self.dispatch_async(view, scope, send)
+            return
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        async with self._slots:
+            # Without a context of its own every request would share asgiref's
+            # single thread-sensitive worker thread and run one at a time
+            async with ThreadSensitiveContext():
+                await self.wsgi(scope, receive, send)
+
+    def async_view(self, scope):
+        """Return the async twin of the view scope is routed to, or None"""
+        if scope['type'] != 'http' or scope['method'] not in ('GET', 'HEAD') or not self.async_views:
+            return None
+        root_path = scope.get('root_path', '')
+        path = scope['path'][len(root_path):] if scope['path'].startswith(root_path) else scope['path']
+        adapter = self.flask_app.url_map.bind('localhost', script_name=root_path or None)
+        try:
+            endpoint, _ = adapter.match(path, scope['method'])
+        except HTTPException:
+            # 404s, 405s and redirects are left to Flask
+            return None
+        return self.async_views.get(endpoint)
+
+    async def dispatch_async(self, view, scope, send):
+        """Run an async view on the event loop with Flask's request handling around it.
+
+        Mirrors Flask.wsgi_app and full_dispatch_request, awaiting the view
+        instead of calling it.
+        """
+        adapter = WsgiToAsgiInstance(self.wsgi.wsgi_application)
+        adapter.scope = scope
+        environ = adapter.build_environ(scope, io.BytesIO())
+        flask_app = self.flask_app
+        ctx = flask_app.request_context(environ)
+        error = None
+        try:
+            try:
+                ctx.push()
+                try:
+                    request_started.send(flask_app, _async_wrapper=flask_app.ensure_sync)
+                    rv = flask_app.preprocess_request()
+                    if rv is None:
+                        rv = await view(**request.view_args)
+                except Exception as e:
+                    rv = flask_app.handle_user_exception(e)
+                response = flask_app.finalize_request(rv)
+            except Exception as e:
+                error = e
+                response = flask_app.handle_exception(e)
+            status = response.status_code
+            headers = [
+                (name.lower().encode('latin1'), value.encode('latin1'))
+                for name, value in response.get_wsgi_headers(environ).items()
+            ]
+            body = b''.join(response.get_app_iter(environ))
+        finally:
+            if error is not None and flask_app.should_ignore_error(error):
+                error = None
+            ctx.pop(error)
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await self.startup()
+                except Exception as e:
+                    logger.exception("Error during startup: %s", e)
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def startup(self):
+        """Same startup work as running app.py"""
+        from routes.pet_routes import image_prefetcher
+
+        await asyncio.to_thread(Database().initialize_db)
+        await async_db.connect()
+        image_prefetcher.start()
+        table_versions.start()
+        await asyncio.to_thread(autocomplete.start, wait=True)
+        await asyncio.to_thread(locality_index.start, wait=True)
+
+    async def shutdown(self):
+        from routes.pet_routes import image_prefetcher
+
+        image_prefetcher.stop(timeout=5)
+        table_versions.stop(timeout=5)
+        autocomplete.stop(timeout=5)
+        locality_index.stop(timeout=5)
+        await async_db.close()
+
+
+application = FlaskASGI(app)
@@ -0,0 +1,105 @@
+-- Approximate city-centre coordinates for the cities stores and vets are in.
+-- Loaded by migration 8 (services/migrations.py); Store and Vet rows get
+-- their Latitude/Longitude from here unless they are set explicitly.
+CREATE TABLE IF NOT EXISTS CityLocation (
+    City VARCHAR(100) NOT NULL,
+    State VARCHAR(100) NOT NULL,
+    Latitude DOUBLE PRECISION NOT NULL,
+    Longitude DOUBLE PRECISION NOT NULL,
+    CityKey TEXT GENERATED ALWAYS AS (normalize_place(City)) STORED,
+    StateKey TEXT GENERATED ALWAYS AS (normalize_place(State)) STORED,
+    UNIQUE (CityKey, StateKey)
+);
+
+INSERT INTO CityLocation (City, State, Latitude, Longitude) VALUES
+('Port Blair', 'Andaman and Nicobar Islands', 11.62, 92.73),
+('Amaravati', 'Andhra Pradesh', 16.51, 80.52),
+('Kurnool', 'Andhra Pradesh', 15.83, 78.04),
+('Nellore', 'Andhra Pradesh', 14.44, 79.99),
+('Vijayawada', 'Andhra Pradesh', 16.51, 80.65),
+('Visakhapatnam', 'Andhra Pradesh', 17.69, 83.22),
+('Itanagar', 'Arunachal Pradesh', 27.08, 93.61),
+('Guwahati', 'Assam', 26.14, 91.74),
+('Gaya', 'Bihar', 24.79, 85.00),
+('Muzaffarpur', 'Bihar', 26.12, 85.39),
+('Patna', 'Bihar', 25.59, 85.14),
+('Chandigarh', 'Chandigarh', 30.73, 76.78),
+('Bhilai', 'Chhattisgarh', 21.19, 81.38),
+('Bilaspur', 'Chhattisgarh', 22.08, 82.14),
+('Raipur', 'Chhattisgarh', 21.25, 81.63),
+('Daman', 'Daman and Diu', 20.40, 72.83),
+('Delhi', 'Delhi', 28.61, 77.21),
+('Panaji', 'Goa', 15.49, 73.83),
+('Ahmedabad', 'Gujarat', 23.02, 72.57),
+('Bhavnagar', 'Gujarat', 21.76, 72.15),
+('Jamnagar', 'Gujarat', 22.47, 70.06),
+('Vadodara', 'Gujarat', 22.31, 73.18),
+('Shimla', 'Himachal Pradesh', 31.10, 77.17),
+('Jammu', 'Jammu and Kashmir', 32.73, 74.86),
+('Srinagar', 'Jammu and Kashmir', 34.08, 74.80),
+('Bokaro', 'Jharkhand', 23.67, 86.15),
+('Dhanbad', 'Jharkhand', 23.80, 86.43),
+('Ranchi', 'Jharkhand', 23.34, 85.31),
+('Bangalore', 'Karnataka', 12.97, 77.59),
+('Bellary', 'Karnataka', 15.14, 76.92),
+('Gulbarga', 'Karnataka', 17.33, 76.83),
+('Mysuru', 'Karnataka', 12.30, 76.64),
+('Kochi', 'Kerala', 9.93, 76.27),
+('Kozhikode', 'Kerala', 11.26, 75.78),
+('Thiruvananthapuram', 'Kerala', 8.52, 76.94),
+('Thrissur', 'Kerala', 10.53, 76.21),
+('Kavaratti', 'Lakshadweep', 10.57, 72.64),
+('Bhopal', 'Madhya Pradesh', 23.26, 77.41),
+('Gwalior', 'Madhya Pradesh', 26.22, 78.18),
+('Indore', 'Madhya Pradesh', 22.72, 75.86),
+('Aurangabad', 'Maharashtra', 19.88, 75.34),
+('Kolhapur', 'Maharashtra', 16.70, 74.24),
+('Mumbai', 'Maharashtra', 19.08, 72.88),
+('Nagpur', 'Maharashtra', 21.15, 79.09),
+('Nashik', 'Maharashtra', 20.00, 73.79),
+('Pune', 'Maharashtra', 18.52, 73.86),
+('Thane', 'Maharashtra', 19.22, 72.98),
+('Imphal', 'Manipur', 24.82, 93.94),
+('Shillong', 'Meghalaya', 25.58, 91.89),
+('Aizawl', 'Mizoram', 23.73, 92.72),
+('Kohima', 'Nagaland', 25.67, 94.11),
+('Bhubaneswar', 'Odisha', 20.30, 85.82),
+('Cuttack', 'Odisha', 20.46, 85.88),
+('Rourkela', 'Odisha', 22.26, 84.85),
+('Puducherry', 'Puducherry', 11.94, 79.81),
+('Amritsar', 'Punjab', 31.63, 74.87),
+('Chandigarh', 'Punjab', 30.73, 76.78),
+('Jalandhar', 'Punjab', 31.33, 75.58),
+('Ludhiana', 'Punjab', 30.90, 75.86),
+('Patiala', 'Punjab', 30.34, 76.39),
+('Ajmer', 'Rajasthan', 26.45, 74.64),
+('Bikaner', 'Rajasthan', 28.02, 73.31),
+('Jaipur', 'Rajasthan', 26.91, 75.79),
+('Jodhpur', 'Rajasthan', 26.24, 73.02),
+('Udaipur', 'Rajasthan', 24.59, 73.71),
+('Gangtok', 'Sikkim', 27.33, 88.61),
+('Chennai', 'Tamil Nadu', 13.08, 80.27),
+('Coimbatore', 'Tamil Nadu', 11.02, 76.96),
+('Madurai', 'Tamil Nadu', 9.93, 78.12),
+('Tiruchirappalli', 'Tamil Nadu', 10.79, 78.70),
+('Hyderabad', 'Telangana', 17.39, 78.49),
+('Warangal', 'Telangana', 17.97, 79.59),
+('Agartala', 'Tripura', 23.83, 91.29),
+('Agra', 'Uttar Pradesh', 27.18, 78.01),
+('Aligarh', 'Uttar Pradesh', 27.88, 78.08),
+('Allahabad', 'Uttar Pradesh', 25.44, 81.85),
+('Bareilly', 'Uttar Pradesh', 28.37, 79.43),
+('Firozabad', 'Uttar Pradesh', 27.15, 78.40),
+('Gorakhpur', 'Uttar Pradesh', 26.76, 83.37),
+('Kanpur', 'Uttar Pradesh', 26.45, 80.33),
+('Loni', 'Uttar Pradesh', 28.75, 77.29),
+('Lucknow', 'Uttar Pradesh', 26.85, 80.95),
+('Meerut', 'Uttar Pradesh', 28.98, 77.71),
+('Saharanpur', 'Uttar Pradesh', 29.96, 77.55),
+('Varanasi', 'Uttar Pradesh', 25.32, 82.97),
+('Dehradun', 'Uttarakhand', 30.32, 78.03),
+('Asansol', 'West Bengal', 23.68, 86.98),
+('Durgapur', 'West Bengal', 23.52, 87.31),
+('Kolkata', 'West Bengal', 22.57, 88.36),
+('Siliguri', 'West Bengal', 26.73, 88.40)
+ON CONFLICT DO NOTHING;
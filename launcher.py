@@ -0,0 +1,112 @@
+"""Production launcher: serves the app under gunicorn's pre-fork server.
+
+    python launcher.py
+
+Configured through the environment:
+
+    PORT                        port to bind (default 5000)
+    WEB_CONCURRENCY             worker processes (default 2 x CPU cores + 1)
+    GUNICORN_THREADS            threads per worker (default 4)
+    GUNICORN_TIMEOUT            seconds before a silent worker is restarted (default 30)
+    GUNICORN_GRACEFUL_TIMEOUT   seconds workers get to finish requests on reload/stop (default 30)
+    GUNICORN_KEEPALIVE          keep-alive seconds (default 5)
+    GUNICORN_MAX_REQUESTS       recycle a worker after this many requests (default 0, never)
+    GUNICORN_PRELOAD            import the app once in the master (default true)
+
+The app is imported and migrations run once in the master. Its database
+pool is closed before workers fork, and every worker opens its own pool
+on first use, so no PostgreSQL connection is ever shared between
+processes. Send SIGHUP to the master for a graceful reload: new workers
+start before the old ones finish their in-flight requests. With
+GUNICORN_PRELOAD the application code is not re-imported on reload, so
+deploys that change code need a full restart.
+
+Orchestrators should probe /ready, which only succeeds when a pooled
+connection can run a query.
+"""
+import logging
+import multiprocessing
+import os
+
+from gunicorn.app.base import BaseApplication
+
+logger = logging.getLogger(__name__)
+
+
+def _env_bool(name, default):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes')
+
+
+def default_options():
+    """gunicorn settings derived from the environment"""
+    workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+    return {
+        'bind': f"0.0.0.0:{os.environ.get('PORT', 5000)}",
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'timeout': int(os.environ.get('GUNICORN_TIMEOUT', 30)),
+        'graceful_timeout': int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30)),
+        'keepalive': int(os.environ.get('GUNICORN_KEEPALIVE', 5)),
+        'max_requests': int(os.environ.get('GUNICORN_MAX_REQUESTS', 0)),
+        'max_requests_jitter': int(os.environ.get('GUNICORN_MAX_REQUESTS', 0)) // 10,
+        'preload_app': _env_bool('GUNICORN_PRELOAD', 'true'),
+        'accesslog': None,
+        'on_starting': on_starting,
+        'pre_fork': pre_fork,
+        'post_fork': post_fork,
+        'post_worker_init': post_worker_init,
+    }
+
+
+def on_starting(server):
+    # Runs once in the master before any worker exists
+    from services.database import Database
+    Database().initialize_db()
+
+
+def pre_fork(server, worker):
+    # Connections opened by the master (preload, migrations) must not be
+    # inherited: two processes talking over one socket corrupt the session
+    from services.database import Database
+    Database.close_pool()
+
+
+def post_fork(server, worker):
+    # The worker's database pool is opened lazily by its first query
+    from services import logging_config
+    logging_config.restart_after_fork()
+
+
+def post_worker_init(worker):
+    # Threads don't survive fork, so each worker polls its own table
+    # versions and builds its own name and location indexes once the app
+    # is loaded
+    from services.autocomplete import autocomplete
+    from services.locality_index import locality_index
+    from services.table_versions import table_versions
+    table_versions.start()
+    autocomplete.start(wait=True)
+    locality_index.start(wait=True)
+
+
+class HappyTailsApplication(BaseApplication):
+    """Embed gunicorn so settings come from the environment, not a CLI"""
+
+    def __init__(self, options=None):
+        self.options = options or default_options()
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        from app import app
+        return app
+
+
+if __name__ == '__main__':
+    HappyTailsApplication().run()
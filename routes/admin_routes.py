@@ -0,0 +1,51 @@
+from flask import Blueprint, jsonify, request
+import hmac
+import logging
+import os
+from services.slow_query_log import slow_query_log
+
+logger = logging.getLogger(__name__)
+
+admin_routes = Blueprint('admin_routes', __name__)
+
+@admin_routes.before_request
+def require_admin_token():
+    """Require ADMIN_TOKEN as a Bearer token or X-Admin-Token header.
+
+    Without ADMIN_TOKEN the admin endpoints don't exist: captured plans can
+    contain literal parameter values such as usernames and emails.
+    """
+    expected = os.environ.get('ADMIN_TOKEN')
+    if not expected:
+        return jsonify({"error": "Not found"}), 404
+
+    supplied = request.headers.get('X-Admin-Token', '')
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        supplied = auth_header[len('Bearer '):]
+
+    if not hmac.compare_digest(supplied.encode('utf-8'), expected.encode('utf-8')):
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+@admin_routes.route('/slow-queries', methods=['GET'])
+def get_slow_queries():
+    """List recorded slow statements, newest first, with any captured plans"""
+    try:
+        return jsonify({
+            "stats": slow_query_log.stats(),
+            "queries": slow_query_log.entries()
+        })
+    except Exception as e:
+        logger.error("Error in get_slow_queries: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@admin_routes.route('/slow-queries', methods=['DELETE'])
+def clear_slow_queries():
+    """Empty the slow-query log"""
+    try:
+        slow_query_log.clear()
+        return jsonify({"success": True})
+    except Exception as e:
+        logger.error("Error in clear_slow_queries: %s", e)
+        return jsonify({"error": str(e)}), 500
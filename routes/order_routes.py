@@ -1,15 +1,45 @@
 from flask import Blueprint, jsonify, request
+import logging
+from services import order_stats
 from services.database import Database
+from services.pagination import fetch_page, order_by, parse_page
+from services.streaming import stream_rows, wants_stream
+from services.order_service import EmptyCartError, InsufficientStockError, OrderService, STOCK_POLICIES
+
+logger = logging.getLogger(__name__)
 
 order_routes = Blueprint('order_routes', __name__)
 db = Database()
+order_service = OrderService(db)
+
+# Newest first; the id makes the key unique for keyset paging
+ORDER_KEYS = (('o.OrderDate', True), ('o.OrderID', True))
+
+# orderdate is sent as text in the format str() gives a datetime, as the
+# order endpoints always have: "YYYY-MM-DD HH:MM:SS", plus ".ffffff" when
+# the time has a fraction of a second
+ORDER_DATE_TEXT = """
+    to_char(o.OrderDate, 'YYYY-MM-DD HH24:MI:SS')
+    || CASE WHEN mod(date_part('microseconds', o.OrderDate)::bigint, 1000000) <> 0
+            THEN to_char(o.OrderDate, '.US') ELSE '' END
+"""
 
 @order_routes.route('/history/<username>', methods=['GET'])
 def get_order_history(username):
-    """Get order history for a user"""
+    """Get order history for a user
+
+    Pass ?limit= (and the returned next_cursor as ?after=) to page through
+    the orders, or ?stream=1 (or Accept: application/x-ndjson) to stream
+    the rows from a server-side cursor instead of building the full list.
+    """
     try:
-        query = """
-            SELECT o.OrderID as orderid, o.OrderDate as orderdate, o.Status as status, s.Name as store_name,
+        try:
+            limit, after = parse_page(request.args, len(ORDER_KEYS))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        query = f"""
+            SELECT o.OrderID as orderid, {ORDER_DATE_TEXT} as orderdate, o.Status as status, s.Name as store_name,
                    s.City as store_city, s.State as store_state,
                    COUNT(od.ProductID) as item_count,
                    SUM(p.Price * od.Quantity) as total_amount
@@ -18,18 +48,25 @@ def get_order_history(username):
             JOIN Product p ON od.ProductID = p.ProductID
             JOIN Store s ON o.StoreID = s.StoreID
             WHERE o.Username = %s
-            GROUP BY o.OrderID, o.OrderDate, o.Status, s.Name, s.City, s.State
-            ORDER BY o.OrderDate DESC
         """
-        orders = db.execute_query_with_column_names(query, (username,))
+        group_by = "GROUP BY o.OrderID, o.OrderDate, o.Status, s.Name, s.City, s.State"
+        
+        if limit is not None:
+            page = fetch_page(
+                db, query, (username,), ORDER_KEYS, ('orderdate', 'orderid'), limit, after,
+                'orders', group_by=group_by
+            )
+            return jsonify(page)
         
-        # Convert datetime objects to strings for JSON serialization
-        for order in orders:
-            if order.get('orderdate'):
-                order['orderdate'] = str(order['orderdate'])
+        query += f" {group_by} ORDER BY {order_by(ORDER_KEYS)}"
+        if wants_stream():
+            return stream_rows(db.stream_query(query, (username,)))
+        
+        orders = db.execute_query_with_column_names(query, (username,))
         
         return jsonify(orders)
     except Exception as e:
+        logger.error("Error in get_order_history: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @order_routes.route('/<int:order_id>', methods=['GET'])
@@ -37,8 +74,8 @@ def get_order_details(order_id):
     """Get details of a specific order"""
     try:
         # Get order header details
-        order_query = """
-            SELECT o.OrderID as orderid, o.Username as username, o.OrderDate as orderdate, o.Status as status, 
+        order_query = f"""
+            SELECT o.OrderID as orderid, o.Username as username, {ORDER_DATE_TEXT} as orderdate, o.Status as status, 
                    s.StoreID as storeid, s.Name as store_name, s.Address as store_address,
                    s.City as store_city, s.State as store_state
             FROM Orders o
@@ -52,10 +89,6 @@ def get_order_details(order_id):
         
         order = orders[0]
         
-        # Convert datetime objects to strings for JSON serialization
-        if order.get('orderdate'):
-            order['orderdate'] = str(order['orderdate'])
-        
         # Get order items
         items_query = """
             SELECT od.ProductID as productid, p.Name as product_name, od.Quantity as quantity,
@@ -75,6 +108,7 @@ def get_order_details(order_id):
         
         return jsonify(order)
     except Exception as e:
+        logger.error("Error in get_order_details: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @order_routes.route('/place', methods=['POST'])
@@ -84,60 +118,29 @@ def place_order():
         data = request.get_json()
         username = data.get('username')
         store_id = data.get('store_id')
+        policy = data.get('stock_policy')
         
         if not all([username, store_id]):
             return jsonify({"error": "Missing required fields"}), 400
         
-        # Get user's cart
-        cart_query = """
-            SELECT c.ProductID as productid, c.Quantity as quantity
-            FROM Cart c
-            WHERE c.Username = %s
-        """
-        cart_items = db.execute_query_with_column_names(cart_query, (username,))
+        if policy and policy not in STOCK_POLICIES:
+            return jsonify({"error": "Invalid stock policy"}), 400
         
-        if not cart_items:
+        try:
+            order = order_service.place_order(username, store_id, policy)
+        except EmptyCartError:
             return jsonify({"error": "Cart is empty"}), 400
-        
-        # Create new order
-        order_query = """
-            INSERT INTO Orders (Username, StoreID, Status)
-            VALUES (%s, %s, 'Pending')
-            RETURNING OrderID
-        """
-        result = db.execute_query(order_query, (username, store_id))
-        order_id = result[0][0]
-        
-        # Create order details for each cart item
-        for item in cart_items:
-            details_query = """
-                INSERT INTO OrderDetails (OrderID, ProductID, Quantity)
-                VALUES (%s, %s, %s)
-            """
-            db.execute_query(details_query, (order_id, item['productid'], item['quantity']), fetch=False)
-            
-            # Update product inventory in the store
-            update_inventory_query = """
-                UPDATE Supplies
-                SET Quantity = Quantity - %s
-                WHERE StoreID = %s AND ProductID = %s
-                AND Quantity >= %s
-            """
-            db.execute_query(
-                update_inventory_query, 
-                (item['quantity'], store_id, item['productid'], item['quantity']),
-                fetch=False
-            )
-        
-        # Clear the user's cart
-        clear_cart_query = "DELETE FROM Cart WHERE Username = %s"
-        db.execute_query(clear_cart_query, (username,), fetch=False)
+        except InsufficientStockError as e:
+            return jsonify({"error": str(e), "unavailable": e.product_ids}), 409
         
         return jsonify({
             "success": True,
-            "order_id": order_id
+            "order_id": order['order_id'],
+            "items": order['items'],
+            "unavailable": order['unavailable']
         })
     except Exception as e:
+        logger.error("Error in place_order: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @order_routes.route('/<int:order_id>/status', methods=['PUT'])
@@ -154,11 +157,18 @@ def update_order_status(order_id):
             return jsonify({"error": "Invalid status value"}), 400
         
         update_query = """
-            UPDATE Orders
+            UPDATE Orders o
             SET Status = %s
-            WHERE OrderID = %s
+            FROM (
+                SELECT OrderID, Status FROM Orders WHERE OrderID = %s FOR UPDATE
+            ) old
+            WHERE o.OrderID = old.OrderID
+            RETURNING old.Status
         """
-        db.execute_query(update_query, (status, order_id), fetch=False)
+        with db.transaction() as tx:
+            updated = tx.execute_query(update_query, (status, order_id))
+            if updated:
+                order_stats.move_order(tx, order_id, updated[0][0], status)
         
         return jsonify({
             "success": True,
@@ -166,4 +176,5 @@ def update_order_status(order_id):
             "status": status
         })
     except Exception as e:
+        logger.error("Error in update_order_status: %s", e)
         return jsonify({"error": str(e)}), 500 
\ No newline at end of file
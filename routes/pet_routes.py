@@ -1,92 +1,153 @@
 from flask import Blueprint, jsonify, request
+import logging
+from services.autocomplete import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS, autocomplete
 from services.database import Database
-import requests
+from services.catalog_cache import catalog_cache
+from services.http_cache import conditional
+from services.image_prefetcher import BreedImagePrefetcher
+from services.locality_index import DEFAULT_NEAREST, locality_index
+from services.logging_config import truncated
+from services.pagination import fetch_page, parse_limit, parse_page
+
+logger = logging.getLogger(__name__)
 
 pet_routes = Blueprint('pet_routes', __name__)
 db = Database()
+image_prefetcher = BreedImagePrefetcher(db)
+
+# Sort key of breed listings; the id makes it unique for keyset paging
+BREED_KEYS = (('b.BreedName', False), ('b.BreedID', False))
+
+def _load_pet_types():
+    """Load all pet types with their display descriptions"""
+    query = """
+        SELECT 
+            PetTypeID as id,
+            PetTypeName as name
+        FROM PetType
+        ORDER BY PetTypeName
+    """
+    pet_types = db.execute_query_with_column_names(query)
+    logger.debug("Loaded %d pet types: %s", len(pet_types), truncated(pet_types))
+    
+    # Add descriptions for the pet types
+    for pet_type in pet_types:
+        if pet_type['name'].lower() == 'dog':
+            pet_type['description'] = 'Loyal companions ready to join your family'
+        elif pet_type['name'].lower() == 'cat':
+            pet_type['description'] = 'Independent and loving feline friends'
+        elif pet_type['name'].lower() == 'fish':
+            pet_type['description'] = 'Peaceful aquatic pets for your home'
+        elif pet_type['name'].lower() == 'bird':
+            pet_type['description'] = 'Colorful and cheerful avian companions'
+        else:
+            pet_type['description'] = 'Find your perfect companion'
+    
+    return pet_types
 
 @pet_routes.route('/types', methods=['GET'])
+@conditional('PetType')
 def get_pet_types():
     """Get all pet types"""
-    print("=== PET TYPES ENDPOINT CALLED ===")
     try:
-        query = """
-            SELECT 
-                PetTypeID as id,
-                PetTypeName as name
-            FROM PetType
-            ORDER BY PetTypeName
-        """
-        print(f"Executing query: {query}")
-        pet_types = db.execute_query_with_column_names(query)
-        print(f"Query result: {pet_types}")
-        
-        # Add descriptions for the pet types
-        for pet_type in pet_types:
-            if pet_type['name'].lower() == 'dog':
-                pet_type['description'] = 'Loyal companions ready to join your family'
-            elif pet_type['name'].lower() == 'cat':
-                pet_type['description'] = 'Independent and loving feline friends'
-            elif pet_type['name'].lower() == 'fish':
-                pet_type['description'] = 'Peaceful aquatic pets for your home'
-            elif pet_type['name'].lower() == 'bird':
-                pet_type['description'] = 'Colorful and cheerful avian companions'
-            else:
-                pet_type['description'] = 'Find your perfect companion'
-                
-        print(f"Returning response: {pet_types}")
+        pet_types = catalog_cache.get('PetType', 'all', _load_pet_types)
         return jsonify(pet_types)
     except Exception as e:
-        print(f"Error fetching pet types: {str(e)}")  # Debug logging
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error fetching pet types: %s", e)
         return jsonify({"error": str(e)}), 500
 
+def _load_breed_rows(pet_type_id):
+    """Load a pet type and its breeds in one round trip.
+
+    The LEFT JOIN yields one row per breed, or a single row with a NULL
+    breed id when the type exists but has no breeds. No rows means the
+    pet type does not exist.
+    """
+    query = """
+        SELECT b.BreedID as id, b.BreedName as name, b.AverageLifespan as averagelifespan,
+               pt.PetTypeID as pet_type_id, pt.PetTypeName as pet_type_name
+        FROM PetType pt
+        LEFT JOIN Breed b ON pt.PetTypeID = b.PetTypeID
+        WHERE pt.PetTypeID = %s
+        ORDER BY b.BreedName, b.BreedID
+    """
+    return db.execute_query_with_column_names(query, (pet_type_id,))
+
 @pet_routes.route('/types/<int:pet_type_id>/breeds', methods=['GET'])
+@conditional('PetType', 'Breed')
 def get_breeds_by_pet_type(pet_type_id):
-    """Get all breeds for a specific pet type"""
-    print(f"=== BREEDS ENDPOINT CALLED with pet_type_id: {pet_type_id} ===")
+    """Get all breeds for a specific pet type
+
+    Pass ?limit= (and the returned next_cursor as ?after=) to page through
+    the breeds instead of receiving the full list.
+    """
     try:
-        # Use a fresh database instance like the working endpoints
-        from services.database import Database
-        fresh_db = Database()
+        try:
+            limit, after = parse_page(request.args, len(BREED_KEYS))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        # First verify the pet type exists using uppercase (like test-db endpoint)
-        type_check_query = "SELECT PetTypeID, PetTypeName FROM PetType WHERE PetTypeID = %s"
-        pet_type_result = fresh_db.execute_query_with_column_names(type_check_query, (pet_type_id,))
-        print(f"Pet type check result: {pet_type_result}")
+        rows = catalog_cache.get('Breed', pet_type_id, lambda: _load_breed_rows(pet_type_id))
         
-        if not pet_type_result:
+        if not rows:
             return jsonify({"error": f"Pet type with ID {pet_type_id} not found"}), 404
         
-        # Use the PROVEN working approach from test-db endpoint
-        # This uses JOIN like the working breeds_by_type query
+        if limit is None:
+            return jsonify([row for row in rows if row['id'] is not None])
+        
+        # Pages are read from the database so the cursor is compared in
+        # PostgreSQL's collation, the same order the full list is sorted in
         query = """
             SELECT b.BreedID as id, b.BreedName as name, b.AverageLifespan as averagelifespan,
                    pt.PetTypeID as pet_type_id, pt.PetTypeName as pet_type_name
-            FROM PetType pt
-            INNER JOIN Breed b ON pt.PetTypeID = b.PetTypeID
-            WHERE pt.PetTypeID = %s
-            ORDER BY b.BreedName
+            FROM Breed b
+            JOIN PetType pt ON pt.PetTypeID = b.PetTypeID
+            WHERE b.PetTypeID = %s
         """
-        print(f"Executing JOIN query (like test-db): {query}")
-        print(f"With parameter: {pet_type_id}")
-        
-        breeds = fresh_db.execute_query_with_column_names(query, (int(pet_type_id),))
-        print(f"JOIN query result: {breeds}")
-        print(f"Number of breeds found: {len(breeds)}")
+        return jsonify(fetch_page(db, query, (pet_type_id,), BREED_KEYS, ('name', 'id'), limit, after, 'breeds'))
+    except Exception as e:
+        logger.exception("Error in get_breeds_by_pet_type: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+def _parse_near():
+    """Return (origin, count) from ?near= and ?limit=, or (None, None) without near"""
+    near = request.args.get('near')
+    if not near:
+        return None, None
+    return locality_index.parse_near(near), parse_limit(request.args.get('limit'), DEFAULT_NEAREST)
+
+@pet_routes.route('/breeds/suggest', methods=['GET'])
+def suggest_breeds():
+    """Suggest breed names starting with ?q= (or with a word starting with it)
+
+    Served from the in-memory autocomplete index; ?limit= caps the number
+    of suggestions.
+    """
+    try:
+        try:
+            limit = min(parse_limit(request.args.get('limit'), DEFAULT_SUGGESTIONS), MAX_SUGGESTIONS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        return jsonify(breeds)
+        return jsonify(autocomplete.suggest('breeds', request.args.get('q', ''), limit))
     except Exception as e:
-        print(f"Error in get_breeds_by_pet_type: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in suggest_breeds: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @pet_routes.route('/breeds/<int:breed_id>', methods=['GET'])
+@conditional('Breed', 'PetType', 'Availability', 'Store')
 def get_breed_details(breed_id):
-    """Get details for a specific breed"""
+    """Get details for a specific breed
+
+    Pass ?near= ("lat,lon", "city" or "city,state") to list only the
+    ?limit= nearest stores with the breed (default 10), with distance_km.
+    """
     try:
+        try:
+            origin, count = _parse_near()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
         # Query to get breed details
         query = """
             SELECT b.BreedID as id, b.BreedName as name, b.AverageLifespan as averagelifespan, 
@@ -111,10 +172,13 @@ def get_breed_details(breed_id):
             WHERE a.BreedID = %s AND a.Available > 0
         """
         availability = db.execute_query_with_column_names(availability_query, (breed_id,))
+        if origin is not None:
+            availability = locality_index.sort_by_distance('stores', origin, availability, 'storeid', count)
         breed_details['availability'] = availability
         
         return jsonify(breed_details)
     except Exception as e:
+        logger.error("Error in get_breed_details: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @pet_routes.route('/available', methods=['GET'])
@@ -134,62 +198,39 @@ def get_available_pets():
         available_pets = db.execute_query_with_column_names(query)
         return jsonify(available_pets)
     except Exception as e:
+        logger.error("Error in get_available_pets: %s", e)
         return jsonify({"error": str(e)}), 500
 
 
 @pet_routes.route('/breeds/<int:breed_id>/image', methods=['GET'])
 def get_breed_image(breed_id):
-    """Get or update image for a specific breed"""
+    """Get the image for a specific breed
+
+    Only the stored ImageURL is read here. Breeds without one are handed to
+    the background image prefetcher and get the default image until it has
+    been resolved.
+    """
     try:
-        # Get breed information
         breed_query = """
-            SELECT b.BreedName, p.PetTypeName 
-            FROM Breed b
-            JOIN PetType p ON b.PetTypeID = p.PetTypeID
-            WHERE b.BreedID = %s
+            SELECT BreedID, ImageURL as imageurl
+            FROM Breed
+            WHERE BreedID = %s
         """
         breed_info = db.execute_query_with_column_names(breed_query, (breed_id,))
         
         if not breed_info:
             return jsonify({"error": "Breed not found"}), 404
             
-        breed = breed_info[0]
-        breed_name = breed['breedname'].lower()
-        pet_type = breed['pettypename'].lower()
-        
-        # Check if we already have an image URL
-        if breed.get('imageurl'):
-            return jsonify({"image_url": breed['imageurl']})
-            
-        # Fetch image based on pet type
-        image_url = None
-        if pet_type == 'dog':
-            # Use Dog CEO API
-            response = requests.get(f'https://dog.ceo/api/breed/{breed_name}/images/random')
-            if response.status_code == 200:
-                image_url = response.json()['message']
-        elif pet_type == 'cat':
-            # Use TheCatAPI
-            response = requests.get(f'https://api.thecatapi.com/v1/images/search?breed_ids={breed_name}')
-            if response.status_code == 200 and response.json():
-                image_url = response.json()[0]['url']
-        # Add more pet types as needed
-        
-        if image_url:
-            # Update the breed with the new image URL
-            update_query = """
-                UPDATE Breed
-                SET ImageURL = %s
-                WHERE BreedID = %s
-            """
-            db.execute_query(update_query, (image_url, breed_id), fetch=False)
+        image_url = breed_info[0]['imageurl']
+        if not image_url:
+            image_prefetcher.request(breed_id)
             
         return jsonify({
             "image_url": image_url or "default-breed.jpg"
         })
         
     except Exception as e:
-        print(f"Error fetching breed image: {str(e)}")
+        logger.error("Error fetching breed image: %s", e)
         return jsonify({"error": str(e)}), 500 
 
 
@@ -205,56 +246,70 @@ def adopt_pet():
         if not all([username, breed_id, store_id]):
             return jsonify({"error": "Missing required fields"}), 400
         
-        # Check if the pet is available in the specified store
-        availability_query = """
-            SELECT Available FROM Availability 
-            WHERE BreedID = %s AND StoreID = %s
-        """
-        availability = db.execute_query(availability_query, (breed_id, store_id))
-        
-        if not availability or availability[0][0] <= 0:
-            return jsonify({"error": "Pet not available at this store"}), 400
-        
-        # Create a new pet record
-        create_pet_query = """
-            INSERT INTO Pet (PetTypeID, Gender, Age, BreedID, Owner)
-            SELECT b.PetTypeID, 
-                   CASE WHEN random() > 0.5 THEN 'Male' ELSE 'Female' END,
-                   CEILING(random() * 5), 
-                   %s, 
-                   %s
-            FROM Breed b
-            WHERE b.BreedID = %s
-            RETURNING PetID
-        """
-        pet_id = db.execute_query(create_pet_query, (breed_id, username, breed_id))
-        
-        if not pet_id:
-            return jsonify({"error": "Failed to create pet record"}), 500
-        
-        # Create adoption record
-        adoption_query = """
-            INSERT INTO Adoption (Username, PetID)
-            VALUES (%s, %s)
-        """
-        db.execute_query(adoption_query, (username, pet_id[0][0]), fetch=False)
-        
-        # Update availability
-        update_query = """
-            UPDATE Availability
-            SET Available = Available - 1
-            WHERE BreedID = %s AND StoreID = %s
-        """
-        db.execute_query(update_query, (breed_id, store_id), fetch=False)
+        with db.transaction() as tx:
+            # Check if the pet is available in the specified store, locking
+            # the row so concurrent adoptions cannot oversell it
+            availability_query = """
+                SELECT Available FROM Availability 
+                WHERE BreedID = %s AND StoreID = %s
+                FOR UPDATE
+            """
+            availability = tx.execute_query(availability_query, (breed_id, store_id))
+            
+            if not availability or availability[0][0] <= 0:
+                return jsonify({"error": "Pet not available at this store"}), 400
+            
+            # Create a new pet record
+            create_pet_query = """
+                INSERT INTO Pet (PetTypeID, Gender, Age, BreedID, Owner)
+                SELECT b.PetTypeID, 
+                       CASE WHEN random() > 0.5 THEN 'Male' ELSE 'Female' END,
+                       CEILING(random() * 5), 
+                       %s, 
+                       %s
+                FROM Breed b
+                WHERE b.BreedID = %s
+                RETURNING PetID
+            """
+            pet_id = tx.execute_query(create_pet_query, (breed_id, username, breed_id))
+            
+            if not pet_id:
+                return jsonify({"error": "Failed to create pet record"}), 500
+            
+            # Create adoption record
+            adoption_query = """
+                INSERT INTO Adoption (Username, PetID)
+                VALUES (%s, %s)
+            """
+            tx.execute_query(adoption_query, (username, pet_id[0][0]), fetch=False)
+            
+            # Update availability
+            update_query = """
+                UPDATE Availability
+                SET Available = Available - 1
+                WHERE BreedID = %s AND StoreID = %s
+            """
+            tx.execute_query(update_query, (breed_id, store_id), fetch=False)
         
         return jsonify({"success": True, "pet_id": pet_id[0][0]})
     except Exception as e:
+        logger.error("Error in adopt_pet: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @pet_routes.route('/breeds/<int:breed_id>/stores', methods=['GET'])
+@conditional('Availability', 'Store')
 def get_available_stores_for_breed(breed_id):
-    """Get stores where a specific breed is available"""
+    """Get stores where a specific breed is available
+
+    Pass ?near= ("lat,lon", "city" or "city,state") for the ?limit=
+    nearest of them (default 10), with distance_km.
+    """
     try:
+        try:
+            origin, count = _parse_near()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
         query = """
             SELECT s.StoreID as id, s.Name as name, s.Address as address, 
                    s.ContactNumber as contactnumber, s.City as city, s.State as state,
@@ -265,6 +320,9 @@ def get_available_stores_for_breed(breed_id):
             ORDER BY s.Name
         """
         stores = db.execute_query_with_column_names(query, (breed_id,))
+        if origin is not None:
+            stores = locality_index.sort_by_distance('stores', origin, stores, 'id', count)
         return jsonify(stores)
     except Exception as e:
+        logger.error("Error in get_available_stores_for_breed: %s", e)
         return jsonify({"error": str(e)}), 500 
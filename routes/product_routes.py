@@ -1,10 +1,26 @@
 from flask import Blueprint, jsonify, request
+import logging
+from services.async_database import async_db
+from services.async_views import async_variant
+from services.autocomplete import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS, autocomplete
 from services.database import Database
+from services.catalog_cache import catalog_cache
+from services.http_cache import conditional
+from services.locality_index import DEFAULT_NEAREST, locality_index
+from services.pagination import fetch_page, order_by, parse_limit, parse_page
+from services.result_format import wants_compact
+from services.streaming import stream_rows, wants_stream
+
+logger = logging.getLogger(__name__)
 
 product_routes = Blueprint('product_routes', __name__)
 db = Database()
 
+# Sort key of product listings; the id makes it unique for keyset paging
+PRODUCT_KEYS = (('p.Name', False), ('p.ProductID', False))
+
 @product_routes.route('/categories', methods=['GET'])
+@conditional('ShoppingCategory')
 def get_categories():
     """Get all product categories"""
     try:
@@ -15,15 +31,24 @@ def get_categories():
             FROM ShoppingCategory
             ORDER BY CategoryName
         """
-        categories = db.execute_query_with_column_names(query)
+        categories = catalog_cache.get(
+            'ShoppingCategory', 'all',
+            lambda: db.execute_query_with_column_names(query)
+        )
         return jsonify(categories)
     except Exception as e:
-        print(f"Error fetching categories: {str(e)}")  # Debug logging
+        logger.error("Error fetching categories: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @product_routes.route('/list', methods=['GET'])
 def get_product_list():
-    """Get list of products with optional filtering"""
+    """Get list of products with optional filtering
+
+    Pass ?limit= (and the returned next_cursor as ?after=) to page through
+    the products, ?stream=1 (or Accept: application/x-ndjson) to stream
+    the rows from a server-side cursor instead of building the full list,
+    or ?format=compact for {"columns": [...], "rows": [[...], ...]}.
+    """
     try:
         # Get filter parameters
         category_id = request.args.get('category')
@@ -38,6 +63,11 @@ def get_product_list():
             pet_type_id = int(pet_type_id)
         except ValueError:
             return jsonify({"error": "Invalid category ID or pet type ID"}), 400
+        
+        try:
+            limit, after = parse_page(request.args, len(PRODUCT_KEYS))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         # Build the query
         query = """
@@ -58,34 +88,96 @@ def get_product_list():
             JOIN ShoppingCategory sc ON p.CategoryID = sc.CategoryID
             JOIN PetType pt ON p.PetTypeID = pt.PetTypeID
             WHERE p.CategoryID = %s AND p.PetTypeID = %s
-            ORDER BY p.Name
         """
         
-        products = db.execute_query_with_column_names(query, (category_id, pet_type_id))
+        if limit is not None:
+            return jsonify(fetch_page(
+                db, query, (category_id, pet_type_id), PRODUCT_KEYS, ('name', 'product_id'), limit, after,
+                'products', columnar=wants_compact()
+            ))
+        
+        query += " ORDER BY " + order_by(PRODUCT_KEYS)
+        
+        if wants_stream():
+            return stream_rows(db.stream_query(query, (category_id, pet_type_id)))
         
-        # Format prices to 2 decimal places
-        for product in products:
-            product['price'] = float(product['price'])
+        if wants_compact():
+            return jsonify(db.execute_query_columnar(query, (category_id, pet_type_id)))
+        
+        products = db.execute_query_with_column_names(query, (category_id, pet_type_id))
         
         return jsonify(products)
     except Exception as e:
-        print(f"Error in get_product_list: {str(e)}")  # Debug logging
+        logger.error("Error in get_product_list: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@product_routes.route('/suggest', methods=['GET'])
+def suggest_products():
+    """Suggest product names starting with ?q= (or with a word starting with it)
+
+    Served from the in-memory autocomplete index; ?limit= caps the number
+    of suggestions.
+    """
+    try:
+        try:
+            limit = min(parse_limit(request.args.get('limit'), DEFAULT_SUGGESTIONS), MAX_SUGGESTIONS)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        return jsonify(autocomplete.suggest('products', request.args.get('q', ''), limit))
+    except Exception as e:
+        logger.error("Error in suggest_products: %s", e)
         return jsonify({"error": str(e)}), 500
 
+PRODUCT_DETAILS_QUERY = """
+    SELECT p.ProductID as id, p.Name as name, p.Price as price, 
+           sc.CategoryID as categoryid, sc.CategoryName as category, 
+           pt.PetTypeID as pettypeid, pt.PetTypeName as pet_type
+    FROM Product p
+    JOIN ShoppingCategory sc ON p.CategoryID = sc.CategoryID
+    JOIN PetType pt ON p.PetTypeID = pt.PetTypeID
+    WHERE p.ProductID = %s
+"""
+
+PRODUCT_AVAILABILITY_QUERY = """
+    SELECT s.StoreID as storeid, s.Name as store_name, s.Address as address, 
+           s.ContactNumber as contactnumber, s.City as city, s.State as state, su.Quantity as quantity
+    FROM Supplies su
+    JOIN Store s ON su.StoreID = s.StoreID
+    WHERE su.ProductID = %s AND su.Quantity > 0
+"""
+
+CART_QUERY = """
+    SELECT c.CartID as cartid, c.ProductID as productid, p.Name as product_name, 
+           p.Price as price, c.Quantity as quantity, 
+           (p.Price * c.Quantity) as total_price
+    FROM Cart c
+    JOIN Product p ON c.ProductID = p.ProductID
+    WHERE c.Username = %s
+"""
+
+def _parse_near():
+    """Return (origin, count) for ?near= and ?limit=, or (None, None) without ?near="""
+    near = request.args.get('near')
+    if not near:
+        return None, None
+    return locality_index.parse_near(near), parse_limit(request.args.get('limit'), DEFAULT_NEAREST)
+
 @product_routes.route('/<int:product_id>', methods=['GET'])
+@conditional()
 def get_product_details(product_id):
-    """Get details for a specific product"""
+    """Get details for a specific product
+
+    Pass ?near= ("lat,lon", "city" or "city,state") to list only the
+    ?limit= nearest stores with stock (default 10), with distance_km.
+    """
     try:
-        query = """
-            SELECT p.ProductID as id, p.Name as name, p.Price as price, 
-                   sc.CategoryID as categoryid, sc.CategoryName as category, 
-                   pt.PetTypeID as pettypeid, pt.PetTypeName as pet_type
-            FROM Product p
-            JOIN ShoppingCategory sc ON p.CategoryID = sc.CategoryID
-            JOIN PetType pt ON p.PetTypeID = pt.PetTypeID
-            WHERE p.ProductID = %s
-        """
-        products = db.execute_query_with_column_names(query, (product_id,))
+        try:
+            origin, count = _parse_near()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        products = db.execute_query_with_column_names(PRODUCT_DETAILS_QUERY, (product_id,))
         
         if not products:
             return jsonify({"error": "Product not found"}), 404
@@ -93,18 +185,40 @@ def get_product_details(product_id):
         product_details = products[0]
         
         # Get store availability
-        availability_query = """
-            SELECT s.StoreID as storeid, s.Name as store_name, s.Address as address, 
-                   s.ContactNumber as contactnumber, s.City as city, s.State as state, su.Quantity as quantity
-            FROM Supplies su
-            JOIN Store s ON su.StoreID = s.StoreID
-            WHERE su.ProductID = %s AND su.Quantity > 0
-        """
-        availability = db.execute_query_with_column_names(availability_query, (product_id,))
+        availability = db.execute_query_with_column_names(PRODUCT_AVAILABILITY_QUERY, (product_id,))
+        if origin is not None:
+            availability = locality_index.sort_by_distance('stores', origin, availability, 'storeid', count)
         product_details['availability'] = availability
         
         return jsonify(product_details)
     except Exception as e:
+        logger.error("Error in get_product_details: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@async_variant(product_routes, get_product_details)
+@conditional()
+async def get_product_details_async(product_id):
+    """get_product_details on the async pool (see services/async_views.py)"""
+    try:
+        try:
+            origin, count = _parse_near()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        products = await async_db.execute_query_with_column_names(PRODUCT_DETAILS_QUERY, (product_id,))
+        
+        if not products:
+            return jsonify({"error": "Product not found"}), 404
+        
+        product_details = products[0]
+        availability = await async_db.execute_query_with_column_names(PRODUCT_AVAILABILITY_QUERY, (product_id,))
+        if origin is not None:
+            availability = locality_index.sort_by_distance('stores', origin, availability, 'storeid', count)
+        product_details['availability'] = availability
+        
+        return jsonify(product_details)
+    except Exception as e:
+        logger.error("Error in get_product_details: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @product_routes.route('/cart', methods=['GET'])
@@ -116,15 +230,7 @@ def get_cart():
         if not username:
             return jsonify({"error": "Username is required"}), 400
         
-        query = """
-            SELECT c.CartID as cartid, c.ProductID as productid, p.Name as product_name, 
-                   p.Price as price, c.Quantity as quantity, 
-                   (p.Price * c.Quantity) as total_price
-            FROM Cart c
-            JOIN Product p ON c.ProductID = p.ProductID
-            WHERE c.Username = %s
-        """
-        cart_items = db.execute_query_with_column_names(query, (username,))
+        cart_items = db.execute_query_with_column_names(CART_QUERY, (username,))
         
         # Calculate cart total
         total = sum(item['total_price'] for item in cart_items)
@@ -134,6 +240,26 @@ def get_cart():
             "total": total
         })
     except Exception as e:
+        logger.error("Error in get_cart: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@async_variant(product_routes, get_cart)
+async def get_cart_async():
+    """get_cart on the async pool (see services/async_views.py)"""
+    try:
+        username = request.args.get('username')
+        
+        if not username:
+            return jsonify({"error": "Username is required"}), 400
+        
+        cart_items = await async_db.execute_query_with_column_names(CART_QUERY, (username,))
+        
+        return jsonify({
+            "items": cart_items,
+            "total": sum(item['total_price'] for item in cart_items)
+        })
+    except Exception as e:
+        logger.error("Error in get_cart: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @product_routes.route('/cart/add', methods=['POST'])
@@ -148,31 +274,21 @@ def add_to_cart():
         if not all([username, product_id]):
             return jsonify({"error": "Missing required fields"}), 400
         
-        # Check if item already in cart
-        check_query = """
-            SELECT CartID, Quantity FROM Cart 
-            WHERE Username = %s AND ProductID = %s
+        # One line per (user, product): adding a product already in the cart
+        # raises its quantity. The unique index from migration 9 makes this
+        # safe against concurrent adds.
+        upsert_query = """
+            INSERT INTO Cart (Username, ProductID, Quantity)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (Username, ProductID)
+            DO UPDATE SET Quantity = Cart.Quantity + EXCLUDED.Quantity
         """
-        existing = db.execute_query(check_query, (username, product_id))
-        
-        if existing:
-            # Update quantity if item exists
-            update_query = """
-                UPDATE Cart
-                SET Quantity = Quantity + %s
-                WHERE CartID = %s
-            """
-            db.execute_query(update_query, (quantity, existing[0][0]), fetch=False)
-        else:
-            # Add new item to cart
-            insert_query = """
-                INSERT INTO Cart (Username, ProductID, Quantity)
-                VALUES (%s, %s, %s)
-            """
-            db.execute_query(insert_query, (username, product_id, quantity), fetch=False)
+        with db.transaction() as tx:
+            tx.execute_query(upsert_query, (username, product_id, quantity), fetch=False)
         
         return jsonify({"success": True})
     except Exception as e:
+        logger.error("Error in add_to_cart: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @product_routes.route('/cart/remove', methods=['POST'])
@@ -190,6 +306,7 @@ def remove_from_cart():
         
         return jsonify({"success": True})
     except Exception as e:
+        logger.error("Error in remove_from_cart: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @product_routes.route('/cart/update', methods=['POST'])
@@ -214,4 +331,5 @@ def update_cart_quantity():
         
         return jsonify({"success": True})
     except Exception as e:
+        logger.error("Error in update_cart_quantity: %s", e)
         return jsonify({"error": str(e)}), 500 
\ No newline at end of file
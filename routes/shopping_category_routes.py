@@ -1,10 +1,23 @@
 from flask import Blueprint, jsonify, request
+import logging
 from services.database import Database
+from services.catalog_cache import catalog_cache
+from services.http_cache import conditional
+from services.pagination import fetch_page, order_by, parse_page
+from services.product_search import SEARCH_KEY_COLUMNS, SEARCH_KEYS, ProductSearch, to_tsquery_text
+from services.result_format import wants_compact
+
+logger = logging.getLogger(__name__)
 
 shopping_category_routes = Blueprint('shopping_category_routes', __name__)
 db = Database()
+product_search = ProductSearch(db)
+
+# Sort key of product listings; the id makes it unique for keyset paging
+PRODUCT_KEYS = (('p.Name', False), ('p.ProductID', False))
 
 @shopping_category_routes.route('/list', methods=['GET'])
+@conditional('ShoppingCategory')
 def get_categories():
     """Get all shopping categories"""
     try:
@@ -13,15 +26,28 @@ def get_categories():
             FROM ShoppingCategory
             ORDER BY CategoryName
         """
-        categories = db.execute_query_with_column_names(query)
+        categories = catalog_cache.get(
+            'ShoppingCategory', 'all',
+            lambda: db.execute_query_with_column_names(query)
+        )
         return jsonify(categories)
     except Exception as e:
+        logger.error("Error in get_categories: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @shopping_category_routes.route('/<int:category_id>/products', methods=['GET'])
 def get_category_products(category_id):
-    """Get all products in a specific category"""
+    """Get all products in a specific category
+
+    Pass ?limit= (and the returned next_cursor as ?after=) to page through
+    the products instead of receiving the full list.
+    """
     try:
+        try:
+            limit, after = parse_page(request.args, len(PRODUCT_KEYS))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
         query = """
             SELECT p.ProductID as id, p.Name as name, p.Price as price,
                    pt.PetTypeName as pet_type,
@@ -30,8 +56,15 @@ def get_category_products(category_id):
             JOIN ShoppingCategory sc ON p.CategoryID = sc.CategoryID
             JOIN PetType pt ON p.PetTypeID = pt.PetTypeID
             WHERE p.CategoryID = %s
-            ORDER BY p.Name
         """
+        
+        if limit is not None:
+            page = fetch_page(db, query, (category_id,), PRODUCT_KEYS, ('name', 'id'), limit, after, 'products')
+            if not page['products'] and after is None:
+                return jsonify({"message": "No products found in this category"}), 404
+            return jsonify(page)
+        
+        query += " ORDER BY " + order_by(PRODUCT_KEYS)
         products = db.execute_query_with_column_names(query, (category_id,))
         
         if not products:
@@ -39,6 +72,7 @@ def get_category_products(category_id):
             
         return jsonify(products)
     except Exception as e:
+        logger.error("Error in get_category_products: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @shopping_category_routes.route('/<int:category_id>/stats', methods=['GET'])
@@ -65,52 +99,101 @@ def get_category_stats(category_id):
             
         return jsonify(stats[0])
     except Exception as e:
+        logger.error("Error in get_category_stats: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @shopping_category_routes.route('/search', methods=['GET'])
 def search_products_by_category():
-    """Search products within categories with filters"""
+    """Search products within categories with filters
+
+    ?search= matches whole words of the product name (the last word as a
+    prefix) and orders the results by relevance. Pass ?facets=1 to also
+    get category, pet type and price range counts for the matches,
+    ?limit= (and the returned next_cursor as ?after=) to page through the
+    results, and ?format=compact for {"columns": [...], "rows": [[...], ...]}.
+    Until migration 7 has run, ?search= is a substring match and ?facets=
+    is ignored.
+    """
     try:
         category_id = request.args.get('category_id')
         pet_type_id = request.args.get('pet_type_id')
         min_price = request.args.get('min_price')
         max_price = request.args.get('max_price')
-        search_term = request.args.get('search', '')
+        search_term = request.args.get('search', '').strip()
+        # Ranking and facets need Product.SearchVector (migration 7); until
+        # it exists every search is a plain substring listing
+        full_text = Database.schema_at_least(7)
+        with_facets = full_text and request.args.get('facets', '').lower() in ('1', 'true')
         
-        query = """
-            SELECT p.ProductID as id, p.Name as name, p.Price as price,
-                   sc.CategoryName as category,
-                   pt.PetTypeName as pet_type
-            FROM Product p
-            JOIN ShoppingCategory sc ON p.CategoryID = sc.CategoryID
-            JOIN PetType pt ON p.PetTypeID = pt.PetTypeID
-            WHERE 1=1
-        """
-        params = []
+        filters = {
+            'category_id': int(category_id) if category_id else None,
+            'pet_type_id': int(pet_type_id) if pet_type_id else None,
+            'min_price': float(min_price) if min_price else None,
+            'max_price': float(max_price) if max_price else None
+        }
+        ranked = with_facets or (full_text and to_tsquery_text(search_term) is not None)
         
-        if category_id:
-            query += " AND p.CategoryID = %s"
-            params.append(int(category_id))
+        try:
+            limit, after = parse_page(request.args, len(SEARCH_KEYS if ranked else PRODUCT_KEYS))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        if pet_type_id:
-            query += " AND p.PetTypeID = %s"
-            params.append(int(pet_type_id))
+        if with_facets:
+            return jsonify(product_search.search(search_term, filters, limit, after))
         
-        if min_price:
-            query += " AND p.Price >= %s"
-            params.append(float(min_price))
+        if ranked:
+            query, params = product_search.listing_query(search_term, filters)
+            keys, key_columns = SEARCH_KEYS, SEARCH_KEY_COLUMNS
+        else:
+            query = """
+                SELECT p.ProductID as id, p.Name as name, p.Price as price,
+                       sc.CategoryName as category,
+                       pt.PetTypeName as pet_type
+                FROM Product p
+                JOIN ShoppingCategory sc ON p.CategoryID = sc.CategoryID
+                JOIN PetType pt ON p.PetTypeID = pt.PetTypeID
+                WHERE 1=1
+            """
+            params = []
+            
+            if filters['category_id'] is not None:
+                query += " AND p.CategoryID = %s"
+                params.append(filters['category_id'])
+            
+            if filters['pet_type_id'] is not None:
+                query += " AND p.PetTypeID = %s"
+                params.append(filters['pet_type_id'])
+            
+            if filters['min_price'] is not None:
+                query += " AND p.Price >= %s"
+                params.append(filters['min_price'])
+            
+            if filters['max_price'] is not None:
+                query += " AND p.Price <= %s"
+                params.append(filters['max_price'])
+            
+            # A term with no words (e.g. punctuation) can't go through the
+            # text index, so it is matched as a substring, as is every term
+            # before migration 7
+            if search_term:
+                query += " AND p.Name ILIKE %s"
+                params.append(f'%{search_term}%')
+            
+            keys, key_columns = PRODUCT_KEYS, ('name', 'id')
         
-        if max_price:
-            query += " AND p.Price <= %s"
-            params.append(float(max_price))
+        if limit is not None:
+            return jsonify(fetch_page(
+                db, query, params, keys, key_columns, limit, after,
+                'products', columnar=wants_compact()
+            ))
         
-        if search_term:
-            query += " AND p.Name ILIKE %s"
-            params.append(f'%{search_term}%')
+        query += " ORDER BY " + order_by(keys)
         
-        query += " ORDER BY p.Name"
+        if wants_compact():
+            return jsonify(db.execute_query_columnar(query, tuple(params)))
         
         products = db.execute_query_with_column_names(query, tuple(params))
         return jsonify(products)
     except Exception as e:
+        logger.error("Error in search_products_by_category: %s", e)
         return jsonify({"error": str(e)}), 500 
\ No newline at end of file
@@ -1,6 +1,9 @@
 from flask import Blueprint, jsonify, request
 from werkzeug.security import generate_password_hash, check_password_hash
 from services.database import Database
+import logging
+
+logger = logging.getLogger(__name__)
 
 user_routes = Blueprint('user_routes', __name__)
 db = Database()
@@ -34,7 +37,7 @@ def login():
         }), 200
             
     except Exception as e:
-        print(f"Login error: {str(e)}")  # Debug log
+        logger.error("Login error: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @user_routes.route('/register', methods=['POST'])
@@ -78,6 +81,7 @@ def register():
         return jsonify({"message": "Registration successful"}), 201
 
     except Exception as e:
+        logger.error("Error in register: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @user_routes.route('/profile/<username>', methods=['GET'])
@@ -129,7 +133,7 @@ def get_profile(username):
         return jsonify(user)
         
     except Exception as e:
-        print(f"Error getting profile: {str(e)}")
+        logger.error("Error getting profile: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @user_routes.route('/profile/<username>', methods=['PUT'])
@@ -184,4 +188,5 @@ def update_profile(username):
             "username": username
         })
     except Exception as e:
+        logger.error("Error in update_profile: %s", e)
         return jsonify({"error": str(e)}), 500 
@@ -1,13 +1,72 @@
 from flask import Blueprint, jsonify, request
+import itertools
+import logging
+from services.async_database import async_db
+from services.async_views import async_variant
 from services.database import Database
+from services.http_cache import conditional
+from services.locality_index import DEFAULT_NEAREST, distance_sql, locality_index
+from services.pagination import fetch_page, order_by, parse_limit, parse_page
+
+logger = logging.getLogger(__name__)
 
 vet_routes = Blueprint('vet_routes', __name__)
 db = Database()
 
+# Best rated first; the id makes the key unique for keyset paging
+VET_KEYS = (('Rating', True), ('Name', False), ('VetID', False))
+
+# Nearest vets checked against the filters before falling back to SQL
+NEAREST_CANDIDATES_FACTOR = 4
+
+def _nearest_vets(query, params, origin, count):
+    """Return the count vets matching query nearest to origin, with distance_km.
+
+    The count * NEAREST_CANDIDATES_FACTOR vets nearest origin are taken
+    from the locality index and checked against the query's filters in
+    one query. If too few of them match (e.g. a state filter far from
+    origin), a second query ranks the matching vets by distance instead,
+    so at most two queries run however selective the filters are.
+    """
+    candidates = list(itertools.islice(locality_index.nearest('vets', origin), count * NEAREST_CANDIDATES_FACTOR))
+    distances = {vet_id: distance for distance, vet_id in candidates}
+    rows = db.execute_query_with_column_names(query + " AND VetID = ANY(%s)", tuple(params) + (list(distances),))
+    # A short candidate list means the index had no other vets to offer
+    if len(rows) >= count or len(candidates) < count * NEAREST_CANDIDATES_FACTOR:
+        for row in rows:
+            row['distance_km'] = distances[row['id']]
+    else:
+        distance, distance_params = distance_sql(origin, 'loc.Latitude', 'loc.Longitude')
+        ranked_query = f"""
+            SELECT m.*, {distance} as distance_km
+            FROM ({query}) m
+            JOIN Vet loc ON loc.VetID = m.id
+            WHERE loc.Latitude IS NOT NULL AND loc.Longitude IS NOT NULL
+            ORDER BY distance_km, m.id
+            LIMIT %s
+        """
+        rows = db.execute_query_with_column_names(ranked_query, tuple(distance_params + list(params) + [count]))
+    rows.sort(key=lambda row: (row['distance_km'], row['id']))
+    for row in rows:
+        row['distance_km'] = round(row['distance_km'], 1)
+    return rows[:count]
+
 @vet_routes.route('/list', methods=['GET'])
+@conditional('Vet')
 def get_vet_list():
-    """Get list of vets with optional filtering"""
+    """Get list of vets with optional filtering
+
+    Pass ?limit= (and the returned next_cursor as ?after=) to page through
+    the vets instead of receiving the full list, or ?near= ("lat,lon",
+    "city" or "city,state") for the ?limit= nearest vets (default 10)
+    with their distance_km.
+    """
     try:
+        try:
+            limit, after = parse_page(request.args, len(VET_KEYS))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
         # Get filter parameters
         city = request.args.get('city')
         state = request.args.get('state')
@@ -30,66 +89,94 @@ def get_vet_list():
             params.append(f'%{city}%')
         
         if state:
-            query += " AND State = %s"
+            # StateKey (migration 8) ignores case and spacing; until it
+            # exists the state has to match exactly
+            if Database.schema_at_least(8):
+                query += " AND StateKey = normalize_place(%s)"
+            else:
+                query += " AND State = %s"
             params.append(state)
         
         if rating:
             query += " AND Rating >= %s"
             params.append(float(rating))
         
+        near = request.args.get('near')
+        if near:
+            try:
+                origin = locality_index.parse_near(near)
+                count = parse_limit(request.args.get('limit'), DEFAULT_NEAREST)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            return jsonify(_nearest_vets(query, params, origin, count))
+        
+        if limit is not None:
+            return jsonify(fetch_page(db, query, params, VET_KEYS, ('rating', 'name', 'id'), limit, after, 'vets'))
+        
         # Add ordering
-        query += " ORDER BY Rating DESC, Name"
+        query += " ORDER BY " + order_by(VET_KEYS)
         
         vets = db.execute_query_with_column_names(query, tuple(params))
         
-        # Convert time objects to strings for JSON serialization
-        for vet in vets:
-            if vet.get('openingtime'):
-                vet['openingtime'] = str(vet['openingtime'])
-            if vet.get('closingtime'):
-                vet['closingtime'] = str(vet['closingtime'])
-        
         return jsonify(vets)
     except Exception as e:
+        logger.error("Error in get_vet_list: %s", e)
         return jsonify({"error": str(e)}), 500
 
+VET_DETAILS_QUERY = """
+    SELECT VetID as id, Name as name, ContactNumber as contactnumber, Address as address, City as city, State as state,
+           Rating as rating, OpeningTime as openingtime, ClosingTime as closingtime
+    FROM Vet
+    WHERE VetID = %s
+"""
+
+# Available services (mock data since we don't have services table)
+VET_SERVICES = [
+    {"id": 1, "name": "General Check-up", "price": 50.00},
+    {"id": 2, "name": "Vaccination", "price": 35.00},
+    {"id": 3, "name": "Dental Cleaning", "price": 80.00},
+    {"id": 4, "name": "Microchipping", "price": 45.00},
+    {"id": 5, "name": "Spay/Neuter", "price": 150.00}
+]
+
 @vet_routes.route('/<int:vet_id>', methods=['GET'])
+@conditional('Vet')
 def get_vet_details(vet_id):
     """Get details for a specific vet"""
     try:
-        query = """
-            SELECT VetID as id, Name as name, ContactNumber as contactnumber, Address as address, City as city, State as state,
-                   Rating as rating, OpeningTime as openingtime, ClosingTime as closingtime
-            FROM Vet
-            WHERE VetID = %s
-        """
-        vets = db.execute_query_with_column_names(query, (vet_id,))
+        vets = db.execute_query_with_column_names(VET_DETAILS_QUERY, (vet_id,))
         
         if not vets:
             return jsonify({"error": "Vet not found"}), 404
         
         vet_details = vets[0]
+        vet_details['services'] = VET_SERVICES
+        
+        return jsonify(vet_details)
+    except Exception as e:
+        logger.error("Error in get_vet_details: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@async_variant(vet_routes, get_vet_details)
+@conditional('Vet')
+async def get_vet_details_async(vet_id):
+    """get_vet_details on the async pool (see services/async_views.py)"""
+    try:
+        vets = await async_db.execute_query_with_column_names(VET_DETAILS_QUERY, (vet_id,))
         
-        # Convert time objects to strings for JSON serialization
-        if vet_details.get('openingtime'):
-            vet_details['openingtime'] = str(vet_details['openingtime'])
-        if vet_details.get('closingtime'):
-            vet_details['closingtime'] = str(vet_details['closingtime'])
-        
-        # Add available services (mock data since we don't have services table)
-        vet_details['services'] = [
-            {"id": 1, "name": "General Check-up", "price": 50.00},
-            {"id": 2, "name": "Vaccination", "price": 35.00},
-            {"id": 3, "name": "Dental Cleaning", "price": 80.00},
-            {"id": 4, "name": "Microchipping", "price": 45.00},
-            {"id": 5, "name": "Spay/Neuter", "price": 150.00}
-        ]
+        if not vets:
+            return jsonify({"error": "Vet not found"}), 404
+        
+        vet_details = vets[0]
+        vet_details['services'] = VET_SERVICES
         
         return jsonify(vet_details)
     except Exception as e:
+        logger.error("Error in get_vet_details: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @vet_routes.route('/cities', methods=['GET'])
+@conditional('Vet')
 def get_cities():
     """Get list of cities with vets for filtering"""
     try:
@@ -101,9 +188,11 @@ def get_cities():
         cities = db.execute_query(query)
         return jsonify([city[0] for city in cities])
     except Exception as e:
+        logger.error("Error in get_cities: %s", e)
         return jsonify({"error": str(e)}), 500
 
 @vet_routes.route('/states', methods=['GET'])
+@conditional('Vet')
 def get_states():
     """Get list of states with vets for filtering"""
     try:
@@ -115,4 +204,5 @@ def get_states():
         states = db.execute_query(query)
         return jsonify([state[0] for state in states])
     except Exception as e:
+        logger.error("Error in get_states: %s", e)
         return jsonify({"error": str(e)}), 500 
\ No newline at end of file
@@ -0,0 +1,179 @@
+import asyncio
+import functools
+import logging
+import os
+import re
+import time
+from contextlib import asynccontextmanager
+
+from services import metrics
+from services.slow_query_log import slow_query_log
+
+try:
+    import asyncpg
+except ImportError:  # Only needed when serving through asgi.py
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER = re.compile(r"%%|%s")
+
+
+@functools.lru_cache(maxsize=512)
+def translate_placeholders(query):
+    """Rewrite psycopg2-style %s placeholders as asyncpg's $1, $2, ...
+
+    %% is unescaped to a literal %, so the same SQL strings work with both
+    Database and AsyncDatabase.
+    """
+    counter = 0
+
+    def replace(match):
+        nonlocal counter
+        if match.group(0) == '%%':
+            return '%'
+        counter += 1
+        return f"${counter}"
+
+    return _PLACEHOLDER.sub(replace, query)
+
+
+def _prepare(query, params):
+    if not params:
+        # Without params psycopg2 leaves the SQL untouched, % signs included
+        return query, ()
+    return translate_placeholders(query), tuple(params)
+
+
+def _rowcount(status):
+    # asyncpg reports the command tag, e.g. "UPDATE 3" or "INSERT 0 1"
+    try:
+        return int(status.rsplit(' ', 1)[-1])
+    except (AttributeError, ValueError):
+        return -1
+
+
+async def _run(connection, query, params=None, fetch=True):
+    sql, args = _prepare(query, params)
+    started = time.perf_counter()
+    if fetch:
+        result = await connection.fetch(sql, *args)
+        row_count = len(result)
+    else:
+        result = _rowcount(await connection.execute(sql, *args))
+        row_count = 0
+    duration = time.perf_counter() - started
+    metrics.record_query(duration, row_count)
+    slow_query_log.record(query, params, duration, row_count)
+    return result
+
+
+class AsyncTransaction:
+    """Async counterpart of services.database.Transaction"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    async def execute_query(self, query, params=None, fetch=True):
+        """Execute a query and optionally fetch results"""
+        result = await _run(self.connection, query, params, fetch)
+        return [tuple(row) for row in result] if fetch else result
+
+    async def execute_query_with_column_names(self, query, params=None):
+        """Execute a query and return results with column names"""
+        return [dict(row) for row in await _run(self.connection, query, params)]
+
+
+class AsyncDatabase:
+    """asyncio PostgreSQL service mirroring the Database API, backed by asyncpg.
+
+    Takes the same DB_* settings and SQL (with %s placeholders) as
+    Database. Queries return tuples or dicts like their psycopg2
+    counterparts, and errors are logged and turned into None/[] in the same
+    way. The pool belongs to the event loop that called connect(); from any
+    other loop (e.g. an async view under the threaded development server)
+    a short-lived connection is used instead.
+    """
+
+    def __init__(self, min_size=None, max_size=None):
+        self.min_size = int(min_size or os.environ.get('DB_POOL_MIN', 1))
+        self.max_size = int(max_size or os.environ.get('DB_POOL_MAX', 20))
+        self._pool = None
+        self._loop = None
+
+    def _connect_kwargs(self):
+        return {
+            'host': os.environ.get('DB_HOST', 'localhost'),
+            'database': os.environ.get('DB_NAME', 'data'),
+            'user': os.environ.get('DB_USER', 'postgres'),
+            'password': os.environ.get('DB_PASSWORD', 'simar232'),
+            'port': int(os.environ.get('DB_PORT', '5432'))
+        }
+
+    async def connect(self):
+        """Create the connection pool on the running event loop"""
+        if asyncpg is None:
+            raise RuntimeError("asyncpg is required for AsyncDatabase; install it with pip install asyncpg")
+        if self._pool is None:
+            self._pool = await asyncpg.create_pool(
+                min_size=self.min_size,
+                max_size=self.max_size,
+                timeout=float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+                max_inactive_connection_lifetime=float(os.environ.get('DB_POOL_RECYCLE', 1800)),
+                **self._connect_kwargs()
+            )
+            self._loop = asyncio.get_running_loop()
+            logger.info("Async PostgreSQL connection pool created successfully")
+
+    async def close(self):
+        """Close the connection pool"""
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+            self._loop = None
+
+    @asynccontextmanager
+    async def _acquire(self):
+        if self._pool is not None and self._loop is asyncio.get_running_loop():
+            async with self._pool.acquire() as connection:
+                yield connection
+            return
+        if asyncpg is None:
+            raise RuntimeError("asyncpg is required for AsyncDatabase; install it with pip install asyncpg")
+        connection = await asyncpg.connect(**self._connect_kwargs())
+        try:
+            yield connection
+        finally:
+            await connection.close()
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Pin one connection for a block of statements, committing on success
+
+            async with adb.transaction() as tx:
+                await tx.execute_query(...)
+        """
+        async with self._acquire() as connection:
+            async with connection.transaction():
+                yield AsyncTransaction(connection)
+
+    async def execute_query(self, query, params=None, fetch=True):
+        """Execute a query and optionally fetch results"""
+        try:
+            async with self._acquire() as connection:
+                return await AsyncTransaction(connection).execute_query(query, params, fetch)
+        except Exception as e:
+            logger.error("Database error: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            return None
+
+    async def execute_query_with_column_names(self, query, params=None):
+        """Execute a query and return results with column names"""
+        try:
+            async with self._acquire() as connection:
+                return await AsyncTransaction(connection).execute_query_with_column_names(query, params)
+        except Exception as e:
+            logger.error("Database error: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
+            return []
+
+
+async_db = AsyncDatabase()
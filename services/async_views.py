@@ -0,0 +1,18 @@
+# async def twins of Flask views, keyed by the endpoint they stand in for.
+#
+# Under asgi.py a GET or HEAD request whose endpoint has a twin here is
+# dispatched to it directly on the server's event loop, so it awaits
+# services.async_database.async_db instead of holding a thread and a
+# psycopg2 connection while it waits. Every other request, and every
+# request under app.py or gunicorn, runs the synchronous view. A twin
+# takes the same URL arguments and returns the same response.
+
+ASYNC_VIEWS = {}
+
+
+def async_variant(blueprint, view):
+    """Register the decorated async def view as the ASGI twin of blueprint's view"""
+    def decorator(async_view):
+        ASYNC_VIEWS[f"{blueprint.name}.{view.__name__}"] = async_view
+        return async_view
+    return decorator
@@ -0,0 +1,102 @@
+import bisect
+import os
+import re
+
+from services.database import Database
+from services.versioned_index import VersionedIndexes
+
+_WORD = re.compile(r'[^\W_]+')
+
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+
+
+def normalize(text):
+    """Case-fold text and collapse whitespace, as keys and queries are compared"""
+    return ' '.join(text.casefold().split())
+
+
+class PrefixIndex:
+    """Sorted-array prefix index over (id, name) pairs.
+
+    Names are matched from their start and from the start of every later
+    word, so "food" suggests "Premium Dog Food". Matches on the whole name
+    rank first, then matches on a later word, each in order of the matched
+    text. A lookup is a bisect plus a scan of at most the returned entries.
+    """
+
+    def __init__(self, rows=()):
+        """Index rows of (id, name)"""
+        names = []
+        words = []
+        for item_id, name in rows:
+            if not name:
+                continue
+            key = normalize(name)
+            names.append((key, name, item_id))
+            for match in _WORD.finditer(key):
+                if match.start() > 0:
+                    words.append((key[match.start():], name, item_id))
+        names.sort()
+        words.sort()
+        # sorted lists of (key, name, id)
+        self._entries = (names, words)
+
+    def __len__(self):
+        return len(self._entries[0])
+
+    def suggest(self, prefix, limit=10):
+        """Return up to limit {"id", "name"} dicts whose name or a word of it starts with prefix"""
+        prefix = normalize(prefix)
+        if not prefix or limit <= 0:
+            return []
+        results = []
+        seen = set()
+        for entries in self._entries:
+            i = bisect.bisect_left(entries, (prefix,))
+            while i < len(entries) and len(results) < limit:
+                key, name, item_id = entries[i]
+                if not key.startswith(prefix):
+                    break
+                if item_id not in seen:
+                    seen.add(item_id)
+                    results.append({"id": item_id, "name": name})
+                i += 1
+        return results
+
+
+class Autocomplete(VersionedIndexes):
+    """Prefix indexes over catalog names, kept current in the background.
+
+    Lookups never touch the database; see VersionedIndexes for how the
+    indexes are built and refreshed.
+    """
+
+    def __init__(self, db, interval=None):
+        super().__init__(
+            db, float(interval or os.environ.get('AUTOCOMPLETE_REFRESH_INTERVAL', 30)), 'autocomplete'
+        )
+
+    def add_source(self, name, table, query):
+        """Add an index fed by query, which selects (id, name) rows from table"""
+        def load():
+            rows = self.db.execute_query(query)
+            if rows is None:
+                # execute_query returns None on errors
+                return None
+            return PrefixIndex(rows)
+        self.register(name, table, load, PrefixIndex())
+
+    def suggest(self, name, prefix, limit=10):
+        """Return suggestions for prefix from the named index.
+
+        Never waits for a build: before the first one finishes the index
+        is empty and so are the suggestions.
+        """
+        self.ensure_started()
+        return self.indexes[name].suggest(prefix, limit)
+
+
+autocomplete = Autocomplete(Database())
+autocomplete.add_source('products', 'Product', "SELECT ProductID, Name FROM Product")
+autocomplete.add_source('breeds', 'Breed', "SELECT BreedID, BreedName FROM Breed")
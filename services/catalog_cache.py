@@ -0,0 +1,84 @@
+import os
+import threading
+import time
+
+from services.table_versions import table_versions
+
+
+class CatalogCache:
+    """In-process read-through cache for small reference tables
+    (PetType, Breed, ShoppingCategory).
+
+    Entries are grouped by table so a write to a table can drop every
+    entry derived from it with a single ``invalidate(table)`` call. With
+    version_of, a function returning a table's current version, each
+    entry is also tagged with the version it was loaded under and is only
+    served while that version is current, so writes made by other
+    processes retire it as well.
+    """
+
+    def __init__(self, ttl=None, version_of=None):
+        self.ttl = float(ttl if ttl is not None else os.environ.get('CATALOG_CACHE_TTL', 300))
+        self.version_of = version_of
+        self._entries = {}
+        # Bumped by every invalidation; a load that overlapped one may
+        # have read rows from before the write and is not stored
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, table, key, loader, ttl=None):
+        """Return the cached value for (table, key), calling loader() on a miss"""
+        # Read before loading: rows loaded now are at least this new
+        version = self.version_of(table) if self.version_of is not None else None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((table, key))
+            if entry is not None and entry[0] > now and entry[2] == version:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        value = loader()
+
+        # Database helpers return an empty list on errors, so empty results
+        # are never cached; the next request simply retries the query.
+        if value:
+            expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+            with self._lock:
+                if generation == self._generation:
+                    self._entries[(table, key)] = (expires_at, value, version)
+        return value
+
+    def invalidate(self, table, key=None):
+        """Drop one entry, or every entry for a table when key is None"""
+        with self._lock:
+            self._generation += 1
+            if key is not None:
+                self._entries.pop((table, key), None)
+            else:
+                for entry_key in [k for k in self._entries if k[0] == table]:
+                    del self._entries[entry_key]
+
+    def clear(self):
+        """Drop every cached entry"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "entries": len(self._entries),
+                "ttl_seconds": self.ttl
+            }
+
+
+catalog_cache = CatalogCache(version_of=table_versions.version)
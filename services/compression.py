@@ -0,0 +1,142 @@
+import collections
+import gzip
+import hashlib
+import os
+import threading
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/html', 'text/csv')
+
+# Bodies smaller than this are sent as is; compression wouldn't pay for itself
+MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies keyed by encoding and a digest of the body.
+
+    Cached endpoints return byte-identical bodies until their data changes,
+    so each distinct payload is compressed once per encoding and then
+    served from here. Bounded by total compressed size.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = int(max_bytes if max_bytes is not None else os.environ.get('COMPRESS_CACHE_BYTES', 16 * 1024 * 1024))
+        self._entries = collections.OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, encoding, body, compress):
+        """Return body compressed with encoding, compressing it with compress() on a miss"""
+        if self.max_bytes <= 0:
+            return compress(body)
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compressed
+            self.misses += 1
+
+        compressed = compress(body)
+        if len(compressed) <= self.max_bytes:
+            with self._lock:
+                if key not in self._entries:
+                    self._entries[key] = compressed
+                    self._size += len(compressed)
+                    while self._size > self.max_bytes:
+                        _, evicted = self._entries.popitem(last=False)
+                        self._size -= len(evicted)
+        return compressed
+
+    def stats(self):
+        """Return hit/miss counters and the current size"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._size
+            }
+
+
+compressed_cache = CompressedBodyCache()
+
+
+def _gzip(body):
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _brotli(body):
+    return brotli.compress(body, quality=BROTLI_QUALITY)
+
+
+def _gzip_stream(chunks):
+    # wbits=31 writes a gzip header and trailer; each chunk is flushed so
+    # streamed rows reach the client as they are produced
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _negotiate():
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def compress_response(response):
+    """after_request hook: compress eligible responses the client can decode"""
+    if (
+        response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or response.direct_passthrough
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or request.method == 'HEAD'
+    ):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _negotiate()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        # Length is unknown up front, so streams are always compressed
+        # (gzip, which can be flushed chunk by chunk)
+        if request.accept_encodings['gzip'] <= 0:
+            return response
+        response.response = _gzip_stream(response.iter_encoded())
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers.pop('Content-Length', None)
+        return response
+
+    body = response.get_data()
+    if len(body) < MIN_SIZE:
+        return response
+
+    compressed = compressed_cache.get(encoding, body, _brotli if encoding == 'br' else _gzip)
+    if len(compressed) >= len(body):
+        return response
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_app(app):
+    """Compress responses of app according to Accept-Encoding"""
+    app.after_request(compress_response)
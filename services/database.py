@@ -1,41 +1,233 @@
 import psycopg2
+import logging
 import os
-import traceback
-from psycopg2 import pool
+import threading
+import time
+import uuid
+import weakref
+from contextlib import contextmanager
+from psycopg2 import errors
+from services import metrics, migrations
+from services.pool import ManagedPool
+from services.slow_query_log import slow_query_log
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on how long a sampled EXPLAIN ANALYZE may run
+EXPLAIN_TIMEOUT_MS = int(os.environ.get('SLOW_QUERY_EXPLAIN_TIMEOUT_MS', 10000))
+
+def _log_error(error):
+    """Log a failed statement; the traceback is only included at DEBUG level"""
+    logger.error("Database error: %s", error, exc_info=logger.isEnabledFor(logging.DEBUG))
+
+def _run(cursor, query, params=None, fetch=True, source=None):
+    """Execute a statement, fetch its rows if asked, and record its timing.
+
+    source is the SQL to report in the slow-query log when query itself is
+    only a reference to it, as with EXECUTE of a prepared statement.
+    """
+    started = time.perf_counter()
+    cursor.execute(query, params or ())
+    rows = cursor.fetchall() if fetch else None
+    duration = time.perf_counter() - started
+    row_count = len(rows) if rows is not None else 0
+    metrics.record_query(duration, row_count)
+    slow_query_log.record(source or query, params, duration, row_count, explain=_explain)
+    return rows
+
+def _explain(query, params=None):
+    """Return the EXPLAIN (ANALYZE, BUFFERS) output for a read-only statement"""
+    connection = Database.pool().getconn()
+    try:
+        with connection.cursor() as cursor:
+            # Bound the cost of re-running a statement that was already slow
+            cursor.execute("SET LOCAL statement_timeout = %s", (EXPLAIN_TIMEOUT_MS,))
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query}", params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+    finally:
+        connection.rollback()
+        Database.pool().putconn(connection)
+
+class Transaction:
+    """A unit of work pinned to a single pooled connection.
+
+    Exposes the same execute helpers as Database, but statements are not
+    committed individually and errors propagate so the surrounding
+    Database.transaction() block can roll everything back.
+    """
+    
+    def __init__(self, connection):
+        self.connection = connection
+        self._savepoint_counter = 0
+    
+    def execute_query(self, query, params=None, fetch=True):
+        """Execute a query and optionally fetch results"""
+        with self.connection.cursor() as cursor:
+            rows = _run(cursor, query, params, fetch)
+            if fetch:
+                return rows
+            return cursor.rowcount
+    
+    def execute_query_with_column_names(self, query, params=None):
+        """Execute a query and return results with column names"""
+        with self.connection.cursor() as cursor:
+            rows = _run(cursor, query, params)
+            columns = [desc[0] for desc in cursor.description]
+            return [dict(zip(columns, row)) for row in rows]
+    
+    @contextmanager
+    def savepoint(self):
+        """Run a block under a savepoint, rolling back only that block on error"""
+        self._savepoint_counter += 1
+        name = f"sp_{self._savepoint_counter}"
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"SAVEPOINT {name}")
+        try:
+            yield self
+        except Exception:
+            with self.connection.cursor() as cursor:
+                cursor.execute(f"ROLLBACK TO SAVEPOINT {name}")
+            raise
+        else:
+            with self.connection.cursor() as cursor:
+                cursor.execute(f"RELEASE SAVEPOINT {name}")
 
 class Database:
+    """Handle on the process-wide connection pool.
+
+    Creating a Database is free: the pool is opened lazily by the first
+    statement run in each process, so importing the blueprints never
+    touches PostgreSQL. The pool is tagged with the PID that created it; a
+    forked child that inherits one opens its own on first use instead of
+    sharing the parent's sockets.
+    """
     _connection_pool = None
+    _pool_pid = None
+    _pool_lock = threading.Lock()
     
-    def __init__(self):
-        if Database._connection_pool is None:
-            # Default to localhost if environment variables are not set
-            db_host = os.environ.get('DB_HOST', 'localhost')
-            db_name = os.environ.get('DB_NAME', 'data')  # Changed from 'data' to 'Project'
-            db_user = os.environ.get('DB_USER', 'postgres')
-            db_password = os.environ.get('DB_PASSWORD', 'simar232')  # Changed from 'simar232' to '23562'
-            db_port = os.environ.get('DB_PORT', '5432')
-            
-            # Create a connection pool
-            Database._connection_pool = pool.ThreadedConnectionPool(
-                1, 20,
-                host=db_host,
-                database=db_name,
-                user=db_user,
-                password=db_password,
-                port=db_port
-            )
-            print("PostgreSQL connection pool created successfully")
+    # Pools inherited across fork(). They are kept referenced and never
+    # closed here: closing (or garbage collecting) a connection sends a
+    # terminate message over the socket the parent is still using
+    _inherited_pools = []
+    
+    # Rows fetched per network round trip by server-side cursors
+    STREAM_ITERSIZE = int(os.environ.get('DB_STREAM_ITERSIZE', 2000))
+    
+    # Names of the statements prepared on each pooled connection
+    _prepared = weakref.WeakKeyDictionary()
+    
+    # Schema version reached by initialize_db() in this process or the
+    # parent it was forked from; None if it hasn't run
+    schema_version = None
+    
+    @classmethod
+    def schema_at_least(cls, version):
+        """True if the schema is known to have migration version applied"""
+        return cls.schema_version is not None and cls.schema_version >= version
+    
+    @classmethod
+    def pool(cls):
+        """Return this process's connection pool, creating it on first use"""
+        if cls._connection_pool is None or cls._pool_pid != os.getpid():
+            with cls._pool_lock:
+                if cls._connection_pool is None or cls._pool_pid != os.getpid():
+                    cls.init_pool()
+        return cls._connection_pool
+    
+    @classmethod
+    def init_pool(cls):
+        """Create the connection pool for this process, replacing any existing one"""
+        if cls._connection_pool is not None and cls._pool_pid != os.getpid():
+            cls._inherited_pools.append(cls._connection_pool)
+            cls._connection_pool = None
+        
+        # Default to localhost if environment variables are not set
+        db_host = os.environ.get('DB_HOST', 'localhost')
+        db_name = os.environ.get('DB_NAME', 'data')  # Changed from 'data' to 'Project'
+        db_user = os.environ.get('DB_USER', 'postgres')
+        db_password = os.environ.get('DB_PASSWORD', 'simar232')  # Changed from 'simar232' to '23562'
+        db_port = os.environ.get('DB_PORT', '5432')
+        
+        # Create a connection pool; DB_POOL_MIN connections are opened
+        # up front and checkouts wait up to DB_POOL_TIMEOUT seconds
+        # when all DB_POOL_MAX are in use
+        cls._connection_pool = ManagedPool(
+            int(os.environ.get('DB_POOL_MIN', 1)),
+            int(os.environ.get('DB_POOL_MAX', 20)),
+            timeout=float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            recycle=float(os.environ.get('DB_POOL_RECYCLE', 1800)),
+            pre_ping=os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+            on_wait=metrics.pool_wait.observe,
+            host=db_host,
+            database=db_name,
+            user=db_user,
+            password=db_password,
+            port=db_port
+        )
+        cls._pool_pid = os.getpid()
+        logger.info("PostgreSQL connection pool created successfully")
+    
+    @classmethod
+    def close_pool(cls):
+        """Close every pooled connection, e.g. in a pre-fork master before forking workers"""
+        with cls._pool_lock:
+            if cls._connection_pool is not None and cls._pool_pid == os.getpid():
+                cls._connection_pool.closeall()
+            cls._connection_pool = None
+            cls._pool_pid = None
     
     def get_connection(self):
         """Get a connection from the connection pool"""
-        return Database._connection_pool.getconn()
+        return Database.pool().getconn()
     
     def return_connection(self, connection):
         """Return a connection to the connection pool"""
-        Database._connection_pool.putconn(connection)
+        Database.pool().putconn(connection)
+    
+    @classmethod
+    def current_pool(cls):
+        """Return this process's pool, or None if it hasn't opened one yet"""
+        pool = cls._connection_pool
+        if pool is None or cls._pool_pid != os.getpid():
+            return None
+        return pool
+    
+    def pool_stats(self):
+        """Return connection counts and checkout counters for the pool.
+
+        Returns None until this process has opened its pool, so reading the
+        stats (e.g. from /health) never connects to PostgreSQL.
+        """
+        pool = Database.current_pool()
+        return pool.stats() if pool is not None else None
+    
+    @contextmanager
+    def transaction(self):
+        """Pin one pooled connection for a block of statements.
+
+        Commits once when the block exits normally and rolls back if it
+        raises:
+
+            with db.transaction() as tx:
+                tx.execute_query(...)
+        """
+        connection = self.get_connection()
+        try:
+            yield Transaction(connection)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            self.return_connection(connection)
     
     def initialize_db(self):
-        """Check if database is properly set up, but don't recreate tables if they exist"""
+        """Check if database is properly set up, but don't recreate tables if they exist.
+
+        Pending schema migrations are applied in both cases.
+        """
+        connection = None
+        cursor = None
         try:
             # Get a connection from the pool
             connection = self.get_connection()
@@ -46,7 +238,7 @@ class Database:
             table_exists = cursor.fetchone()[0]
             
             if not table_exists:
-                print("Database tables do not exist. Creating from data.sql...")
+                logger.info("Database tables do not exist. Creating from data.sql...")
                 # Read the SQL file
                 with open('data/data.sql', 'r') as sql_file:
                     sql_script = sql_file.read()
@@ -54,13 +246,17 @@ class Database:
                 # Execute the SQL script
                 cursor.execute(sql_script)
                 connection.commit()
-                print("Database initialized successfully!")
+                logger.info("Database initialized successfully!")
             else:
-                print("Database tables already exist. Skipping initialization.")
+                logger.info("Database tables already exist. Skipping initialization.")
+            
+            # Bring existing deployments up to date with new indexes and tables
+            version = migrations.run_migrations(connection)
+            Database.schema_version = version
+            logger.info("Database schema at version %s", version)
             
         except Exception as e:
-            print(f"Error initializing database: {e}")
-            traceback.print_exc()
+            logger.exception("Error initializing database: %s", e)
         finally:
             # Close cursor and return connection to the pool
             if cursor:
@@ -78,10 +274,10 @@ class Database:
             connection = self.get_connection()
             cursor = connection.cursor()
             
-            cursor.execute(query, params or ())
+            rows = _run(cursor, query, params, fetch)
             
             if fetch:
-                result = cursor.fetchall()
+                result = rows
             else:
                 connection.commit()
                 result = cursor.rowcount
@@ -90,8 +286,7 @@ class Database:
         except Exception as e:
             if connection:
                 connection.rollback()
-            print(f"Database error: {e}")
-            traceback.print_exc()
+            _log_error(e)
             return None
         finally:
             if cursor:
@@ -109,11 +304,10 @@ class Database:
             connection = self.get_connection()
             cursor = connection.cursor()
             
-            cursor.execute(query, params or ())
+            rows = _run(cursor, query, params)
             
             # Get column names from cursor description
             columns = [desc[0] for desc in cursor.description]
-            rows = cursor.fetchall()
             
             # Convert to list of dictionaries
             result = []
@@ -124,11 +318,136 @@ class Database:
         except Exception as e:
             if connection:
                 connection.rollback()
-            print(f"Database error: {e}")
-            traceback.print_exc()
+            _log_error(e)
+            return []
+        finally:
+            if cursor:
+                cursor.close()
+            if connection:
+                self.return_connection(connection)
+
+    def execute_query_columnar(self, query, params=None):
+        """Execute a query and return {"columns": [...], "rows": [[...], ...]}
+
+        Column names appear once instead of in every row, and rows stay the
+        tuples psycopg2 returns, so no per-row dictionary is built.
+        """
+        connection = None
+        cursor = None
+        
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            rows = _run(cursor, query, params)
+            
+            return {
+                "columns": [desc[0] for desc in cursor.description],
+                "rows": rows
+            }
+        except Exception as e:
+            if connection:
+                connection.rollback()
+            _log_error(e)
+            return {"columns": [], "rows": []}
+        finally:
+            if cursor:
+                cursor.close()
+            if connection:
+                self.return_connection(connection)
+
+    def stream_query(self, query, params=None, itersize=None):
+        """Yield rows as dictionaries from a named (server-side) cursor.
+
+        Rows are pulled from PostgreSQL in batches of itersize, so only one
+        batch is held in memory at a time. The pooled connection stays
+        checked out until the generator is exhausted or closed. Errors
+        propagate to the caller instead of being swallowed.
+        """
+        connection = self.get_connection()
+        cursor = None
+        # Only time spent executing and fetching counts as database time,
+        # not the time the caller takes to consume each batch
+        db_time = 0.0
+        row_count = 0
+        try:
+            cursor = connection.cursor(name=f"stream_{uuid.uuid4().hex}")
+            itersize = itersize or Database.STREAM_ITERSIZE
+            started = time.perf_counter()
+            cursor.execute(query, params or ())
+            
+            columns = None
+            while True:
+                rows = cursor.fetchmany(itersize)
+                db_time += time.perf_counter() - started
+                if not rows:
+                    break
+                row_count += len(rows)
+                if columns is None:
+                    columns = [desc[0] for desc in cursor.description]
+                for row in rows:
+                    yield dict(zip(columns, row))
+                started = time.perf_counter()
+        finally:
+            metrics.record_query(db_time, row_count)
+            slow_query_log.record(query, params, db_time, row_count, explain=_explain)
+            if cursor:
+                cursor.close()
+            # Ends the read-only transaction the named cursor lived in
+            connection.rollback()
+            self.return_connection(connection)
+
+    def execute_prepared(self, name, query):
+        """Execute a parameterless statement as a server-side prepared statement.
+
+        The statement is prepared once per pooled connection under name and
+        reused afterwards, so PostgreSQL skips parsing and planning on
+        repeated executions. Returns results with column names.
+        """
+        connection = None
+        cursor = None
+        
+        try:
+            connection = self.get_connection()
+            cursor = connection.cursor()
+            
+            prepared = Database._prepared.setdefault(connection, set())
+            if name not in prepared:
+                try:
+                    _run(cursor, f"PREPARE {name} AS {query}", fetch=False)
+                except errors.DuplicatePreparedStatement:
+                    connection.rollback()
+                prepared.add(name)
+            
+            rows = _run(cursor, f"EXECUTE {name}", source=query)
+            
+            columns = [desc[0] for desc in cursor.description]
+            return [dict(zip(columns, row)) for row in rows]
+        except Exception as e:
+            if connection:
+                connection.rollback()
+            _log_error(e)
             return []
         finally:
             if cursor:
                 cursor.close()
             if connection:
-                self.return_connection(connection) 
\ No newline at end of file
+                self.return_connection(connection)
+
+def _pool_gauge(*keys):
+    def read():
+        # Report nothing until this process has opened its own pool
+        stats = Database().pool_stats()
+        if stats is None:
+            return {}
+        return {(key,): stats[key] for key in keys}
+    return read
+
+metrics.register(metrics.Gauge(
+    'happytails_db_pool_connections', 'Pooled connections by state, and callers waiting for one.',
+    ('state',), _pool_gauge('in_use', 'idle', 'waiting')
+))
+metrics.register(metrics.Gauge(
+    'happytails_db_pool_events_total', 'Connection checkouts, checkout timeouts and discarded connections.',
+    ('event',), _pool_gauge('checkouts', 'timeouts', 'discarded'), kind='counter'
+))
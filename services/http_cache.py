@@ -0,0 +1,123 @@
+import functools
+import hashlib
+import inspect
+import os
+
+from flask import current_app, make_response, request
+
+from services.table_versions import table_versions
+
+# max-age (seconds) sent with cacheable responses, per blueprint
+DEFAULT_POLICIES = {
+    'pet_routes': 300,
+    'product_routes': 60,
+    'shopping_category_routes': 300,
+    'vet_routes': 600,
+}
+
+
+def parse_policies(value):
+    """Parse per-blueprint max-age overrides of the form "pet_routes=600,vet_routes=0" """
+    policies = dict(DEFAULT_POLICIES)
+    for item in (value or '').split(','):
+        if '=' not in item:
+            continue
+        blueprint, max_age = item.split('=', 1)
+        policies[blueprint.strip()] = int(max_age.strip())
+    return policies
+
+
+POLICIES = parse_policies(os.environ.get('HTTP_CACHE_POLICIES'))
+
+
+def _table_state(tables):
+    """Return (version token, last modified) for tables, or None if unknown.
+
+    Read from the in-process copy of TableVersion, so it costs no query.
+    A write shows up in the validators within TABLE_VERSIONS_INTERVAL.
+    """
+    states = {table.lower(): table_versions.get(table) for table in tables}
+    if any(state is None for state in states.values()):
+        return None
+
+    token = ','.join(f"{name}:{states[name][0]}" for name in sorted(states))
+    return token, max(updated_at for _, updated_at in states.values())
+
+
+def _etag(token):
+    # The URL is part of the tag because one table version covers every
+    # resource derived from that table
+    return hashlib.sha1(f"{request.full_path}|{token}".encode('utf-8')).hexdigest()[:20]
+
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    return request.if_modified_since is not None and last_modified <= request.if_modified_since
+
+
+def _set_cache_control(response):
+    max_age = POLICIES.get(request.blueprint)
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.no_cache = True
+
+
+def _precondition(tables):
+    """Return (state, etag, 304 response or None) for a request to a view over tables"""
+    state = _table_state(tables) if tables else None
+    if state is None:
+        return None, None, None
+    etag = _etag(state[0])
+    if not _not_modified(etag, state[1]):
+        return state, etag, None
+    response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    response.last_modified = state[1]
+    _set_cache_control(response)
+    return state, etag, response
+
+
+def _add_validators(rv, state, etag):
+    response = make_response(rv)
+    if response.status_code != 200 or response.is_streamed:
+        return response
+
+    if state is not None:
+        response.set_etag(etag, weak=True)
+        response.last_modified = state[1]
+    else:
+        response.add_etag(weak=True)
+    _set_cache_control(response)
+    return response.make_conditional(request)
+
+
+def conditional(*tables):
+    """Add ETag/Last-Modified validators and a Cache-Control policy to a GET view.
+
+    With tables, the validators come from those tables' TableVersion rows,
+    so a matching If-None-Match (or If-Modified-Since) is answered with 304
+    before the view and its queries run. Without tables, or if the versions
+    can't be read, the ETag is a hash of the response body: bandwidth is
+    still saved but the view does run. Works on async def views too.
+    """
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                state, etag, not_modified = _precondition(tables)
+                if not_modified is not None:
+                    return not_modified
+                return _add_validators(await view(*args, **kwargs), state, etag)
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            state, etag, not_modified = _precondition(tables)
+            if not_modified is not None:
+                return not_modified
+            return _add_validators(view(*args, **kwargs), state, etag)
+        return wrapper
+    return decorator
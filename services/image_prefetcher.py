@@ -0,0 +1,152 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.catalog_cache import catalog_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DOG_API_URL = 'https://dog.ceo/api'
+DEFAULT_CAT_API_URL = 'https://api.thecatapi.com/v1'
+
+MISSING_IMAGES_QUERY = """
+    SELECT b.BreedID, b.BreedName, pt.PetTypeName
+    FROM Breed b
+    JOIN PetType pt ON b.PetTypeID = pt.PetTypeID
+    WHERE b.ImageURL IS NULL
+      AND LOWER(pt.PetTypeName) IN ('dog', 'cat')
+      AND NOT (b.BreedID = ANY(%s))
+    ORDER BY b.BreedID
+    LIMIT %s
+"""
+
+STORE_IMAGES_QUERY = """
+    UPDATE Breed b
+    SET ImageURL = v.url
+    FROM unnest(%s::int[], %s::text[]) AS v(id, url)
+    WHERE b.BreedID = v.id AND b.ImageURL IS NULL
+"""
+
+
+class BreedImagePrefetcher:
+    """Background worker that fills Breed.ImageURL from the public pet APIs.
+
+    Request handlers only read the stored URL and call request() for breeds
+    that have none; lookups happen here with a pooled HTTP session,
+    per-call timeouts and a bounded number of concurrent requests, and the
+    results are written back in one UPDATE per batch. The API base URLs can
+    point at a local stub server for testing.
+    """
+
+    def __init__(self, db, dog_api_url=None, cat_api_url=None, timeout=None,
+                 concurrency=None, batch_size=None, interval=None, retry_after=None):
+        self.db = db
+        self.dog_api_url = (dog_api_url or os.environ.get('DOG_API_URL', DEFAULT_DOG_API_URL)).rstrip('/')
+        self.cat_api_url = (cat_api_url or os.environ.get('CAT_API_URL', DEFAULT_CAT_API_URL)).rstrip('/')
+        self.timeout = float(timeout or os.environ.get('IMAGE_FETCH_TIMEOUT', 5))
+        self.concurrency = int(concurrency or os.environ.get('IMAGE_FETCH_CONCURRENCY', 4))
+        self.batch_size = int(batch_size or os.environ.get('IMAGE_PREFETCH_BATCH', 100))
+        self.interval = float(interval or os.environ.get('IMAGE_PREFETCH_INTERVAL', 600))
+        self.retry_after = float(retry_after or os.environ.get('IMAGE_RETRY_AFTER', 3600))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._failed = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the worker thread (no-op if it is already running)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='breed-image-prefetcher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop the worker thread and wait for it to exit"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def request(self, breed_id):
+        """Ask the worker to resolve missing images soon"""
+        failed_at = self._failed.get(breed_id)
+        if failed_at is not None and time.monotonic() - failed_at < self.retry_after:
+            return
+        self.start()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                # Keep going while batches make progress; failed breeds are
+                # excluded from later batches so this always terminates
+                while not self._stop.is_set() and self.run_once():
+                    pass
+            except Exception as e:
+                logger.exception("Error prefetching breed images: %s", e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def run_once(self):
+        """Resolve one batch of breeds without an image; returns the number stored"""
+        now = time.monotonic()
+        # Breeds whose lookup failed recently are skipped until retry_after
+        recently_failed = [
+            breed_id for breed_id, failed_at in self._failed.items()
+            if now - failed_at < self.retry_after
+        ]
+        breeds = self.db.execute_query(MISSING_IMAGES_QUERY, (recently_failed, self.batch_size)) or []
+        if not breeds:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            urls = list(executor.map(lambda breed: self.resolve(breed[1], breed[2]), breeds))
+
+        resolved = [(breed[0], url) for breed, url in zip(breeds, urls) if url]
+        for breed, url in zip(breeds, urls):
+            if not url:
+                self._failed[breed[0]] = now
+
+        if resolved:
+            ids, image_urls = zip(*resolved)
+            with self.db.transaction() as tx:
+                tx.execute_query(STORE_IMAGES_QUERY, (list(ids), list(image_urls)), fetch=False)
+            catalog_cache.invalidate('Breed')
+        return len(resolved)
+
+    def resolve(self, breed_name, pet_type):
+        """Look up an image URL for a breed, or None if none is available"""
+        breed_name = breed_name.lower()
+        pet_type = pet_type.lower()
+        try:
+            if pet_type == 'dog':
+                response = self.session.get(
+                    f'{self.dog_api_url}/breed/{breed_name}/images/random', timeout=self.timeout
+                )
+                if response.status_code == 200:
+                    return response.json().get('message')
+            elif pet_type == 'cat':
+                response = self.session.get(
+                    f'{self.cat_api_url}/images/search',
+                    params={'breed_ids': breed_name},
+                    timeout=self.timeout
+                )
+                if response.status_code == 200 and response.json():
+                    return response.json()[0].get('url')
+        except (requests.RequestException, ValueError, KeyError, IndexError) as e:
+            logger.warning("Error resolving image for %s: %s", breed_name, e)
+        return None
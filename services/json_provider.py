@@ -0,0 +1,63 @@
+import datetime
+import decimal
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard library encoder
+    orjson = None
+
+
+def encode_value(value):
+    """Encode the database types psycopg2 returns that JSON has no type for.
+
+    DECIMAL columns become numbers and times "HH:MM:SS". Dates and
+    datetimes keep Flask's HTTP date format ("Thu, 01 Feb 2024 10:30:00
+    GMT"), which jsonify has always sent for them.
+    """
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, datetime.time):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes Decimal, date, datetime and time natively.
+
+    Handlers can pass rows straight from the database to jsonify. When
+    orjson is installed it does the encoding (with keys sorted, like the
+    default provider); otherwise the standard json module is used with the
+    same rules. Objects with non-string keys also go through the standard
+    library, since orjson would sort integer keys as strings.
+    """
+
+    default = staticmethod(encode_value)
+
+    ORJSON_OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+    def _orjson_dumps(self, obj, indent=False):
+        option = self.ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, default=encode_value, option=option)
+
+    def dumps(self, obj, **kwargs):
+        # orjson covers the compact and indent=2 forms Flask asks for; any
+        # other json.dumps option goes through the standard library
+        if orjson is not None and set(kwargs) <= {'separators', 'indent'} and kwargs.get('indent') in (None, 2):
+            try:
+                return self._orjson_dumps(obj, indent='indent' in kwargs).decode('utf-8')
+            except TypeError:
+                pass  # e.g. non-string keys
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        try:
+            body = self._orjson_dumps(obj, indent)
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,219 @@
+import heapq
+import math
+import os
+
+from services.database import Database
+from services.versioned_index import VersionedIndexes
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Results returned for ?near= when no ?limit= is given
+DEFAULT_NEAREST = 10
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in kilometres between two points given in degrees"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def distance_sql(origin, latitude='Latitude', longitude='Longitude'):
+    """SQL expression (and its params) for haversine_km from origin to the given columns"""
+    expression = f"""
+        2 * {EARTH_RADIUS_KM} * asin(least(1, sqrt(
+            power(sin(radians({latitude} - %s) / 2), 2)
+            + cos(radians(%s)) * cos(radians({latitude})) * power(sin(radians({longitude} - %s) / 2), 2)
+        )))
+    """
+    return expression, [origin[0], origin[0], origin[1]]
+
+
+def normalize_place(text):
+    """Python twin of the normalize_place() SQL function (migration 8)"""
+    return ' '.join(text.strip().lower().split())
+
+
+class GridIndex:
+    """Points bucketed into square cells of cell_degrees on a side.
+
+    nearest() searches outwards ring by ring from the query's cell, so
+    only the points up to the distance of the results are ranked. Cells
+    don't wrap around the antimeridian, which no location here comes
+    near.
+    """
+
+    def __init__(self, points=(), cell_degrees=1.0):
+        """Index points of (id, latitude, longitude)"""
+        self.cell_degrees = cell_degrees
+        self.cells = {}
+        self.locations = {}
+        for point_id, lat, lon in points:
+            self.locations[point_id] = (lat, lon)
+            self.cells.setdefault(self._cell(lat, lon), []).append((point_id, lat, lon))
+
+    def __len__(self):
+        return len(self.locations)
+
+    def _cell(self, lat, lon):
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+
+    def _outside_bound(self, lat, lon, cell, ring):
+        """Lower bound (km) on the distance to any point outside the rings searched so far"""
+        size = self.cell_degrees
+        south = (cell[0] - ring) * size
+        north = (cell[0] + ring + 1) * size
+        west = (cell[1] - ring) * size
+        east = (cell[1] + ring + 1) * size
+        to_parallel = math.radians(min(lat - south, north - lat)) * EARTH_RADIUS_KM
+        # Distance to a meridian dlon away is shortest along a great circle
+        # crossing it at right angles
+        dlon = math.radians(min(lon - west, east - lon, 90))
+        to_meridian = math.asin(math.cos(math.radians(lat)) * math.sin(dlon)) * EARTH_RADIUS_KM
+        return max(0.0, min(to_parallel, to_meridian))
+
+    def nearest(self, lat, lon):
+        """Yield (distance_km, id) for every point, nearest first"""
+        if not self.locations:
+            return
+        cell = self._cell(lat, lon)
+        # Only occupied cells are visited, grouped by ring, so an origin far
+        # from every point doesn't walk the empty rings in between
+        rings = {}
+        for occupied in self.cells:
+            ring = max(abs(occupied[0] - cell[0]), abs(occupied[1] - cell[1]))
+            rings.setdefault(ring, []).append(occupied)
+        order = sorted(rings)
+        heap = []
+        for i, ring in enumerate(order):
+            for occupied in rings[ring]:
+                for point_id, point_lat, point_lon in self.cells[occupied]:
+                    heapq.heappush(heap, (haversine_km(lat, lon, point_lat, point_lon), point_id))
+            # Every point not yet pushed lies beyond the ring before the next
+            # occupied one
+            bound = self._outside_bound(lat, lon, cell, order[i + 1] - 1) if i + 1 < len(order) else math.inf
+            while heap and heap[0][0] <= bound:
+                yield heapq.heappop(heap)
+
+    def distance(self, lat, lon, point_id):
+        """Distance (km) from (lat, lon) to point_id, or None if it has no location"""
+        location = self.locations.get(point_id)
+        if location is None:
+            return None
+        return haversine_km(lat, lon, *location)
+
+
+class CityLookup:
+    """Coordinates of the CityLocation cities, by normalized name"""
+
+    def __init__(self, rows=()):
+        """Index rows of (city, state, latitude, longitude)"""
+        self.by_place = {}
+        self.by_city = {}
+        for city, state, lat, lon in rows:
+            self.by_place[(normalize_place(city), normalize_place(state))] = (lat, lon)
+            self.by_city.setdefault(normalize_place(city), []).append((lat, lon))
+
+    def __len__(self):
+        return len(self.by_place)
+
+    def find(self, city, state=None):
+        """Return (lat, lon) for a city, or None if unknown or ambiguous without a state"""
+        if state:
+            return self.by_place.get((normalize_place(city), normalize_place(state)))
+        locations = self.by_city.get(normalize_place(city), [])
+        # Cities listed under two states at the same place (e.g. Chandigarh)
+        # are not ambiguous
+        return locations[0] if len(set(locations)) == 1 else None
+
+
+class LocalityIndex(VersionedIndexes):
+    """Grid indexes of store and vet locations for ?near= lookups.
+
+    Locations come from the Latitude/Longitude columns, which migration 8
+    fills from the CityLocation table. Lookups never touch the database;
+    see VersionedIndexes for how the indexes are refreshed. Unlike name
+    suggestions, an empty index would give wrong answers, so lookups made
+    before the first build wait for it.
+    """
+
+    def __init__(self, db, interval=None, cell_degrees=None):
+        super().__init__(
+            db, float(interval or os.environ.get('LOCALITY_REFRESH_INTERVAL', 60)), 'locality'
+        )
+        self.cell_degrees = float(cell_degrees or os.environ.get('LOCALITY_CELL_DEGREES', 1.0))
+        self.register('cities', 'CityLocation', self._load_cities, CityLookup())
+
+    def add_source(self, name, table, query):
+        """Add a grid index fed by query, which selects (id, latitude, longitude) rows"""
+        def load():
+            rows = self.db.execute_query(query)
+            if rows is None:
+                # execute_query returns None on errors
+                return None
+            return GridIndex(rows, self.cell_degrees)
+        self.register(name, table, load, GridIndex(cell_degrees=self.cell_degrees))
+
+    def _load_cities(self):
+        rows = self.db.execute_query("SELECT City, State, Latitude, Longitude FROM CityLocation")
+        if rows is None:
+            return None
+        return CityLookup(rows)
+
+    def parse_near(self, value):
+        """Parse ?near= as "lat,lon", "city" or "city,state" into (lat, lon).
+
+        Raises ValueError if value is neither valid coordinates nor a
+        known city.
+        """
+        parts = [part.strip() for part in value.split(',')]
+        if len(parts) == 2:
+            try:
+                lat, lon = float(parts[0]), float(parts[1])
+            except ValueError:
+                pass
+            else:
+                if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                    raise ValueError("near coordinates out of range")
+                return lat, lon
+
+        self.ensure_started(wait=True)
+        if len(parts) > 2 or not parts[0]:
+            raise ValueError("near must be 'lat,lon', 'city' or 'city,state'")
+        location = self.indexes['cities'].find(parts[0], parts[1] if len(parts) == 2 else None)
+        if location is None:
+            raise ValueError(f"Unknown location: {value}")
+        return location
+
+    def nearest(self, name, origin):
+        """Yield (distance_km, id) from the named index, nearest to origin first"""
+        self.ensure_started(wait=True)
+        return self.indexes[name].nearest(*origin)
+
+    def sort_by_distance(self, name, origin, rows, id_key, limit):
+        """Return the limit rows nearest origin, each with a distance_km.
+
+        For short candidate lists (e.g. the stores stocking one product)
+        where ranking them beats walking the grid. Rows without a known
+        location sort last.
+        """
+        self.ensure_started(wait=True)
+        index = self.indexes[name]
+        for row in rows:
+            distance = index.distance(origin[0], origin[1], row[id_key])
+            row['distance_km'] = round(distance, 1) if distance is not None else None
+        rows = sorted(rows, key=lambda row: (row['distance_km'] is None, row['distance_km'] or 0))
+        return rows[:limit]
+
+
+locality_index = LocalityIndex(Database())
+locality_index.add_source(
+    'stores', 'Store',
+    "SELECT StoreID, Latitude, Longitude FROM Store WHERE Latitude IS NOT NULL AND Longitude IS NOT NULL"
+)
+locality_index.add_source(
+    'vets', 'Vet',
+    "SELECT VetID, Latitude, Longitude FROM Vet WHERE Latitude IS NOT NULL AND Longitude IS NOT NULL"
+)
@@ -0,0 +1,130 @@
+import atexit
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+
+# Longest rendering of a logged value (query results, payloads) in characters
+TRUNCATE_LIMIT = int(os.environ.get('LOG_TRUNCATE', 500))
+
+_listener = None
+_queue_handler = None
+
+
+class truncated:
+    """Lazily rendered, length-limited view of a value for log messages.
+
+    Formatting only happens if the record is actually emitted, so passing
+    a large result set to a disabled debug call costs nothing.
+    """
+
+    __slots__ = ('value', 'limit')
+
+    def __init__(self, value, limit=None):
+        self.value = value
+        self.limit = limit or TRUNCATE_LIMIT
+
+    def __str__(self):
+        text = str(self.value)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}... ({len(text)} chars)"
+
+
+def parse_rates(value):
+    """Parse per-endpoint sample rates of the form "endpoint=0.1,other=0.5" """
+    rates = {}
+    for item in (value or '').split(','):
+        if '=' not in item:
+            continue
+        endpoint, rate = item.split('=', 1)
+        rates[endpoint.strip()] = float(rate.strip())
+    return rates
+
+
+class EndpointSampler(logging.Filter):
+    """Keep only a sampled fraction of DEBUG/INFO records per endpoint.
+
+    The decision is made once per request so a sampled request keeps all
+    of its lines. Warnings and errors, and records logged outside a
+    request, always pass.
+    """
+
+    def __init__(self, default_rate=1.0, rates=None):
+        super().__init__()
+        self.default_rate = default_rate
+        self.rates = rates or {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not has_request_context():
+            return True
+        sampled = g.get('_log_sampled')
+        if sampled is None:
+            rate = self.rates.get(request.endpoint, self.default_rate)
+            sampled = rate >= 1.0 or random.random() < rate
+            g._log_sampled = sampled
+        return sampled
+
+
+def configure_logging(level=None):
+    """Route all logging through a queue to a background writer thread.
+
+    Request threads render the message of records that pass the level
+    and sampling checks and enqueue them; formatting the log line and
+    stdout I/O happen on the listener thread. Configured by LOG_LEVEL
+    (default INFO), LOG_SAMPLE_RATE (default 1.0) and LOG_SAMPLE_RATES
+    ("blueprint.endpoint=rate,..."). Safe to call more than once.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    level = level or os.environ.get('LOG_LEVEL', 'INFO').upper()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    # QueueHandler renders the message before enqueueing it, so arguments
+    # that change after the call (rows, dicts) are logged as they were
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(EndpointSampler(
+        float(os.environ.get('LOG_SAMPLE_RATE', 1.0)),
+        parse_rates(os.environ.get('LOG_SAMPLE_RATES'))
+    ))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+
+    _queue_handler = queue_handler
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_stop_listener)
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def restart_after_fork():
+    """Give a forked worker its own queue and writer thread.
+
+    Threads don't survive fork(), so without this a worker forked from a
+    process that already configured logging would enqueue records that
+    nothing ever writes.
+    """
+    global _listener
+    if _listener is None:
+        return
+    log_queue = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    _listener = QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
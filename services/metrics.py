@@ -0,0 +1,193 @@
+import bisect
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+
+# Upper bounds of the histogram buckets; +Inf is implicit
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+ROW_COUNT_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    """Cumulative histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        """Record one observation for the given label values"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), sum, count
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        """Return the histogram in Prometheus text exposition format"""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram"
+        ]
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        for label_values, (counts, total, count) in series:
+            labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labels, label_values))
+            prefix = f"{labels}," if labels else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else _format(bound)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            suffix = f"{{{labels}}}" if labels else ''
+            lines.append(f"{self.name}_sum{suffix} {_format(total)}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return '\n'.join(lines)
+
+
+class Gauge:
+    """Metric whose current values are read from a callback at scrape time.
+
+    read() returns {label_values: value}. kind is the Prometheus type to
+    report, 'gauge' or 'counter'.
+    """
+
+    def __init__(self, name, documentation, labels, read, kind='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.read = read
+        self.kind = kind
+
+    def render(self):
+        """Return the current values in Prometheus text exposition format"""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}"
+        ]
+        for label_values, value in sorted(self.read().items()):
+            labels = ','.join(f'{name}="{_escape(label)}"' for name, label in zip(self.labels, label_values))
+            suffix = f"{{{labels}}}" if labels else ''
+            lines.append(f"{self.name}{suffix} {_format(value)}")
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+REQUEST_LABELS = ('endpoint', 'method', 'status')
+
+request_duration = Histogram(
+    'happytails_request_duration_seconds', 'Wall time per request.',
+    REQUEST_LABELS, DURATION_BUCKETS
+)
+request_db_duration = Histogram(
+    'happytails_request_db_seconds', 'Time spent in database statements per request.',
+    REQUEST_LABELS, DURATION_BUCKETS
+)
+request_queries = Histogram(
+    'happytails_request_queries', 'Database statements executed per request.',
+    REQUEST_LABELS, QUERY_COUNT_BUCKETS
+)
+request_rows = Histogram(
+    'happytails_request_rows', 'Rows returned by database statements per request.',
+    REQUEST_LABELS, ROW_COUNT_BUCKETS
+)
+query_duration = Histogram(
+    'happytails_db_query_seconds', 'Duration of individual database statements.',
+    (), DURATION_BUCKETS
+)
+pool_wait = Histogram(
+    'happytails_db_pool_wait_seconds', 'Time spent waiting to check out a pooled connection.',
+    (), DURATION_BUCKETS
+)
+
+COLLECTORS = [request_duration, request_db_duration, request_queries, request_rows, query_duration, pool_wait]
+
+
+def register(collector):
+    """Add a Histogram or Gauge to the /metrics output"""
+    COLLECTORS.append(collector)
+
+
+class RequestStats:
+    """Database work attributed to the current request"""
+
+    __slots__ = ('started', 'db_time', 'queries', 'rows', 'status')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_time = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.status = None
+
+
+def record_query(duration, rows=0):
+    """Record one executed statement, attributing it to the current request if any"""
+    query_duration.observe(duration)
+    if has_request_context():
+        stats = g.get('_request_stats')
+        if stats is not None:
+            stats.db_time += duration
+            stats.queries += 1
+            stats.rows += rows
+
+
+def _start_request():
+    g._request_stats = RequestStats()
+
+
+def _capture_status(response):
+    stats = g.get('_request_stats')
+    if stats is not None:
+        stats.status = response.status_code
+    return response
+
+
+def _finish_request(error=None):
+    # Runs at teardown, so streamed responses are measured until the last
+    # row has been sent
+    stats = g.pop('_request_stats', None)
+    if stats is None:
+        return
+    status = stats.status or (500 if error is not None else 200)
+    # Unmatched URLs share one label so 404 scans can't blow up cardinality
+    labels = (request.endpoint or 'unmatched', request.method, str(status))
+    request_duration.observe(time.perf_counter() - stats.started, *labels)
+    request_db_duration.observe(stats.db_time, *labels)
+    request_queries.observe(stats.queries, *labels)
+    request_rows.observe(stats.rows, *labels)
+
+
+def render():
+    """Return every metric in Prometheus text exposition format"""
+    return '\n'.join(collector.render() for collector in COLLECTORS) + '\n'
+
+
+def init_app(app):
+    """Instrument every request of app and serve the metrics at /metrics"""
+    app.before_request(_start_request)
+    app.after_request(_capture_status)
+    app.teardown_request(_finish_request)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,324 @@
+import functools
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for the advisory lock that serializes migration runs when
+# several workers start at once
+MIGRATION_LOCK_KEY = 7423001
+
+# Catalog tables whose writes bump their row in TableVersion (names as
+# PostgreSQL reports them in TG_TABLE_NAME)
+VERSIONED_TABLES = ('pettype', 'breed', 'availability', 'store', 'product', 'shoppingcategory', 'vet')
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+
+SCHEMA_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS SchemaVersion (
+        Version INT PRIMARY KEY,
+        Description TEXT NOT NULL,
+        AppliedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+
+def _version_trigger(table):
+    """Statements making writes to table bump its TableVersion row"""
+    return (
+        f"DROP TRIGGER IF EXISTS trg_{table}_version ON {table}",
+        f"""
+        CREATE TRIGGER trg_{table}_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+        FOR EACH STATEMENT EXECUTE PROCEDURE bump_table_version()
+        """,
+        f"INSERT INTO TableVersion (TableName) VALUES ('{table}') ON CONFLICT DO NOTHING",
+    )
+
+
+def _read_data_file(name):
+    with open(os.path.join(DATA_DIR, name), 'r') as sql_file:
+        return sql_file.read()
+
+
+# Each migration is (version, description, statements). Statements must be
+# idempotent so a migration can be re-run safely against a schema that
+# already has some of its objects. They are written out here rather than
+# taken from the modules that use the tables, so an applied migration
+# never changes; schema changes go in a new migration. A statement may also be a function
+# returning the SQL, called only when the migration runs (e.g. to read a
+# data file).
+MIGRATIONS = [
+    (1, 'Store order summary', [
+        """
+        CREATE TABLE IF NOT EXISTS StoreOrderStats (
+            StoreID INT REFERENCES Store(StoreID) ON DELETE CASCADE,
+            Status VARCHAR(20) NOT NULL,
+            OrderCount INT NOT NULL DEFAULT 0,
+            LineCount INT NOT NULL DEFAULT 0,
+            TotalRevenue NUMERIC(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (StoreID, Status)
+        )
+        """,
+        """
+        DELETE FROM StoreOrderStats;
+        INSERT INTO StoreOrderStats (StoreID, Status, OrderCount, LineCount, TotalRevenue)
+        SELECT o.StoreID, COALESCE(o.Status, 'Pending'), COUNT(DISTINCT o.OrderID),
+               COUNT(od.ProductID), COALESCE(SUM(p.Price * od.Quantity), 0)
+        FROM Orders o
+        LEFT JOIN OrderDetails od ON o.OrderID = od.OrderID
+        LEFT JOIN Product p ON od.ProductID = p.ProductID
+        WHERE o.StoreID IS NOT NULL
+        GROUP BY o.StoreID, COALESCE(o.Status, 'Pending')
+        """,
+    ]),
+    (2, 'Index hot lookup columns', [
+        # Users.Email is already indexed by its UNIQUE constraint
+        "CREATE INDEX IF NOT EXISTS idx_cart_username ON Cart (Username)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_username_date ON Orders (Username, OrderDate DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_storeid ON Orders (StoreID)",
+        "CREATE INDEX IF NOT EXISTS idx_orderdetails_productid ON OrderDetails (ProductID)",
+        "CREATE INDEX IF NOT EXISTS idx_pet_owner ON Pet (Owner)",
+        "CREATE INDEX IF NOT EXISTS idx_breed_pettypeid ON Breed (PetTypeID)",
+        "CREATE INDEX IF NOT EXISTS idx_product_category_pettype ON Product (CategoryID, PetTypeID)",
+        "CREATE INDEX IF NOT EXISTS idx_supplies_productid ON Supplies (ProductID)",
+        "CREATE INDEX IF NOT EXISTS idx_availability_breedid ON Availability (BreedID)",
+        "CREATE INDEX IF NOT EXISTS idx_vet_city ON Vet (City)",
+        "CREATE INDEX IF NOT EXISTS idx_vet_state ON Vet (State)",
+        "CREATE INDEX IF NOT EXISTS idx_vet_rating ON Vet (Rating DESC, Name)",
+    ]),
+    (3, 'Trigram indexes for ILIKE searches', [
+        # pg_trgm may be unavailable or need superuser rights; the trigram
+        # indexes are skipped in that case and ILIKE falls back to a scan
+        """
+        DO $$
+        BEGIN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        EXCEPTION WHEN OTHERS THEN
+            RAISE NOTICE 'pg_trgm unavailable: %', SQLERRM;
+        END
+        $$
+        """,
+        """
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+                EXECUTE 'CREATE INDEX IF NOT EXISTS idx_product_name_trgm ON Product USING gin (Name gin_trgm_ops)';
+                EXECUTE 'CREATE INDEX IF NOT EXISTS idx_vet_city_trgm ON Vet USING gin (City gin_trgm_ops)';
+            END IF;
+        END
+        $$
+        """,
+    ]),
+    (4, 'Breed image URLs', [
+        # data/update_breed_images.sql and the image prefetcher write here
+        "ALTER TABLE Breed ADD COLUMN IF NOT EXISTS ImageURL TEXT",
+    ]),
+    (5, 'Catalog table versions', [
+        # services/http_cache derives ETags from these counters. Supplies is
+        # left out on purpose: every order writes it, and a shared version
+        # row would serialize concurrent checkouts.
+        """
+        CREATE TABLE IF NOT EXISTS TableVersion (
+            TableName TEXT PRIMARY KEY,
+            Version BIGINT NOT NULL DEFAULT 1,
+            UpdatedAt TIMESTAMPTZ NOT NULL DEFAULT date_trunc('second', clock_timestamp())
+        )
+        """,
+        """
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO TableVersion (TableName) VALUES (TG_TABLE_NAME)
+            ON CONFLICT (TableName) DO UPDATE
+            SET Version = TableVersion.Version + 1,
+                UpdatedAt = date_trunc('second', clock_timestamp());
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+    ] + [
+        statement
+        for table in VERSIONED_TABLES
+        for statement in _version_trigger(table)
+    ]),
+    (6, 'Keyset pagination indexes', [
+        # Match the (sort key, id) order of the paged listings so each page
+        # is an index range scan; these supersede the shorter indexes
+        # from migration 2
+        "CREATE INDEX IF NOT EXISTS idx_product_category_pettype_name ON Product (CategoryID, PetTypeID, Name, ProductID)",
+        "CREATE INDEX IF NOT EXISTS idx_product_category_name ON Product (CategoryID, Name, ProductID)",
+        "CREATE INDEX IF NOT EXISTS idx_product_name ON Product (Name, ProductID)",
+        "CREATE INDEX IF NOT EXISTS idx_vet_rating_name_id ON Vet (Rating DESC, Name, VetID)",
+        "CREATE INDEX IF NOT EXISTS idx_orders_username_date_id ON Orders (Username, OrderDate DESC, OrderID DESC)",
+        "DROP INDEX IF EXISTS idx_product_category_pettype",
+        "DROP INDEX IF EXISTS idx_vet_rating",
+        "DROP INDEX IF EXISTS idx_orders_username_date",
+    ]),
+    (7, 'Product full-text search', [
+        # Generated from Name, so every INSERT/UPDATE keeps it current.
+        # services/product_search queries it with the same configuration.
+        """
+        ALTER TABLE Product ADD COLUMN IF NOT EXISTS SearchVector tsvector
+        GENERATED ALWAYS AS (to_tsvector('english'::regconfig, Name)) STORED
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_product_search ON Product USING gin (SearchVector)",
+    ]),
+    (8, 'Store and vet locations', [
+        # City/State are compared through normalize_place() keys, so case
+        # and spacing differences don't matter
+        """
+        CREATE OR REPLACE FUNCTION normalize_place(text) RETURNS text AS $$
+            SELECT lower(regexp_replace(btrim($1), '\\s+', ' ', 'g'))
+        $$ LANGUAGE sql IMMUTABLE
+        """,
+        functools.partial(_read_data_file, 'city_locations.sql'),
+    ] + [
+        statement
+        for table in ('Store', 'Vet')
+        for statement in (
+            f"""
+            ALTER TABLE {table}
+                ADD COLUMN IF NOT EXISTS CityKey TEXT GENERATED ALWAYS AS (normalize_place(City)) STORED,
+                ADD COLUMN IF NOT EXISTS StateKey TEXT GENERATED ALWAYS AS (normalize_place(State)) STORED,
+                ADD COLUMN IF NOT EXISTS Latitude DOUBLE PRECISION,
+                ADD COLUMN IF NOT EXISTS Longitude DOUBLE PRECISION
+            """,
+            f"CREATE INDEX IF NOT EXISTS idx_{table.lower()}_place ON {table} (StateKey, CityKey)",
+        )
+    ] + [
+        # Rows get their city's coordinates unless they are given explicit
+        # ones; moving a row to another city moves its coordinates with it
+        """
+        CREATE OR REPLACE FUNCTION fill_location_from_city() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.Latitude IS NULL OR NEW.Longitude IS NULL
+               OR (TG_OP = 'UPDATE'
+                   AND (NEW.City, NEW.State) IS DISTINCT FROM (OLD.City, OLD.State)
+                   AND (NEW.Latitude, NEW.Longitude) IS NOT DISTINCT FROM (OLD.Latitude, OLD.Longitude)) THEN
+                SELECT c.Latitude, c.Longitude INTO NEW.Latitude, NEW.Longitude
+                FROM CityLocation c
+                WHERE c.CityKey = normalize_place(NEW.City) AND c.StateKey = normalize_place(NEW.State);
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+    ] + [
+        statement
+        for table in ('Store', 'Vet')
+        for statement in (
+            f"DROP TRIGGER IF EXISTS trg_{table.lower()}_location ON {table}",
+            f"""
+            CREATE TRIGGER trg_{table.lower()}_location
+            BEFORE INSERT OR UPDATE ON {table}
+            FOR EACH ROW EXECUTE PROCEDURE fill_location_from_city()
+            """,
+            f"""
+            UPDATE {table} t
+            SET Latitude = c.Latitude, Longitude = c.Longitude
+            FROM CityLocation c
+            WHERE c.CityKey = t.CityKey AND c.StateKey = t.StateKey
+              AND (t.Latitude IS NULL OR t.Longitude IS NULL)
+            """,
+        )
+    ] + list(_version_trigger('citylocation'))),
+    (9, 'One cart line per user and product', [
+        # Fold duplicate lines into the oldest one before the unique index
+        # can be built; add_to_cart upserts against it
+        """
+        UPDATE Cart c
+        SET Quantity = d.Quantity
+        FROM (
+            SELECT MIN(CartID) as CartID, SUM(Quantity) as Quantity
+            FROM Cart
+            GROUP BY Username, ProductID
+            HAVING COUNT(*) > 1
+        ) d
+        WHERE c.CartID = d.CartID
+        """,
+        """
+        DELETE FROM Cart c
+        USING Cart keep
+        WHERE keep.Username = c.Username AND keep.ProductID = c.ProductID
+          AND keep.CartID < c.CartID
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_cart_username_product ON Cart (Username, ProductID)",
+        # Covered by the unique index's leading column
+        "DROP INDEX IF EXISTS idx_cart_username",
+    ]),
+    (10, 'Price store reports at current product prices', [
+        # Revenue used to be summed at the price an order was recorded at,
+        # which the original reports don't do; the summary now keeps
+        # quantities per product and prices them when a report runs
+        """
+        CREATE TABLE IF NOT EXISTS StoreProductSales (
+            StoreID INT REFERENCES Store(StoreID) ON DELETE CASCADE,
+            ProductID INT REFERENCES Product(ProductID) ON DELETE CASCADE,
+            LineCount INT NOT NULL DEFAULT 0,
+            Quantity BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (StoreID, ProductID)
+        )
+        """,
+        "ALTER TABLE StoreOrderStats DROP COLUMN IF EXISTS LineCount, DROP COLUMN IF EXISTS TotalRevenue",
+        """
+        DELETE FROM StoreOrderStats;
+        INSERT INTO StoreOrderStats (StoreID, Status, OrderCount)
+        SELECT StoreID, COALESCE(Status, 'Pending'), COUNT(*)
+        FROM Orders
+        WHERE StoreID IS NOT NULL
+        GROUP BY StoreID, COALESCE(Status, 'Pending');
+        DELETE FROM StoreProductSales;
+        INSERT INTO StoreProductSales (StoreID, ProductID, LineCount, Quantity)
+        SELECT o.StoreID, od.ProductID, COUNT(*), SUM(od.Quantity)
+        FROM Orders o
+        JOIN OrderDetails od ON o.OrderID = od.OrderID
+        WHERE o.StoreID IS NOT NULL
+        GROUP BY o.StoreID, od.ProductID
+        """,
+    ]),
+]
+
+
+def run_migrations(connection):
+    """Apply every migration newer than the recorded schema version.
+
+    Each migration runs in its own transaction together with its
+    SchemaVersion row. Stops at the first failure so later migrations never
+    run against a partially migrated schema. Returns the schema version
+    the database is at afterwards.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        cursor.execute(SCHEMA_VERSION_TABLE)
+        connection.commit()
+
+        cursor.execute("SELECT Version FROM SchemaVersion")
+        applied = {row[0] for row in cursor.fetchall()}
+        current = max(applied, default=0)
+
+        for version, description, statements in MIGRATIONS:
+            if version in applied:
+                continue
+            try:
+                for statement in statements:
+                    cursor.execute(statement() if callable(statement) else statement)
+                cursor.execute(
+                    "INSERT INTO SchemaVersion (Version, Description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                connection.commit()
+                current = version
+                logger.info("Applied migration %s: %s", version, description)
+            except Exception as e:
+                connection.rollback()
+                logger.exception("Error applying migration %s (%s): %s", version, description, e)
+                break
+
+        return current
+    finally:
+        connection.rollback()
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+        connection.commit()
+        cursor.close()
@@ -0,0 +1,143 @@
+import os
+
+from services import order_stats
+
+# Stock policies for checkout:
+#   accept  - order every cart line, taking stock only for the lines the
+#             store can cover (the original checkout behaviour)
+#   strict  - the whole order fails if any cart line cannot be reserved
+#   partial - reserve what the store can supply, leave the rest in the cart
+STOCK_POLICIES = ('accept', 'strict', 'partial')
+DEFAULT_STOCK_POLICY = os.environ.get('ORDER_STOCK_POLICY', 'accept')
+
+
+class OrderError(Exception):
+    """Raised when an order cannot be placed"""
+
+
+class EmptyCartError(OrderError):
+    pass
+
+
+class InsufficientStockError(OrderError):
+    def __init__(self, product_ids):
+        super().__init__(f"Insufficient stock for products: {', '.join(str(p) for p in product_ids)}")
+        self.product_ids = product_ids
+
+
+# Locks the user's cart rows and then the store's stock rows for them in
+# ProductID order. The reserving UPDATE locks rows in whatever order its
+# plan visits them, so without this two checkouts at the same store with
+# overlapping products could deadlock.
+LOCK_STOCK_QUERY = """
+    WITH cart AS (
+        SELECT ProductID
+        FROM Cart
+        WHERE Username = %s
+        ORDER BY CartID
+        FOR UPDATE
+    )
+    SELECT su.ProductID
+    FROM Supplies su
+    WHERE su.StoreID = %s
+      AND su.ProductID IN (SELECT ProductID FROM cart)
+    ORDER BY su.ProductID
+    FOR UPDATE OF su
+"""
+
+# Aggregates the locked cart rows per product and reserves
+# stock for every line the store can cover in one set-based UPDATE.
+RESERVE_STOCK_QUERY = """
+    WITH cart AS (
+        SELECT locked.ProductID, SUM(locked.Quantity) AS Quantity,
+               array_agg(locked.CartID) AS CartIDs
+        FROM (
+            SELECT CartID, ProductID, Quantity
+            FROM Cart
+            WHERE Username = %s
+            FOR UPDATE
+        ) locked
+        GROUP BY locked.ProductID
+    ),
+    reserved AS (
+        UPDATE Supplies su
+        SET Quantity = su.Quantity - c.Quantity
+        FROM cart c
+        WHERE su.StoreID = %s
+          AND su.ProductID = c.ProductID
+          AND su.Quantity >= c.Quantity
+        RETURNING su.ProductID
+    )
+    SELECT c.ProductID, c.Quantity, c.CartIDs, r.ProductID IS NOT NULL AS reserved
+    FROM cart c
+    LEFT JOIN reserved r ON r.ProductID = c.ProductID
+    ORDER BY c.ProductID
+"""
+
+# Creates the order, copies the reserved cart lines into OrderDetails with
+# INSERT ... SELECT and clears those cart rows in a single statement.
+CREATE_ORDER_QUERY = """
+    WITH new_order AS (
+        INSERT INTO Orders (Username, StoreID, Status)
+        VALUES (%s, %s, 'Pending')
+        RETURNING OrderID
+    ),
+    details AS (
+        INSERT INTO OrderDetails (OrderID, ProductID, Quantity)
+        SELECT o.OrderID, c.ProductID, SUM(c.Quantity)
+        FROM new_order o
+        CROSS JOIN Cart c
+        WHERE c.CartID = ANY(%s)
+        GROUP BY o.OrderID, c.ProductID
+    ),
+    cleared AS (
+        DELETE FROM Cart
+        WHERE CartID = ANY(%s)
+    )
+    SELECT OrderID FROM new_order
+"""
+
+
+class OrderService:
+    """Places orders from a user's cart in a single transaction.
+
+    Checkout costs four statements on one pooled connection (lock,
+    reserve, create, update the store summary) regardless of how many
+    items are in the cart.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def place_order(self, username, store_id, policy=None):
+        """Turn the user's cart into an order at store_id.
+
+        Returns a dict with the new order id, the products that were
+        ordered and the products the store couldn't supply: left in the
+        cart under the partial policy, ordered without stock under accept.
+        """
+        policy = policy or DEFAULT_STOCK_POLICY
+        if policy not in STOCK_POLICIES:
+            raise ValueError(f"Invalid stock policy: {policy}")
+
+        with self.db.transaction() as tx:
+            tx.execute_query(LOCK_STOCK_QUERY, (username, store_id))
+            lines = tx.execute_query(RESERVE_STOCK_QUERY, (username, store_id))
+            if not lines:
+                raise EmptyCartError("Cart is empty")
+
+            reserved = [line for line in lines if line[3]]
+            unavailable = [line[0] for line in lines if not line[3]]
+            if policy != 'accept' and (not reserved or (unavailable and policy == 'strict')):
+                raise InsufficientStockError(unavailable)
+
+            ordered = lines if policy == 'accept' else reserved
+            cart_ids = [cart_id for line in ordered for cart_id in line[2]]
+            order_id = tx.execute_query(CREATE_ORDER_QUERY, (username, store_id, cart_ids, cart_ids))[0][0]
+            order_stats.record_order(tx, order_id)
+
+        return {
+            "order_id": order_id,
+            "items": [{"productid": line[0], "quantity": line[1]} for line in ordered],
+            "unavailable": unavailable
+        }
@@ -0,0 +1,146 @@
+# Per-store order summary kept current by the order write paths.
+#
+# StoreOrderStats holds one row per (store, status) with the number of
+# orders, and StoreProductSales one row per (store, product) with the
+# number of order lines and the quantity ordered. place_order adds each
+# new order and update_order_status moves an order between statuses, so
+# store reports read a handful of summary rows instead of scanning Orders
+# and OrderDetails. Revenue is not stored: like the original reports, it
+# is priced with the current Product.Price when the report runs. The
+# tables are created and backfilled by migrations 1 and 10 in
+# services/migrations.py; rebuild() recomputes them the same way.
+
+import logging
+
+from psycopg2 import errors
+
+logger = logging.getLogger(__name__)
+
+REBUILD_QUERY = """
+    DELETE FROM StoreOrderStats;
+    INSERT INTO StoreOrderStats (StoreID, Status, OrderCount)
+    SELECT StoreID, COALESCE(Status, 'Pending'), COUNT(*)
+    FROM Orders
+    WHERE StoreID IS NOT NULL
+    GROUP BY StoreID, COALESCE(Status, 'Pending');
+    DELETE FROM StoreProductSales;
+    INSERT INTO StoreProductSales (StoreID, ProductID, LineCount, Quantity)
+    SELECT o.StoreID, od.ProductID, COUNT(*), SUM(od.Quantity)
+    FROM Orders o
+    JOIN OrderDetails od ON o.OrderID = od.OrderID
+    WHERE o.StoreID IS NOT NULL
+    GROUP BY o.StoreID, od.ProductID
+"""
+
+_COUNT_ORDER = """
+    INSERT INTO StoreOrderStats AS st (StoreID, Status, OrderCount)
+    SELECT StoreID, {status}, 1 FROM counted
+    ON CONFLICT (StoreID, Status) DO UPDATE
+    SET OrderCount = st.OrderCount + 1
+"""
+
+# Sales rows are upserted in ProductID order, the order checkout locks
+# stock rows in, so concurrent orders at a store can't deadlock
+RECORD_ORDER_QUERY = f"""
+    WITH counted AS (
+        SELECT StoreID, COALESCE(Status, 'Pending') AS Status
+        FROM Orders
+        WHERE OrderID = %(order_id)s AND StoreID IS NOT NULL
+    ),
+    sold AS (
+        INSERT INTO StoreProductSales AS sp (StoreID, ProductID, LineCount, Quantity)
+        SELECT c.StoreID, od.ProductID, 1, od.Quantity
+        FROM counted c
+        JOIN OrderDetails od ON od.OrderID = %(order_id)s
+        ORDER BY od.ProductID
+        ON CONFLICT (StoreID, ProductID) DO UPDATE
+        SET LineCount = sp.LineCount + EXCLUDED.LineCount,
+            Quantity = sp.Quantity + EXCLUDED.Quantity
+    )
+    {_COUNT_ORDER.format(status='Status')}
+"""
+
+# Status doesn't affect StoreProductSales, so only the order count moves
+MOVE_ORDER_QUERY = f"""
+    WITH counted AS (
+        SELECT StoreID
+        FROM Orders
+        WHERE OrderID = %(order_id)s AND StoreID IS NOT NULL
+    ),
+    removed AS (
+        UPDATE StoreOrderStats st
+        SET OrderCount = st.OrderCount - 1
+        FROM counted c
+        WHERE st.StoreID = c.StoreID AND st.Status = %(old_status)s
+    )
+    {_COUNT_ORDER.format(status='%(new_status)s')}
+"""
+
+# Summary-backed replacements for report queries in data/queries.sql,
+# keyed by the query's description. Column names and results match the
+# originals.
+SUMMARY_QUERIES = {
+    # AVG over order lines is their total divided by their count
+    'Total and Average revenue per store': """
+        SELECT s.Name AS StoreName,
+               SUM(p.Price * sp.Quantity) AS TotalRevenue,
+               SUM(p.Price * sp.Quantity) / SUM(sp.LineCount) AS AverageRevenue
+        FROM StoreProductSales sp
+        JOIN Product p ON sp.ProductID = p.ProductID
+        JOIN Store s ON sp.StoreID = s.StoreID
+        WHERE sp.LineCount > 0
+        GROUP BY s.Name
+        ORDER BY TotalRevenue DESC
+    """,
+    # Orders without a store aren't summarized; the original query counts
+    # them as a NULL store, so they are counted here from Orders directly
+    'Stores with maximum orders': """
+        SELECT StoreID, OrderCount
+        FROM (
+            SELECT StoreID, SUM(OrderCount) AS OrderCount,
+                   RANK() OVER (ORDER BY SUM(OrderCount) DESC) AS OrderRank
+            FROM (
+                SELECT StoreID, OrderCount FROM StoreOrderStats
+                UNION ALL
+                SELECT NULL, COUNT(*)::int FROM Orders WHERE StoreID IS NULL
+            ) counts
+            GROUP BY StoreID
+            HAVING SUM(OrderCount) > 0
+        ) ranked
+        WHERE OrderRank = 1
+    """
+}
+
+
+def _apply(tx, query, params):
+    """Run a summary update, skipping it if the summary tables don't exist yet.
+
+    The update runs under a savepoint so that, before migrations have been
+    applied, the order itself still commits.
+    """
+    try:
+        with tx.savepoint():
+            tx.execute_query(query, params, fetch=False)
+    except errors.UndefinedTable as e:
+        logger.warning("Order summary not updated (run the migrations): %s", e)
+
+
+def rebuild(tx):
+    """Recompute the whole summary from Orders, e.g. after manual data fixes"""
+    tx.execute_query(REBUILD_QUERY, fetch=False)
+
+
+def record_order(tx, order_id):
+    """Add a newly placed order to the summary"""
+    _apply(tx, RECORD_ORDER_QUERY, {'order_id': order_id})
+
+
+def move_order(tx, order_id, old_status, new_status):
+    """Move an order's count from old_status to new_status"""
+    if old_status == new_status:
+        return
+    _apply(
+        tx,
+        MOVE_ORDER_QUERY,
+        {'order_id': order_id, 'old_status': old_status or 'Pending', 'new_status': new_status}
+    )
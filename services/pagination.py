@@ -0,0 +1,133 @@
+import base64
+import json
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+
+def parse_limit(value, default=None):
+    """Parse a ?limit= value, returning default when absent.
+
+    Raises ValueError for non-positive or non-numeric values. Limits above
+    MAX_LIMIT are clamped.
+    """
+    if value is None or value == '':
+        return default
+    limit = int(value)
+    if limit <= 0:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, MAX_LIMIT)
+
+
+def encode_cursor(*values):
+    """Encode the sort key of the last returned row as an opaque cursor"""
+    payload = json.dumps([str(v) if v is not None else None for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Decode a cursor produced by encode_cursor into a list of `size` values.
+
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def parse_page(args, key_count):
+    """Read ?limit= and ?after= for a keyset-paged listing.
+
+    Returns (limit, after) where after is the decoded cursor values, or
+    None for the first page. limit is None when neither parameter was
+    given, i.e. the caller should return the unpaged list. ?cursor= is
+    accepted as an alias of ?after=. Raises ValueError for bad values.
+    """
+    cursor = args.get('after') or args.get('cursor')
+    limit = parse_limit(args.get('limit'), DEFAULT_LIMIT if cursor else None)
+    after = decode_cursor(cursor, key_count) if cursor else None
+    return limit, after
+
+
+def order_by(keys):
+    """ORDER BY list for keys, a sequence of (column, descending) pairs"""
+    return ', '.join(f"{column} DESC" if descending else column for column, descending in keys)
+
+
+def seek_condition(keys, values):
+    """SQL condition (and its params) matching the rows after values in keys order.
+
+    keys are (column, descending) pairs as given to order_by and must end
+    with a unique column. Descending keys may be NULL (PostgreSQL sorts
+    NULLs first there); ascending keys must not be.
+    """
+    if len({descending for _, descending in keys}) == 1 and None not in values:
+        # Row comparison lets PostgreSQL seek straight into a matching index
+        columns = ', '.join(column for column, _ in keys)
+        placeholders = ', '.join(['%s'] * len(keys))
+        operator = '<' if keys[0][1] else '>'
+        return f"({columns}) {operator} ({placeholders})", list(values)
+
+    alternatives = []
+    params = []
+    for i, ((column, descending), value) in enumerate(zip(keys, values)):
+        terms = []
+        for (prefix_column, _), prefix_value in zip(keys[:i], values[:i]):
+            if prefix_value is None:
+                terms.append(f"{prefix_column} IS NULL")
+            else:
+                terms.append(f"{prefix_column} = %s")
+                params.append(prefix_value)
+        if value is None:
+            terms.append(f"{column} IS NOT NULL")
+        else:
+            terms.append(f"{column} {'<' if descending else '>'} %s")
+            params.append(value)
+        alternatives.append('(' + ' AND '.join(terms) + ')')
+    return '(' + ' OR '.join(alternatives) + ')', params
+
+
+def keyset_page(rows, limit, key_columns, columns=None):
+    """Trim rows fetched with LIMIT limit + 1 to (page, next_cursor).
+
+    Rows are dicts, or lists in the order of columns for columnar results.
+    next_cursor is None on the last page.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    if columns is not None:
+        last = dict(zip(columns, last))
+    return rows, encode_cursor(*(last[column] for column in key_columns))
+
+
+def fetch_page(db, query, params, keys, key_columns, limit, after, name, group_by='', columnar=False):
+    """Run a listing query for one keyset page and return the response body.
+
+    query ends in its WHERE clause (no ORDER BY); the seek condition is
+    ANDed onto it, followed by group_by if given. key_columns are the
+    result columns holding the keys values. The body is {name: rows,
+    "next_cursor": ...}, or with columnar the execute_query_columnar
+    result plus "next_cursor".
+    """
+    params = list(params)
+    if after is not None:
+        condition, seek_params = seek_condition(keys, after)
+        query += " AND " + condition
+        params += seek_params
+    query += f" {group_by} ORDER BY {order_by(keys)} LIMIT %s"
+    params.append(limit + 1)
+
+    if columnar:
+        result = db.execute_query_columnar(query, tuple(params))
+        result['rows'], result['next_cursor'] = keyset_page(result['rows'], limit, key_columns, result['columns'])
+        return result
+
+    rows, next_cursor = keyset_page(db.execute_query_with_column_names(query, tuple(params)), limit, key_columns)
+    return {name: rows, "next_cursor": next_cursor}
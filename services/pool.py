@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection becomes free within the checkout timeout"""
+
+
+class ManagedPool:
+    """Thread-safe PostgreSQL connection pool with health checks.
+
+    A drop-in replacement for psycopg2's ThreadedConnectionPool
+    (getconn/putconn/closeall) that:
+
+    - blocks for up to timeout seconds when all maxconn connections are
+      checked out, instead of raising immediately
+    - discards connections older than recycle seconds, and with pre_ping
+      validates an idle connection before handing it out, so a connection
+      killed by a database restart is replaced instead of failing a request
+    - opens minconn connections up front so the first requests don't pay
+      for connection setup
+    - keeps counters for in-use/idle connections and checkout wait time
+    """
+
+    def __init__(self, minconn, maxconn, timeout=30.0, recycle=None, pre_ping=True, on_wait=None, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool bounds: min={minconn}, max={maxconn}")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.on_wait = on_wait
+        self._connect_kwargs = connect_kwargs
+
+        # One slot per connection that may exist; idle connections are
+        # reused most-recently-returned first so the rest can age out
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._idle = []
+        self._in_use = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.waiting = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.discarded = 0
+        self.wait_time = 0.0
+
+        self.warm_up()
+
+    def warm_up(self):
+        """Open connections until minconn are available"""
+        with self._lock:
+            missing = self.minconn - len(self._idle) - len(self._in_use)
+        for _ in range(max(missing, 0)):
+            connection = self._connect()
+            with self._lock:
+                self._idle.append((connection, time.monotonic(), time.monotonic()))
+
+    def _connect(self):
+        return psycopg2.connect(**self._connect_kwargs)
+
+    def getconn(self):
+        """Check out a connection, waiting up to timeout seconds for a free one"""
+        if self._closed:
+            raise PoolError("connection pool is closed")
+
+        started = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+        try:
+            acquired = self._slots.acquire(timeout=self.timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        waited = time.monotonic() - started
+
+        with self._lock:
+            self.wait_time += waited
+            if not acquired:
+                self.timeouts += 1
+        if self.on_wait is not None:
+            self.on_wait(waited)
+        if not acquired:
+            raise PoolTimeout(f"no database connection available within {self.timeout}s")
+
+        try:
+            connection, created_at = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use[connection] = created_at
+            self.checkouts += 1
+        return connection
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                item = self._idle.pop() if self._idle else None
+            if item is None:
+                return self._connect(), time.monotonic()
+            connection, created_at, _ = item
+            if self._usable(connection, created_at):
+                return connection, created_at
+            self._discard(connection)
+
+    def _usable(self, connection, created_at):
+        if connection.closed:
+            return False
+        if self.recycle and time.monotonic() - created_at > self.recycle:
+            return False
+        if self.pre_ping:
+            try:
+                # Left open on purpose: the caller's statements join this
+                # transaction, so the ping costs a single round trip
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+            except psycopg2.Error as e:
+                logger.warning("Discarding dead pooled connection: %s", e)
+                return False
+        return True
+
+    def _discard(self, connection):
+        with self._lock:
+            self.discarded += 1
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def putconn(self, connection, close=False):
+        """Return a connection to the pool, rolling back any open transaction"""
+        with self._lock:
+            created_at = self._in_use.pop(connection, None)
+        if created_at is None:
+            raise PoolError("trying to put unkeyed connection")
+
+        try:
+            if close or self._closed or connection.closed:
+                self._discard(connection)
+                return
+            try:
+                status = connection.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    self._discard(connection)
+                    return
+                if status != extensions.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except psycopg2.Error:
+                self._discard(connection)
+                return
+            with self._lock:
+                self._idle.append((connection, created_at, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        """Close idle connections now and checked-out ones when they are returned"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for connection, _, _ in idle:
+            try:
+                connection.close()
+            except psycopg2.Error:
+                pass
+
+    def stats(self):
+        """Return pool bounds, connection counts and checkout counters"""
+        with self._lock:
+            return {
+                "min": self.minconn,
+                "max": self.maxconn,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "waiting": self.waiting,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "discarded": self.discarded,
+                "wait_seconds_total": round(self.wait_time, 6)
+            }
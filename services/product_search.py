@@ -0,0 +1,208 @@
+import os
+import re
+import threading
+
+from services.pagination import keyset_page, order_by, seek_condition
+
+# Text search configuration used for Product.SearchVector (migration 7)
+TS_CONFIG = 'english'
+
+# Most relevant first; name and id make the key unique for keyset paging
+SEARCH_KEYS = (('m.relevance', True), ('m.name', False), ('m.id', False))
+SEARCH_KEY_COLUMNS = ('relevance', 'name', 'id')
+
+# Lower bounds of the price facet buckets; the last bucket is open-ended
+PRICE_BUCKETS = tuple(
+    int(bound) for bound in os.environ.get('SEARCH_PRICE_BUCKETS', '0,500,1000,2000,5000').split(',')
+)
+
+_WORD = re.compile(r'[^\W_]+')
+
+
+def to_tsquery_text(term):
+    """Turn free text into to_tsquery() input matching all of its words.
+
+    The last word is matched as a prefix so partially typed queries find
+    results. Returns None if term has no words.
+    """
+    words = _WORD.findall(term.lower())
+    if not words:
+        return None
+    return ' & '.join(words[:-1] + [words[-1] + ':*'])
+
+
+class ProductSearch:
+    """Ranked product search with category, pet type and price facets.
+
+    Products match when their SearchVector matches every word of the term
+    (the last one as a prefix). When pg_trgm is installed, names similar
+    to the term also match, so misspelt words still find products;
+    otherwise terms the text index can't use (stop words only, or no
+    words at all) are matched as substrings of the name.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._trigram = None
+        self._lock = threading.Lock()
+
+    def has_trigram(self):
+        """True if the pg_trgm extension is installed (checked once)"""
+        if self._trigram is None:
+            with self._lock:
+                if self._trigram is None:
+                    rows = self.db.execute_query("SELECT COUNT(*) FROM pg_extension WHERE extname = 'pg_trgm'")
+                    if not rows:
+                        return False
+                    self._trigram = rows[0][0] > 0
+        return self._trigram
+
+    def _matches(self, term):
+        """Subquery of matching products with their relevance, and its params"""
+        tsquery = to_tsquery_text(term) if term else None
+        if not term:
+            match, relevance, params = "TRUE", "0::float8", []
+        elif tsquery is None:
+            # No words (e.g. punctuation): matched as a substring
+            match, relevance, params = "p.Name ILIKE %s", "0::float8", [f'%{term}%']
+        elif self.has_trigram():
+            match = f"(p.SearchVector @@ to_tsquery('{TS_CONFIG}', %s) OR %s <%% p.Name)"
+            relevance = f"(ts_rank(p.SearchVector, to_tsquery('{TS_CONFIG}', %s)) + word_similarity(%s, p.Name))::float8"
+            params = [tsquery, term, tsquery, term]
+        else:
+            # A term made only of stop words ("the", "for") gives an empty
+            # tsquery that matches nothing, so it is matched as a substring
+            # instead. to_tsquery() of a constant is folded when planning,
+            # so other terms still use the GIN index alone.
+            match = (
+                f"(p.SearchVector @@ to_tsquery('{TS_CONFIG}', %s)"
+                f" OR (numnode(to_tsquery('{TS_CONFIG}', %s)) = 0 AND p.Name ILIKE %s))"
+            )
+            relevance = f"ts_rank(p.SearchVector, to_tsquery('{TS_CONFIG}', %s))::float8"
+            params = [tsquery, tsquery, tsquery, f'%{term}%']
+
+        # relevance is selected before match is tested, so its params come first
+        query = f"""
+            SELECT p.ProductID as id, p.Name as name, p.Price as price,
+                   p.CategoryID as category_id, p.PetTypeID as pet_type_id,
+                   {relevance} as relevance
+            FROM Product p
+            WHERE {match}
+        """
+        return query, params
+
+    @staticmethod
+    def _filters(filters, exclude=None):
+        """AND of the category/pet type/price filters except exclude, and its params"""
+        conditions = ["TRUE"]
+        params = []
+        if filters.get('category_id') is not None and exclude != 'category':
+            conditions.append("m.category_id = %s")
+            params.append(filters['category_id'])
+        if filters.get('pet_type_id') is not None and exclude != 'pet_type':
+            conditions.append("m.pet_type_id = %s")
+            params.append(filters['pet_type_id'])
+        if exclude != 'price':
+            if filters.get('min_price') is not None:
+                conditions.append("m.price >= %s")
+                params.append(filters['min_price'])
+            if filters.get('max_price') is not None:
+                conditions.append("m.price <= %s")
+                params.append(filters['max_price'])
+        return ' AND '.join(conditions), params
+
+    def _listing(self, source, filters):
+        condition, params = self._filters(filters)
+        query = f"""
+            SELECT m.id, m.name, m.price, sc.CategoryName as category,
+                   pt.PetTypeName as pet_type, m.relevance
+            FROM {source} m
+            JOIN ShoppingCategory sc ON m.category_id = sc.CategoryID
+            JOIN PetType pt ON m.pet_type_id = pt.PetTypeID
+            WHERE {condition}
+        """
+        return query, params
+
+    def listing_query(self, term, filters):
+        """Query (ending in its WHERE clause) for the matching products.
+
+        Rows have the same columns as the unranked search plus relevance;
+        order them by SEARCH_KEYS.
+        """
+        matches, params = self._matches(term)
+        query, filter_params = self._listing(f"({matches})", filters)
+        return query, params + filter_params
+
+    def search(self, term, filters, limit=None, after=None):
+        """Return a page of ranked products together with their facets.
+
+        Results and facets come from one statement over a single scan of
+        the matching products. Each facet is counted with every filter
+        applied except its own, so the counts show what choosing another
+        value would return.
+        """
+        matches, params = self._matches(term)
+        listing, listing_params = self._listing("matches", filters)
+        if after is not None:
+            condition, seek_params = seek_condition(SEARCH_KEYS, after)
+            listing += " AND " + condition
+            listing_params += seek_params
+        listing += " ORDER BY " + order_by(SEARCH_KEYS)
+        if limit is not None:
+            listing += " LIMIT %s"
+            listing_params.append(limit + 1)
+
+        category_filter, category_params = self._filters(filters, exclude='category')
+        pet_type_filter, pet_type_params = self._filters(filters, exclude='pet_type')
+        price_filter, price_params = self._filters(filters, exclude='price')
+        buckets = ', '.join(
+            f"({lower}, {upper if upper is not None else 'NULL'})"
+            for lower, upper in zip(PRICE_BUCKETS, PRICE_BUCKETS[1:] + (None,))
+        )
+
+        query = f"""
+            WITH matches AS MATERIALIZED ({matches})
+            SELECT
+                (SELECT COALESCE(json_agg(page ORDER BY page.relevance DESC, page.name, page.id), '[]') FROM ({listing}) page) as products,
+                (SELECT COALESCE(json_agg(facet ORDER BY facet.count DESC, facet.name), '[]') FROM (
+                    SELECT sc.CategoryID as id, sc.CategoryName as name, COUNT(*) as count
+                    FROM matches m
+                    JOIN ShoppingCategory sc ON m.category_id = sc.CategoryID
+                    WHERE {category_filter}
+                    GROUP BY sc.CategoryID, sc.CategoryName
+                ) facet) as categories,
+                (SELECT COALESCE(json_agg(facet ORDER BY facet.count DESC, facet.name), '[]') FROM (
+                    SELECT pt.PetTypeID as id, pt.PetTypeName as name, COUNT(*) as count
+                    FROM matches m
+                    JOIN PetType pt ON m.pet_type_id = pt.PetTypeID
+                    WHERE {pet_type_filter}
+                    GROUP BY pt.PetTypeID, pt.PetTypeName
+                ) facet) as pet_types,
+                (SELECT json_agg(facet ORDER BY facet.min) FROM (
+                    SELECT b.min, b.max, COUNT(m.id) as count
+                    FROM (VALUES {buckets}) b(min, max)
+                    LEFT JOIN matches m
+                        ON m.price >= b.min AND (b.max IS NULL OR m.price < b.max) AND {price_filter}
+                    GROUP BY b.min, b.max
+                ) facet) as price_ranges
+        """
+        rows = self.db.execute_query(
+            query,
+            tuple(params + listing_params + category_params + pet_type_params + price_params)
+        )
+        if not rows:
+            raise RuntimeError("Product search query failed")
+
+        products, categories, pet_types, price_ranges = rows[0]
+        next_cursor = None
+        if limit is not None:
+            products, next_cursor = keyset_page(products, limit, SEARCH_KEY_COLUMNS)
+        return {
+            "products": products,
+            "next_cursor": next_cursor,
+            "facets": {
+                "categories": categories,
+                "pet_types": pet_types,
+                "price_ranges": price_ranges
+            }
+        }
@@ -0,0 +1,99 @@
+import hashlib
+import os
+import threading
+
+from services.order_stats import SUMMARY_QUERIES
+
+QUERIES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'queries.sql')
+
+
+def parse_queries(content, rewrites=None):
+    """Split the contents of queries.sql into numbered query entries.
+
+    Each query is introduced by a "-- description" comment line. Commented
+    out ALTER TABLE sections and sections without SQL are skipped. When
+    rewrites maps a description to SQL, that SQL is executed in place of
+    the query as written (the original is still reported as 'sql', the
+    rewrite as 'executed_sql' by the queries endpoint).
+    """
+    rewrites = rewrites or {}
+    queries = {}
+    sections = content.split('--')
+
+    current_query_id = 0
+    for i in range(1, len(sections)):
+        section = sections[i].strip()
+        if not section:
+            continue
+
+        lines = section.split('\n')
+        description = lines[0].strip()
+        body = '\n'.join(lines[1:])
+
+        # Skip ALTER TABLE statements
+        if 'ALTER TABLE' in body or 'ADD COLUMN' in body:
+            continue
+
+        # Create a query only if there's SQL code
+        if len(lines) > 1 and any(keyword in body.upper() for keyword in ['SELECT', 'INSERT', 'UPDATE', 'DELETE']):
+            query_sql = body.strip()
+
+            if query_sql:
+                current_query_id += 1
+                normalized_sql = query_sql.rstrip(';').strip()
+                execution_sql = rewrites.get(description, normalized_sql).strip()
+                digest = hashlib.sha1(execution_sql.encode('utf-8')).hexdigest()[:10]
+                queries[current_query_id] = {
+                    'id': current_query_id,
+                    'description': description,
+                    'sql': query_sql,
+                    'normalized_sql': normalized_sql,
+                    'execution_sql': execution_sql,
+                    'statement_name': f"q{current_query_id}_{digest}"
+                }
+
+    return queries
+
+
+class QueryRegistry:
+    """Predefined queries from data/queries.sql, parsed once.
+
+    The file is re-parsed only when its modification time changes. Each
+    entry carries a statement name derived from its SQL, so an edited query
+    is prepared under a new name instead of reusing a stale plan.
+    """
+
+    def __init__(self, path=QUERIES_PATH, rewrites=None):
+        self.path = path
+        self.rewrites = rewrites
+        self._mtime = None
+        self._queries = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            with open(self.path, 'r', encoding='utf-8') as file:
+                self._queries = parse_queries(file.read(), self.rewrites)
+            self._mtime = mtime
+
+    def all(self):
+        """Return {id: {id, description, sql}} for every query"""
+        self._refresh()
+        return {
+            query_id: {'id': query['id'], 'description': query['description'], 'sql': query['sql']}
+            for query_id, query in self._queries.items()
+        }
+
+    def get(self, query_id):
+        """Return the full entry for query_id, or None"""
+        self._refresh()
+        return self._queries.get(query_id)
+
+
+# Store revenue and order-count reports read the StoreOrderStats summary
+query_registry = QueryRegistry(rewrites=SUMMARY_QUERIES)
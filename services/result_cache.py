@@ -0,0 +1,107 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def parse_ttls(value):
+    """Parse per-key TTL overrides of the form "1=300,4=600" """
+    ttls = {}
+    for item in (value or '').split(','):
+        if '=' not in item:
+            continue
+        key, ttl = item.split('=', 1)
+        ttls[int(key.strip())] = float(ttl.strip())
+    return ttls
+
+
+class ResultCache:
+    """Result cache for expensive report queries with stale-while-revalidate.
+
+    A fresh entry is returned directly. An entry past its TTL but still
+    inside the stale window is returned immediately while a background
+    thread recomputes it, so at most one refresh per key runs at a time and
+    callers never wait on the aggregate. Anything older is recomputed
+    synchronously.
+    """
+
+    def __init__(self, default_ttl=None, stale_ttl=None, ttls=None):
+        self.default_ttl = float(default_ttl if default_ttl is not None else os.environ.get('ANALYTICS_CACHE_TTL', 60))
+        self.stale_ttl = float(stale_ttl if stale_ttl is not None else os.environ.get('ANALYTICS_CACHE_STALE', 600))
+        self.ttls = ttls if ttls is not None else parse_ttls(os.environ.get('ANALYTICS_CACHE_TTLS'))
+        self._entries = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def ttl_for(self, query_id):
+        """Return the configured TTL for query_id (0 disables caching)"""
+        return self.ttls.get(query_id, self.default_ttl)
+
+    def get(self, key, loader, ttl=None):
+        """Return the cached result for key, computing it with loader() when needed"""
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl <= 0:
+            return loader()
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry[0]
+                if age < ttl:
+                    self.hits += 1
+                    return entry[1]
+                if age < ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        threading.Thread(target=self._refresh, args=(key, loader), daemon=True).start()
+                    return entry[1]
+            self.misses += 1
+
+        value = loader()
+        self._store(key, value)
+        return value
+
+    def _store(self, key, value):
+        # Database helpers return an empty list on errors, so empty results
+        # are never cached
+        if value:
+            with self._lock:
+                self._entries[key] = (time.monotonic(), value)
+
+    def _refresh(self, key, loader):
+        try:
+            self._store(key, loader())
+        except Exception as e:
+            logger.exception("Error refreshing cached result %s: %s", key, e)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        """Return hit/miss counters and the current number of entries"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "refreshing": len(self._refreshing)
+            }
+
+
+analytics_cache = ResultCache()
@@ -0,0 +1,15 @@
+from flask import request
+
+COMPACT_MIMETYPE = 'application/vnd.happytails.compact+json'
+
+
+def wants_compact():
+    """True when the client asked for column-oriented results.
+
+    Either ?format=compact or Accept: application/vnd.happytails.compact+json.
+    Compact responses are {"columns": [...], "rows": [[...], ...]} instead
+    of a list of objects that repeat every column name.
+    """
+    if request.args.get('format', '').lower() == 'compact':
+        return True
+    return request.accept_mimetypes.best == COMPACT_MIMETYPE
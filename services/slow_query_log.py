@@ -0,0 +1,134 @@
+import collections
+import datetime
+import logging
+import os
+import random
+import re
+import threading
+
+from flask import has_request_context, request
+
+logger = logging.getLogger(__name__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_WHITESPACE = re.compile(r"\s+")
+# Writes, row locks (FOR [NO KEY] UPDATE / FOR [KEY] SHARE), SELECT INTO
+# and sequence calls all have effects that re-running the statement repeats
+_WRITE_KEYWORDS = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|MERGE|INTO|FOR\s+(?:KEY\s+)?SHARE|NEXTVAL|SETVAL)\b", re.IGNORECASE
+)
+
+
+def normalize_sql(query):
+    """Collapse whitespace and replace inline literals with ? so similar statements group together"""
+    query = _STRING_LITERAL.sub('?', query)
+    query = _NUMBER_LITERAL.sub('?', query)
+    return _WHITESPACE.sub(' ', query).strip()
+
+
+def params_shape(params):
+    """Describe query parameters by type only, so values never reach the log"""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: params_shape(value) for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        # Long scalar lists (ANY(%s) arguments) are summarized by length
+        if len(params) > 10 and not any(isinstance(value, (list, tuple, dict)) for value in params):
+            return f"{type(params).__name__}[{len(params)}]"
+        return [params_shape(value) for value in params]
+    return type(params).__name__
+
+
+def is_explainable(query):
+    """Only plain reads are EXPLAIN ANALYZEd, since ANALYZE executes the statement again"""
+    head = query.lstrip().split(None, 1)[0].upper() if query.strip() else ''
+    return head in ('SELECT', 'WITH') and not _WRITE_KEYWORDS.search(query)
+
+
+class SlowQueryLog:
+    """Bounded ring buffer of statements slower than a threshold.
+
+    Configured by SLOW_QUERY_MS (default 200), SLOW_QUERY_LOG_SIZE
+    (default 100) and SLOW_QUERY_EXPLAIN_RATE, the fraction of slow reads
+    whose plan is captured with EXPLAIN (ANALYZE, BUFFERS) (default 0,
+    off). Plans are captured on a background thread, one at a time, so the
+    request that hit the slow statement never waits for it.
+    """
+
+    def __init__(self, threshold_ms=None, size=None, explain_rate=None):
+        self.threshold = float(threshold_ms if threshold_ms is not None else os.environ.get('SLOW_QUERY_MS', 200)) / 1000
+        self.explain_rate = float(explain_rate if explain_rate is not None else os.environ.get('SLOW_QUERY_EXPLAIN_RATE', 0))
+        self._entries = collections.deque(maxlen=int(size or os.environ.get('SLOW_QUERY_LOG_SIZE', 100)))
+        self._lock = threading.Lock()
+        self._explaining = False
+        self.total = 0
+
+    def record(self, query, params, duration, rows=0, explain=None):
+        """Keep the statement if it ran longer than the threshold.
+
+        explain(query, params) should return the plan as text; it is only
+        called for a sampled fraction of read-only statements.
+        """
+        if duration < self.threshold:
+            return
+
+        entry = {
+            "recorded_at": datetime.datetime.now().isoformat(sep=' ', timespec='seconds'),
+            "endpoint": request.endpoint if has_request_context() else None,
+            "duration_ms": round(duration * 1000, 3),
+            "rows": rows,
+            "sql": normalize_sql(query),
+            "params": params_shape(params),
+            "plan": None
+        }
+        with self._lock:
+            self._entries.append(entry)
+            self.total += 1
+            capture = (
+                explain is not None
+                and not self._explaining
+                and self.explain_rate > 0
+                and random.random() < self.explain_rate
+                and is_explainable(query)
+            )
+            if capture:
+                self._explaining = True
+
+        logger.warning("Slow query (%.1f ms): %s", entry["duration_ms"], entry["sql"])
+        if capture:
+            threading.Thread(target=self._explain, args=(entry, explain, query, params), daemon=True).start()
+
+    def _explain(self, entry, explain, query, params):
+        try:
+            entry["plan"] = explain(query, params)
+        except Exception as e:
+            logger.warning("Error capturing plan for slow query: %s", e)
+        finally:
+            with self._lock:
+                self._explaining = False
+
+    def entries(self):
+        """Return the recorded statements, newest first"""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        """Drop every recorded statement"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return the configuration and the number of statements seen"""
+        with self._lock:
+            return {
+                "threshold_ms": self.threshold * 1000,
+                "explain_rate": self.explain_rate,
+                "capacity": self._entries.maxlen,
+                "entries": len(self._entries),
+                "total": self.total
+            }
+
+
+slow_query_log = SlowQueryLog()
@@ -0,0 +1,95 @@
+from itertools import chain
+
+from flask import Response, current_app, request, stream_with_context
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Serialized rows are buffered up to this many bytes before being written
+CHUNK_SIZE = 64 * 1024
+
+
+def wants_stream():
+    """True when the client asked for a streamed response.
+
+    Either ?stream=1 (streamed JSON array) or ?stream=ndjson /
+    Accept: application/x-ndjson (one JSON document per line).
+    """
+    return request.args.get('stream', '').lower() in ('1', 'true', 'json', 'ndjson') or wants_ndjson()
+
+
+def wants_ndjson():
+    if request.args.get('stream', '').lower() == 'ndjson':
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def _buffered(pieces):
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _primed(rows):
+    """Pull the first row now so query errors surface before headers are sent"""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return iter(())
+    return chain((first,), rows)
+
+
+def _json_array(rows, dumps):
+    yield '['
+    for i, row in enumerate(rows):
+        yield (',' if i else '') + dumps(row)
+    yield ']'
+
+
+def stream_json(rows, envelope=None, key='results'):
+    """Stream rows as a JSON array.
+
+    With envelope, the array is emitted as envelope[key] alongside the
+    other envelope fields, e.g. {"id": 1, ..., "results": [...]}.
+    """
+    rows = _primed(rows)
+    dumps = current_app.json.dumps
+
+    def generate():
+        if envelope:
+            head = dumps(envelope)
+            yield head[:-1] + (', ' if len(head) > 2 else '') + dumps(key) + ': '
+        yield from _json_array(rows, dumps)
+        if envelope:
+            yield '}'
+
+    return Response(stream_with_context(_buffered(generate())), mimetype='application/json')
+
+
+def stream_ndjson(rows):
+    """Stream rows as newline-delimited JSON, one row per line"""
+    rows = _primed(rows)
+    dumps = current_app.json.dumps
+
+    def generate():
+        for row in rows:
+            yield dumps(row) + '\n'
+
+    return Response(stream_with_context(_buffered(generate())), mimetype=NDJSON_MIMETYPE)
+
+
+def stream_rows(rows, envelope=None, key='results'):
+    """Stream rows in the format the client negotiated.
+
+    NDJSON carries no envelope; only the rows are sent.
+    """
+    if wants_ndjson():
+        return stream_ndjson(rows)
+    return stream_json(rows, envelope, key)
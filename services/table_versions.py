@@ -0,0 +1,89 @@
+import logging
+import os
+import threading
+import time
+
+from services.database import Database
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_QUERY = "SELECT TableName, Version, UpdatedAt FROM TableVersion"
+
+
+class TableVersions:
+    """In-process copy of the TableVersion counters (migration 5).
+
+    A worker thread reloads the counters every interval seconds, so
+    readers such as the HTTP validators and the catalog cache see writes
+    made by any process without querying the database themselves. Until
+    the first load completes (or if TableVersion doesn't exist) versions
+    are unknown and get() returns None.
+    """
+
+    def __init__(self, db, interval=None):
+        self.db = db
+        self.interval = float(interval or os.environ.get('TABLE_VERSIONS_INTERVAL', 2))
+        # lower-case table name -> (version, updated at)
+        self._versions = {}
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, table):
+        """Return (version, updated at) for table, or None if not known yet"""
+        self.ensure_started()
+        return self._versions.get(table.lower())
+
+    def version(self, table):
+        """Return the version of table, or None if not known yet"""
+        state = self.get(table)
+        return state[0] if state is not None else None
+
+    def refresh(self):
+        """Reload the counters, keeping the previous ones if the query fails"""
+        rows = self.db.execute_query(VERSIONS_QUERY)
+        if rows:
+            # Replaced as a whole, so readers never need a lock
+            self._versions = {name: (version, updated_at) for name, version, updated_at in rows}
+            self._refreshed_at = time.time()
+
+    def start(self):
+        """Start the polling thread (no-op if running); the first load happens on it"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='table-versions', daemon=True)
+            self._thread.start()
+
+    def ensure_started(self):
+        """Start on first use if no entry point called start(), or after a fork"""
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+
+    def stop(self, timeout=None):
+        """Stop the polling thread and wait for it to exit"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.exception("Error reading table versions: %s", e)
+            if self._stop.wait(self.interval):
+                return
+
+    def stats(self):
+        """Return the known versions and when they were last loaded"""
+        return {
+            "tables": {name: version for name, (version, _) in sorted(self._versions.items())},
+            "refreshed_at": self._refreshed_at,
+            "refresh_interval_seconds": self.interval
+        }
+
+
+table_versions = TableVersions(Database())
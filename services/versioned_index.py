@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_QUERY = """
+    SELECT TableName, Version
+    FROM TableVersion
+    WHERE TableName = ANY(%s)
+"""
+
+
+class VersionedIndexes:
+    """In-process indexes over tables, rebuilt when the tables change.
+
+    Each index is registered with the table it is built from and a loader
+    returning a new index (or None if loading failed). start() launches a
+    worker thread that builds them all, then polls the TableVersion
+    counters every interval seconds and reloads only the indexes whose
+    table changed. Lookups never wait for it: until the first build they
+    see the empty index. A rebuilt index replaces the old one as a whole,
+    so readers never need a lock.
+    """
+
+    def __init__(self, db, interval, thread_name):
+        self.db = db
+        self.interval = interval
+        self.thread_name = thread_name
+        self.indexes = {}
+        self._sources = {}
+        self._versions = {}
+        self._refreshed_at = None
+        self._refresh_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._loaded = threading.Event()
+        self._thread = None
+
+    def register(self, name, table, loader, empty):
+        """Add an index built by loader() from table, serving empty until loaded"""
+        self.indexes[name] = empty
+        self._sources[name] = (table, loader)
+
+    def refresh(self):
+        """Reload the indexes whose table changed since they were built"""
+        with self._refresh_lock:
+            tables = sorted({table.lower() for table, _ in self._sources.values()})
+            rows = self.db.execute_query(VERSIONS_QUERY, (tables,))
+            # Without version rows (e.g. before migrations ran) every
+            # index is reloaded
+            versions = dict(rows) if rows else {}
+
+            for name, (table, loader) in self._sources.items():
+                version = versions.get(table.lower())
+                if version is not None and self._versions.get(name) == version:
+                    continue
+                try:
+                    index = loader()
+                except Exception as e:
+                    # One failing source mustn't hold back the others
+                    logger.exception("Error loading %s index %s: %s", self.thread_name, name, e)
+                    continue
+                if index is None:
+                    # Keep serving the current index; retried next refresh
+                    continue
+                self.indexes[name] = index
+                self._versions[name] = version
+                logger.info("%s index %s loaded %d entries", self.thread_name, name, len(index))
+            self._refreshed_at = time.time()
+
+    def start(self, wait=False):
+        """Start the refresh thread (no-op if running).
+
+        The thread builds the indexes first; with wait, block until that
+        first build has finished, e.g. so a server loads them before
+        taking requests.
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._loaded = threading.Event()
+                self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+                self._thread.start()
+            loaded = self._loaded
+        if wait:
+            loaded.wait()
+
+    def ensure_started(self, wait=False):
+        """Start on first use if no entry point called start(), or after a fork"""
+        if self._thread is None or not self._thread.is_alive():
+            self.start(wait)
+        elif wait:
+            self._loaded.wait()
+
+    def stop(self, timeout=None):
+        """Stop the refresh thread and wait for it to exit"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.exception("Error refreshing %s indexes: %s", self.thread_name, e)
+            self._loaded.set()
+            if self._stop.wait(self.interval):
+                return
+
+    def stats(self):
+        """Return the size and table version of each index"""
+        return {
+            "indexes": {
+                name: {"entries": len(index), "version": self._versions.get(name)}
+                for name, index in self.indexes.items()
+            },
+            "refreshed_at": self._refreshed_at,
+            "refresh_interval_seconds": self.interval
+        }
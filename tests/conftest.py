@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The backend is run from the repository root rather than installed, so
+# make its packages importable the same way
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+from flask import Blueprint, Flask, jsonify, request
+
+from asgi import FlaskASGI
+from services.async_database import translate_placeholders
+from services.async_views import ASYNC_VIEWS as REGISTERED, async_variant
+from services.http_cache import conditional
+
+items = Blueprint('items', __name__)
+
+
+@items.route('/items/<int:item_id>', methods=['GET', 'POST'])
+def get_item(item_id):
+    return jsonify({"id": item_id, "via": "sync"})
+
+
+@items.route('/tagged')
+@conditional()
+def get_tagged():
+    return jsonify({"via": "sync"})
+
+
+@items.route('/broken')
+def get_broken():
+    return jsonify({"via": "sync"})
+
+
+async def get_item_async(item_id):
+    await asyncio.sleep(0)
+    return jsonify({"id": item_id, "via": "async", "q": request.args.get('q')})
+
+
+@conditional()
+async def get_tagged_async():
+    return jsonify({"via": "async"})
+
+
+async def get_broken_async():
+    raise RuntimeError("boom")
+
+
+ASYNC_VIEWS = {
+    'items.get_item': get_item_async,
+    'items.get_tagged': get_tagged_async,
+    'items.get_broken': get_broken_async,
+}
+
+
+@pytest.fixture
+def application():
+    flask_app = Flask(__name__)
+    flask_app.register_blueprint(items)
+
+    @flask_app.after_request
+    def mark(response):
+        response.headers['X-Hooked'] = '1'
+        return response
+
+    return FlaskASGI(flask_app, async_views=ASYNC_VIEWS)
+
+
+def call(application, method, path, query=b'', headers=()):
+    """Run one HTTP request through the ASGI app; returns (status, headers, body)"""
+    scope = {
+        'type': 'http', 'method': method, 'path': path, 'root_path': '', 'query_string': query,
+        'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+        'headers': [(name.encode(), value.encode()) for name, value in headers],
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(application(scope, receive, send))
+    start = messages[0]
+    body = b''.join(message.get('body', b'') for message in messages[1:])
+    return start['status'], {k.decode().lower(): v.decode() for k, v in start['headers']}, body
+
+
+def test_async_variant_registers_by_endpoint():
+    @async_variant(items, get_item)
+    async def twin(item_id):
+        return jsonify({})
+    try:
+        assert REGISTERED['items.get_item'] is twin
+    finally:
+        del REGISTERED['items.get_item']
+
+
+def test_app_registers_twins_of_hot_views():
+    import app  # noqa: F401 (registers the blueprints)
+    assert {
+        'product_routes.get_product_details',
+        'product_routes.get_cart',
+        'vet_routes.get_vet_details',
+    } <= set(REGISTERED)
+
+
+def test_routes_to_async_twin(application):
+    assert application.async_view({'type': 'http', 'method': 'GET', 'path': '/items/3'}) is get_item_async
+    assert application.async_view({'type': 'http', 'method': 'HEAD', 'path': '/items/3'}) is get_item_async
+
+
+@pytest.mark.parametrize('method, path', [
+    ('POST', '/items/3'),
+    ('GET', '/missing'),
+    ('GET', '/items/abc'),
+    ('OPTIONS', '/items/3'),
+])
+def test_other_requests_left_to_flask(application, method, path):
+    assert application.async_view({'type': 'http', 'method': method, 'path': path}) is None
+
+
+def test_async_view_runs_with_flask_hooks(application):
+    status, headers, body = call(application, 'GET', '/items/3', b'q=dog')
+    assert status == 200
+    assert headers['x-hooked'] == '1'
+    assert headers['content-type'] == 'application/json'
+    assert b'"via":"async"' in body.replace(b' ', b'') and b'"q":"dog"' in body.replace(b' ', b'')
+
+
+def test_head_has_no_body(application):
+    status, headers, body = call(application, 'HEAD', '/items/3')
+    assert status == 200 and body == b''
+
+
+def test_conditional_async_view(application):
+    status, headers, _ = call(application, 'GET', '/tagged')
+    assert status == 200 and headers['etag']
+    status, _, body = call(application, 'GET', '/tagged', headers=[('If-None-Match', headers['etag'])])
+    assert status == 304 and body == b''
+
+
+def test_errors_become_500(application):
+    status, headers, _ = call(application, 'GET', '/broken')
+    assert status == 500
+    assert headers['x-hooked'] == '1'
+
+
+def test_post_runs_sync_view(application):
+    status, _, body = call(application, 'POST', '/items/3')
+    assert status == 200 and b'sync' in body
+
+
+@pytest.mark.parametrize('query, expected', [
+    ("SELECT 1", "SELECT 1"),
+    ("SELECT * FROM Vet WHERE City = %s AND Rating >= %s", "SELECT * FROM Vet WHERE City = $1 AND Rating >= $2"),
+    ("SELECT %s WHERE Name LIKE 'a%%'", "SELECT $1 WHERE Name LIKE 'a%'"),
+])
+def test_translate_placeholders(query, expected):
+    assert translate_placeholders(query) == expected
@@ -0,0 +1,122 @@
+import threading
+
+from services.autocomplete import Autocomplete, PrefixIndex
+
+PRODUCTS = [
+    (1, 'Premium Dog Food'),
+    (2, 'Dog Leash'),
+    (3, 'Cat Food'),
+    (4, 'dog bowl'),
+    (5, 'Bird Cage'),
+    (6, None),
+]
+
+
+def names(suggestions):
+    return [suggestion['name'] for suggestion in suggestions]
+
+
+def test_name_prefix_matches_rank_before_word_matches():
+    index = PrefixIndex(PRODUCTS)
+    assert names(index.suggest('dog')) == ['dog bowl', 'Dog Leash', 'Premium Dog Food']
+
+
+def test_matches_any_word_start():
+    index = PrefixIndex(PRODUCTS)
+    assert names(index.suggest('foo')) == ['Cat Food', 'Premium Dog Food']
+    assert names(index.suggest('dog fo')) == ['Premium Dog Food']
+
+
+def test_case_and_whitespace_insensitive():
+    index = PrefixIndex(PRODUCTS)
+    assert names(index.suggest('  PREMIUM   dog ')) == ['Premium Dog Food']
+
+
+def test_limit_and_no_duplicates():
+    index = PrefixIndex(PRODUCTS + [(7, 'Dog Dog Toy')])
+    suggestions = index.suggest('dog', limit=2)
+    assert len(suggestions) == 2
+    assert len({s['id'] for s in index.suggest('dog', limit=10)}) == len(index.suggest('dog', limit=10))
+
+
+def test_empty_prefix_and_no_match():
+    index = PrefixIndex(PRODUCTS)
+    assert index.suggest('') == []
+    assert index.suggest('zebra') == []
+    assert index.suggest('dog', limit=0) == []
+    assert len(index) == 5
+
+
+class SlowDatabase:
+    """Serves version rows at once and catalog rows once released"""
+
+    def __init__(self):
+        self.release = threading.Event()
+
+    def execute_query(self, query, params=None):
+        if 'TableVersion' in query:
+            return [('product', 1)]
+        self.release.wait(5)
+        return PRODUCTS
+
+
+def test_suggest_does_not_wait_for_the_first_build():
+    db = SlowDatabase()
+    autocomplete = Autocomplete(db, interval=60)
+    autocomplete.add_source('products', 'Product', "SELECT ProductID, Name FROM Product")
+    try:
+        assert autocomplete.suggest('products', 'dog') == []
+        db.release.set()
+        autocomplete.start(wait=True)
+        assert names(autocomplete.suggest('products', 'cat')) == ['Cat Food']
+    finally:
+        db.release.set()
+        autocomplete.stop(timeout=5)
+
+
+class FlakyDatabase:
+    """Fails (as execute_query does, with None) while down is set"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.down = False
+
+    def execute_query(self, query, params=None):
+        if self.down:
+            return None
+        if 'TableVersion' in query:
+            return []
+        if 'Breed' in query:
+            raise RuntimeError('broken loader')
+        return self.rows
+
+
+def test_failed_load_keeps_the_current_index():
+    db = FlakyDatabase(PRODUCTS)
+    autocomplete = Autocomplete(db, interval=60)
+    autocomplete.add_source('products', 'Product', "SELECT ProductID, Name FROM Product")
+    autocomplete.refresh()
+    assert names(autocomplete.indexes['products'].suggest('cat')) == ['Cat Food']
+
+    db.down = True
+    autocomplete.refresh()
+    assert names(autocomplete.indexes['products'].suggest('cat')) == ['Cat Food']
+
+
+def test_failed_first_load_serves_the_empty_index():
+    db = FlakyDatabase(PRODUCTS)
+    db.down = True
+    autocomplete = Autocomplete(db, interval=60)
+    autocomplete.add_source('products', 'Product', "SELECT ProductID, Name FROM Product")
+    autocomplete.refresh()
+    assert autocomplete.indexes['products'].suggest('cat') == []
+
+
+def test_one_failing_source_does_not_block_the_others():
+    db = FlakyDatabase(PRODUCTS)
+    autocomplete = Autocomplete(db, interval=60)
+    autocomplete.add_source('breeds', 'Breed', "SELECT BreedID, BreedName FROM Breed")
+    autocomplete.add_source('products', 'Product', "SELECT ProductID, Name FROM Product")
+    autocomplete.refresh()
+    assert len(autocomplete.indexes['breeds']) == 0
+    assert names(autocomplete.indexes['products'].suggest('cat')) == ['Cat Food']
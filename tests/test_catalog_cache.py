@@ -0,0 +1,38 @@
+from services.catalog_cache import CatalogCache
+
+
+def test_entries_follow_table_version():
+    versions = {'Breed': 1}
+    cache = CatalogCache(ttl=60, version_of=versions.get)
+    loads = []
+
+    def loader():
+        loads.append(versions['Breed'])
+        return ['row']
+
+    cache.get('Breed', 'all', loader)
+    cache.get('Breed', 'all', loader)
+    assert loads == [1]
+
+    versions['Breed'] = 2
+    cache.get('Breed', 'all', loader)
+    assert loads == [1, 2]
+
+
+def test_load_overlapping_invalidate_is_not_stored():
+    cache = CatalogCache(ttl=60)
+
+    def stale_loader():
+        # A write invalidates the table while these rows are being read
+        cache.invalidate('PetType')
+        return ['old']
+
+    assert cache.get('PetType', 'all', stale_loader) == ['old']
+    assert cache.get('PetType', 'all', lambda: ['new']) == ['new']
+    assert cache.get('PetType', 'all', lambda: ['unused']) == ['new']
+
+
+def test_empty_results_are_not_cached():
+    cache = CatalogCache(ttl=60)
+    assert cache.get('PetType', 'all', lambda: []) == []
+    assert cache.get('PetType', 'all', lambda: ['row']) == ['row']
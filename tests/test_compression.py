@@ -0,0 +1,105 @@
+import gzip
+import zlib
+
+import pytest
+from flask import Flask, Response, jsonify
+
+from services import compression
+from services.compression import CompressedBodyCache, _gzip_stream
+
+BIG = {'items': [{'id': i, 'name': f'Premium Dog Food {i}'} for i in range(200)]}
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    compression.init_app(app)
+
+    @app.route('/big')
+    def big():
+        return jsonify(BIG)
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @app.route('/stream')
+    def stream():
+        return Response((f'{i}\n' for i in range(100)), mimetype='application/x-ndjson')
+
+    return app.test_client()
+
+
+def test_gzip_when_brotli_not_accepted(client):
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data).startswith(b'{"items"')
+
+
+@pytest.mark.skipif(compression.brotli is None, reason="Brotli not installed")
+def test_brotli_preferred(client):
+    response = client.get('/big', headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert compression.brotli.decompress(response.data).startswith(b'{"items"')
+
+
+def test_quality_values_respected(client):
+    response = client.get('/big', headers={'Accept-Encoding': 'br;q=0, gzip;q=0.5'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+
+@pytest.mark.parametrize('accept', [None, 'identity', 'deflate', 'gzip;q=0'])
+def test_uncompressed_without_supported_encoding(client, accept):
+    headers = {'Accept-Encoding': accept} if accept else {}
+    response = client.get('/big', headers=headers)
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json() == BIG
+
+
+def test_small_bodies_left_alone(client):
+    response = client.get('/small', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_head_requests_left_alone(client):
+    response = client.head('/big', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_streams_gzipped(client):
+    response = client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == ''.join(f'{i}\n' for i in range(100)).encode()
+
+
+@pytest.mark.parametrize('accept', ['br', 'br, gzip;q=0', 'identity'])
+def test_streams_left_alone_without_gzip(client, accept):
+    response = client.get('/stream', headers={'Accept-Encoding': accept})
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == ''.join(f'{i}\n' for i in range(100)).encode()
+
+
+def test_gzip_stream_flushes_each_chunk():
+    decompressor = zlib.decompressobj(31)
+    for chunk, data in zip([b'first\n', b'second\n'], _gzip_stream([b'first\n', b'second\n'])):
+        assert decompressor.decompress(data) == chunk
+
+
+def test_body_cache_hits_and_bound():
+    calls = []
+
+    def compress(body):
+        calls.append(body)
+        return body[:4]
+
+    cache = CompressedBodyCache(max_bytes=8)
+    assert cache.get('gzip', b'aaaaaaaa', compress) == b'aaaa'
+    assert cache.get('gzip', b'aaaaaaaa', compress) == b'aaaa'
+    assert cache.get('br', b'aaaaaaaa', compress) == b'aaaa'
+    assert len(calls) == 2
+
+    # A third entry pushes the total over max_bytes; the oldest is evicted
+    cache.get('gzip', b'bbbbbbbb', compress)
+    assert cache.stats()['entries'] == 2
+    assert cache.stats()['bytes'] <= 8
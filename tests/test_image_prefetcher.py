@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from services.image_prefetcher import BreedImagePrefetcher
+
+
+class StubApiHandler(BaseHTTPRequestHandler):
+    """Stands in for dog.ceo (/dog) and thecatapi (/cat)"""
+
+    def do_GET(self):
+        if self.path == '/dog/breed/beagle/images/random':
+            self._reply(200, {'status': 'success', 'message': 'http://images.test/beagle.jpg'})
+        elif self.path == '/dog/breed/slowpoke/images/random':
+            time.sleep(1)
+            self._reply(200, {'status': 'success', 'message': 'http://images.test/late.jpg'})
+        elif self.path == '/cat/images/search?breed_ids=siamese':
+            self._reply(200, [{'url': 'http://images.test/siamese.jpg'}])
+        elif self.path == '/cat/images/search?breed_ids=unknown':
+            self._reply(200, [])
+        elif self.path == '/dog/breed/broken/images/random':
+            self._reply(500, {'status': 'error'})
+        else:
+            self._reply(404, {'status': 'error', 'message': 'Breed not found'})
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except OSError:
+            # The client timed out and closed the connection
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def stub_api():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubApiHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+class FakeDatabase:
+    """Serves breeds without an image and records the stored URLs"""
+
+    def __init__(self, breeds):
+        self.breeds = breeds
+        self.stored = {}
+
+    def execute_query(self, query, params=None, fetch=True):
+        if 'UPDATE Breed' in query:
+            self.stored.update(zip(*params))
+            return len(params[0])
+        excluded, limit = params
+        missing = [breed for breed in self.breeds if breed[0] not in self.stored and breed[0] not in excluded]
+        return missing[:limit]
+
+    @contextmanager
+    def transaction(self):
+        yield self
+
+
+@pytest.fixture
+def prefetcher(stub_api, monkeypatch):
+    monkeypatch.setenv('DOG_API_URL', f'{stub_api}/dog')
+    monkeypatch.setenv('CAT_API_URL', f'{stub_api}/cat/')
+
+    def make(breeds=()):
+        return BreedImagePrefetcher(FakeDatabase(list(breeds)), timeout=0.2, concurrency=2)
+    return make
+
+
+def test_resolves_from_stub_server(prefetcher):
+    worker = prefetcher()
+    assert worker.resolve('Beagle', 'Dog') == 'http://images.test/beagle.jpg'
+    assert worker.resolve('Siamese', 'Cat') == 'http://images.test/siamese.jpg'
+
+
+@pytest.mark.parametrize('breed_name, pet_type', [
+    ('broken', 'Dog'),
+    ('poodle', 'Dog'),
+    ('unknown', 'Cat'),
+    ('beagle', 'Fish'),
+])
+def test_error_responses_resolve_to_none(prefetcher, breed_name, pet_type):
+    assert prefetcher().resolve(breed_name, pet_type) is None
+
+
+def test_timeout_resolves_to_none(prefetcher):
+    worker = prefetcher()
+    started = time.monotonic()
+    assert worker.resolve('slowpoke', 'Dog') is None
+    assert time.monotonic() - started < 1
+
+
+def test_run_once_stores_resolved_and_skips_failed(prefetcher):
+    worker = prefetcher([
+        (1, 'Beagle', 'Dog'),
+        (2, 'Broken', 'Dog'),
+        (3, 'Siamese', 'Cat'),
+        (4, 'Slowpoke', 'Dog'),
+    ])
+    assert worker.run_once() == 2
+    assert worker.db.stored == {
+        1: 'http://images.test/beagle.jpg',
+        3: 'http://images.test/siamese.jpg'
+    }
+    assert set(worker._failed) == {2, 4}
+
+    # Failed breeds are left out of the next batch until retry_after
+    assert worker.run_once() == 0
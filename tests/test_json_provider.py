@@ -0,0 +1,44 @@
+import datetime
+import decimal
+import json
+
+import pytest
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from services.json_provider import FastJSONProvider
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)
+    return app
+
+
+def test_decimal_and_time_columns(app):
+    body = {'price': decimal.Decimal('12.50'), 'openingtime': datetime.time(9, 30)}
+    assert json.loads(app.json.dumps(body)) == {'price': 12.5, 'openingtime': '09:30:00'}
+
+
+def test_dates_match_flask_default(app):
+    default = DefaultJSONProvider(app)
+    body = {
+        'orderdate': datetime.datetime(2024, 2, 1, 10, 30, 5, 123456),
+        'birthdate': datetime.date(2024, 2, 1)
+    }
+    assert json.loads(app.json.dumps(body)) == json.loads(default.dumps(body))
+    assert json.loads(app.json.dumps(body))['orderdate'] == 'Thu, 01 Feb 2024 10:30:05 GMT'
+
+
+def test_integer_keys_sort_numerically(app):
+    body = {10: 'b', 2: 'a', 1: 'c'}
+    assert list(json.loads(app.json.dumps(body))) == ['1', '2', '10']
+    with app.app_context():
+        assert list(json.loads(app.json.response(body).get_data())) == ['1', '2', '10']
+
+
+def test_response_keys_sorted(app):
+    with app.app_context():
+        response = app.json.response({'b': 1, 'a': [decimal.Decimal('1.5')]})
+    assert response.get_data() == b'{"a":[1.5],"b":1}\n'
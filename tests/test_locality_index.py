@@ -0,0 +1,129 @@
+import itertools
+import random
+
+import pytest
+
+from services.locality_index import CityLookup, GridIndex, LocalityIndex, haversine_km
+
+MUMBAI = (19.076, 72.8777)
+DELHI = (28.7041, 77.1025)
+
+
+def test_haversine_km():
+    assert haversine_km(*MUMBAI, *MUMBAI) == 0
+    assert haversine_km(*MUMBAI, *DELHI) == pytest.approx(1153, abs=5)
+    assert haversine_km(*MUMBAI, *DELHI) == pytest.approx(haversine_km(*DELHI, *MUMBAI))
+
+
+def random_points(count, seed):
+    rng = random.Random(seed)
+    return [(i, rng.uniform(6, 36), rng.uniform(68, 98)) for i in range(count)]
+
+
+@pytest.mark.parametrize('cell_degrees', [0.5, 1.0, 5.0])
+@pytest.mark.parametrize('origin', [MUMBAI, DELHI, (0.0, 0.0), (50.0, 120.0)])
+def test_nearest_matches_brute_force(cell_degrees, origin):
+    points = random_points(300, seed=7)
+    index = GridIndex(points, cell_degrees)
+    expected = sorted((haversine_km(*origin, lat, lon), point_id) for point_id, lat, lon in points)
+    assert list(index.nearest(*origin)) == expected
+
+
+def test_nearest_is_lazy():
+    index = GridIndex(random_points(300, seed=3))
+    first = list(itertools.islice(index.nearest(*MUMBAI), 5))
+    distances = [distance for distance, _ in first]
+    assert distances == sorted(distances)
+    assert len(first) == 5
+
+
+def test_empty_index():
+    index = GridIndex()
+    assert list(index.nearest(*MUMBAI)) == []
+    assert index.distance(*MUMBAI, 1) is None
+
+
+def test_distance():
+    index = GridIndex([(1, *DELHI)])
+    assert index.distance(*MUMBAI, 1) == pytest.approx(haversine_km(*MUMBAI, *DELHI))
+    assert index.distance(*MUMBAI, 2) is None
+
+
+def test_city_lookup():
+    cities = CityLookup([
+        ('Mumbai', 'Maharashtra', *MUMBAI),
+        ('Aurangabad', 'Maharashtra', 19.88, 75.34),
+        ('Aurangabad', 'Bihar', 24.75, 84.37),
+        ('Chandigarh', 'Punjab', 30.73, 76.78),
+        ('Chandigarh', 'Haryana', 30.73, 76.78),
+    ])
+    assert cities.find(' mumbai ') == MUMBAI
+    assert cities.find('Aurangabad') is None
+    assert cities.find('aurangabad', 'BIHAR') == (24.75, 84.37)
+    assert cities.find('Chandigarh') == (30.73, 76.78)
+    assert cities.find('Atlantis') is None
+
+
+class FakeDatabase:
+    def execute_query(self, query, params=None):
+        if 'TableVersion' in query:
+            return []
+        if 'CityLocation' in query:
+            return [('Mumbai', 'Maharashtra', *MUMBAI)]
+        return []
+
+
+@pytest.fixture
+def locality():
+    index = LocalityIndex(FakeDatabase(), interval=60)
+    yield index
+    index.stop(timeout=5)
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('19.076,72.8777', MUMBAI),
+    (' 19.076 , 72.8777 ', MUMBAI),
+    ('Mumbai', MUMBAI),
+    ('mumbai, maharashtra', MUMBAI),
+])
+def test_parse_near(locality, value, expected):
+    assert locality.parse_near(value) == expected
+
+
+@pytest.mark.parametrize('value', ['91,0', '0,181', 'Atlantis', 'a,b,c', ''])
+def test_parse_near_rejects(locality, value):
+    with pytest.raises(ValueError):
+        locality.parse_near(value)
+
+
+class DownDatabase(FakeDatabase):
+    """Fails (as execute_query does, with None) once down is set"""
+
+    def __init__(self):
+        self.down = False
+
+    def execute_query(self, query, params=None):
+        if self.down:
+            return None
+        if 'FROM Store' in query:
+            raise RuntimeError('broken loader')
+        if 'FROM Vet' in query:
+            return [(1, *MUMBAI)]
+        return super().execute_query(query, params)
+
+
+def test_failed_load_keeps_the_current_indexes():
+    db = DownDatabase()
+    index = LocalityIndex(db, interval=60)
+    index.add_source('stores', 'Store', "SELECT StoreID, Latitude, Longitude FROM Store")
+    index.add_source('vets', 'Vet', "SELECT VetID, Latitude, Longitude FROM Vet")
+    index.refresh()
+    # The failing stores loader doesn't stop the vets from loading
+    assert len(index.indexes['stores']) == 0
+    assert len(index.indexes['vets']) == 1
+    assert index.indexes['cities'].find('Mumbai') == MUMBAI
+
+    db.down = True
+    index.refresh()
+    assert len(index.indexes['vets']) == 1
+    assert index.indexes['cities'].find('Mumbai') == MUMBAI
@@ -0,0 +1,105 @@
+import sqlite3
+
+import pytest
+
+from services.pagination import (
+    MAX_LIMIT, decode_cursor, encode_cursor, keyset_page, order_by, parse_limit, parse_page, seek_condition
+)
+
+VET_KEYS = (('Rating', True), ('Name', False), ('VetID', False))
+
+
+def test_parse_limit_defaults_when_absent():
+    assert parse_limit(None) is None
+    assert parse_limit('', 50) == 50
+
+
+def test_parse_limit_clamps_to_max():
+    assert parse_limit('10') == 10
+    assert parse_limit(str(MAX_LIMIT + 1)) == MAX_LIMIT
+
+
+@pytest.mark.parametrize('value', ['0', '-3', 'ten'])
+def test_parse_limit_rejects_bad_values(value):
+    with pytest.raises(ValueError):
+        parse_limit(value)
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor('Golden Retriever', 42, None)
+    assert '=' not in cursor
+    # Values come back as strings; PostgreSQL casts them to the key types
+    assert decode_cursor(cursor, 3) == ['Golden Retriever', '42', None]
+
+
+def test_cursor_round_trip_non_ascii():
+    assert decode_cursor(encode_cursor('Café', 1), 2) == ['Café', '1']
+
+
+@pytest.mark.parametrize('cursor', ['not a cursor!', encode_cursor('a')[:-2] + '$$', 'e30'])
+def test_decode_cursor_rejects_malformed(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, 1)
+
+
+def test_decode_cursor_rejects_wrong_size():
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor('a', 1), 3)
+
+
+def test_parse_page():
+    assert parse_page({}, 2) == (None, None)
+    assert parse_page({'limit': '5'}, 2) == (5, None)
+    cursor = encode_cursor('x', 1)
+    assert parse_page({'after': cursor}, 2) == (50, ['x', '1'])
+    assert parse_page({'cursor': cursor, 'limit': '3'}, 2) == (3, ['x', '1'])
+
+
+def test_order_by():
+    assert order_by(VET_KEYS) == 'Rating DESC, Name, VetID'
+
+
+def test_seek_condition_uses_row_comparison():
+    condition, params = seek_condition((('OrderDate', True), ('OrderID', True)), ['2024-02-01', '7'])
+    assert condition == '(OrderDate, OrderID) < (%s, %s)'
+    assert params == ['2024-02-01', '7']
+
+
+def _pg_order(row):
+    # PostgreSQL sorts NULLs first in a DESC column
+    rating, name, vet_id = row
+    return (rating is not None, -(rating or 0), name, vet_id)
+
+
+def _matching(condition, params, rows):
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE Vet (Rating REAL, Name TEXT, VetID INT)')
+    connection.executemany('INSERT INTO Vet VALUES (?, ?, ?)', rows)
+    query = 'SELECT Rating, Name, VetID FROM Vet WHERE ' + condition.replace('%s', '?')
+    return sorted(connection.execute(query, params).fetchall(), key=_pg_order)
+
+
+@pytest.mark.parametrize('rows', [
+    # Mixed sort directions, ties on the first key and NULL ratings
+    [(None, 'B', 1), (None, 'A', 2), (4.5, 'C', 3), (4.5, 'C', 4), (4.5, 'A', 5), (3.0, 'Z', 6)],
+    [(5.0, 'A', 1), (4.0, 'A', 2), (4.0, 'B', 3)],
+])
+def test_seek_condition_returns_rows_after_cursor(rows):
+    ordered = sorted(rows, key=_pg_order)
+    for i, row in enumerate(ordered):
+        condition, params = seek_condition(VET_KEYS, list(row))
+        assert _matching(condition, params, rows) == ordered[i + 1:]
+
+
+def test_keyset_page():
+    rows = [{'name': n, 'id': i} for i, n in enumerate('abc')]
+    page, cursor = keyset_page(rows, 2, ('name', 'id'))
+    assert [row['id'] for row in page] == [0, 1]
+    assert decode_cursor(cursor, 2) == ['b', '1']
+    assert keyset_page(rows, 3, ('name', 'id')) == (rows, None)
+
+
+def test_keyset_page_columnar():
+    page, cursor = keyset_page([['a', 0], ['b', 1]], 1, ('id',), columns=['name', 'id'])
+    assert page == [['a', 0]]
+    assert decode_cursor(cursor, 1) == ['0']
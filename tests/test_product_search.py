@@ -0,0 +1,55 @@
+import pytest
+
+from services.product_search import ProductSearch, to_tsquery_text
+
+
+@pytest.mark.parametrize('term, expected', [
+    ('dog', 'dog:*'),
+    ('Dog Food', 'dog & food:*'),
+    ('  dog   fo ', 'dog & fo:*'),
+    # Operators and punctuation never reach to_tsquery()
+    ("dog & !cat | (bird):*", 'dog & cat & bird:*'),
+    ("o'brien's", 'o & brien & s:*'),
+    ('dog_food', 'dog & food:*'),
+    ('Café', 'café:*'),
+])
+def test_to_tsquery_text(term, expected):
+    assert to_tsquery_text(term) == expected
+
+
+@pytest.mark.parametrize('term', ['', '   ', '!!', '&|:*'])
+def test_to_tsquery_text_without_words(term):
+    assert to_tsquery_text(term) is None
+
+
+class FakeDatabase:
+    def __init__(self, trigram):
+        self.trigram = trigram
+
+    def execute_query(self, query, params=None):
+        return [(1 if self.trigram else 0,)]
+
+
+def test_stop_words_fall_back_to_substring_match():
+    query, params = ProductSearch(FakeDatabase(trigram=False))._matches('the')
+    assert 'numnode' in query and 'ILIKE' in query
+    assert params == ['the:*', 'the:*', 'the:*', '%the%']
+
+
+def test_term_without_words_is_a_substring_match():
+    query, params = ProductSearch(FakeDatabase(trigram=False))._matches('!!')
+    assert 'to_tsquery' not in query
+    assert params == ['%!!%']
+
+
+def test_trigram_matches_similar_names():
+    query, params = ProductSearch(FakeDatabase(trigram=True))._matches('dgo')
+    assert '<%' in query
+    assert params == ['dgo:*', 'dgo', 'dgo:*', 'dgo']
+
+
+def test_filters_exclude_own_facet():
+    filters = {'category_id': 1, 'pet_type_id': 2, 'min_price': 10, 'max_price': None}
+    condition, params = ProductSearch._filters(filters, exclude='category')
+    assert 'category_id' not in condition
+    assert params == [2, 10]
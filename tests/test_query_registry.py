@@ -0,0 +1,84 @@
+import os
+
+from services.order_stats import SUMMARY_QUERIES
+from services.query_registry import QUERIES_PATH, QueryRegistry, parse_queries
+
+CONTENT = """-- Products per category
+SELECT CategoryID, COUNT(*)
+FROM Product
+GROUP BY CategoryID;
+
+
+-- -- Add a column
+-- ALTER TABLE Users
+-- ADD COLUMN State VARCHAR(100);
+
+-- Just a note, no SQL here
+
+--Stores by city
+SELECT City, COUNT(*) FROM Store GROUP BY City;
+
+-- Last query without a semicolon
+SELECT Name
+FROM Vet
+"""
+
+
+def test_descriptions_and_ids():
+    queries = parse_queries(CONTENT)
+    assert [(query_id, query['description']) for query_id, query in queries.items()] == [
+        (1, 'Products per category'),
+        (2, 'Stores by city'),
+        (3, 'Last query without a semicolon'),
+    ]
+
+
+def test_multi_line_statements_kept_whole():
+    query = parse_queries(CONTENT)[1]
+    assert query['sql'] == "SELECT CategoryID, COUNT(*)\nFROM Product\nGROUP BY CategoryID;"
+    assert query['normalized_sql'] == "SELECT CategoryID, COUNT(*)\nFROM Product\nGROUP BY CategoryID"
+    assert query['execution_sql'] == query['normalized_sql']
+
+
+def test_trailing_statement_without_semicolon():
+    query = parse_queries(CONTENT)[3]
+    assert query['sql'] == "SELECT Name\nFROM Vet"
+    assert query['normalized_sql'] == "SELECT Name\nFROM Vet"
+
+
+def test_commented_out_and_empty_sections_skipped():
+    descriptions = [query['description'] for query in parse_queries(CONTENT).values()]
+    assert not any('column' in description or 'note' in description for description in descriptions)
+
+
+def test_rewrites_replace_only_the_executed_sql():
+    plain = parse_queries(CONTENT)[2]
+    rewritten = parse_queries(CONTENT, {'Stores by city': 'SELECT 1'})[2]
+    assert rewritten['sql'] == plain['sql']
+    assert rewritten['execution_sql'] == 'SELECT 1'
+    # Different SQL is prepared under a different statement name
+    assert rewritten['statement_name'] != plain['statement_name']
+    assert rewritten['statement_name'].startswith('q2_')
+
+
+def test_queries_file_parses_and_rewrites_match_descriptions():
+    with open(QUERIES_PATH, encoding='utf-8') as file:
+        queries = parse_queries(file.read(), SUMMARY_QUERIES)
+    assert list(queries) == list(range(1, len(queries) + 1))
+    assert queries[1]['description'] == 'Total and Average revenue per store'
+    rewritten = {query['description'] for query in queries.values() if query['execution_sql'] != query['normalized_sql']}
+    assert rewritten == set(SUMMARY_QUERIES)
+
+
+def test_registry_reparses_when_the_file_changes(tmp_path):
+    path = tmp_path / 'queries.sql'
+    path.write_text(CONTENT)
+    registry = QueryRegistry(str(path))
+    assert len(registry.all()) == 3
+    assert registry.get(4) is None
+
+    path.write_text(CONTENT + "\n-- One more\nSELECT 1;\n")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert registry.get(4)['description'] == 'One more'
+    assert set(registry.all()[4]) == {'id', 'description', 'sql'}
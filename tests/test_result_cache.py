@@ -0,0 +1,131 @@
+import threading
+
+import pytest
+
+from services import result_cache
+from services.result_cache import ResultCache, parse_ttls
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, 'monotonic', clock)
+    return clock
+
+
+class Loader:
+    """Returns successive values; a refresh can be held until released"""
+
+    def __init__(self, *values):
+        self.values = list(values)
+        self.calls = 0
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self):
+        self.release.wait(5)
+        value = self.values[min(self.calls, len(self.values) - 1)]
+        self.calls += 1
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+def wait_for_refresh(cache):
+    for _ in range(500):
+        if not cache.stats()['refreshing']:
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("refresh didn't finish")
+
+
+def test_parse_ttls():
+    assert parse_ttls('1=300, 4 = 600,bad,') == {1: 300.0, 4: 600.0}
+    assert parse_ttls(None) == {}
+
+
+def test_ttl_for_uses_overrides():
+    cache = ResultCache(default_ttl=60, stale_ttl=600, ttls={3: 0})
+    assert cache.ttl_for(3) == 0
+    assert cache.ttl_for(4) == 60
+
+
+def test_fresh_hit(clock):
+    cache = ResultCache(default_ttl=60, stale_ttl=600, ttls={})
+    loader = Loader(['first'], ['second'])
+    assert cache.get(1, loader) == ['first']
+    clock.now += 59
+    assert cache.get(1, loader) == ['first']
+    assert loader.calls == 1
+    assert cache.stats()['hits'] == 1
+
+
+def test_stale_value_served_while_one_refresh_runs(clock):
+    cache = ResultCache(default_ttl=60, stale_ttl=600, ttls={})
+    loader = Loader(['first'], ['second'])
+    cache.get(1, loader)
+
+    clock.now += 61
+    loader.release.clear()
+    # Both callers get the stale value at once; only one refresh starts
+    assert cache.get(1, loader) == ['first']
+    assert cache.get(1, loader) == ['first']
+    assert cache.stats()['refreshing'] == 1
+    assert cache.stats()['stale_hits'] == 2
+
+    loader.release.set()
+    wait_for_refresh(cache)
+    assert loader.calls == 2
+    assert cache.get(1, loader) == ['second']
+
+
+def test_expired_entry_recomputed_synchronously(clock):
+    cache = ResultCache(default_ttl=60, stale_ttl=600, ttls={})
+    loader = Loader(['first'], ['second'])
+    cache.get(1, loader)
+
+    clock.now += 661
+    assert cache.get(1, loader) == ['second']
+    assert cache.stats()['misses'] == 2
+    assert cache.stats()['refreshing'] == 0
+
+
+def test_failed_refresh_keeps_the_stale_value(clock):
+    cache = ResultCache(default_ttl=60, stale_ttl=600, ttls={})
+    loader = Loader(['first'], RuntimeError('database down'), ['third'])
+    cache.get(1, loader)
+
+    clock.now += 61
+    assert cache.get(1, loader) == ['first']
+    wait_for_refresh(cache)
+    assert loader.calls == 2
+
+    # The entry is still stale, so the next caller starts another refresh
+    assert cache.get(1, loader) == ['first']
+    wait_for_refresh(cache)
+    assert cache.get(1, loader) == ['third']
+
+
+def test_empty_results_not_cached(clock):
+    cache = ResultCache(default_ttl=60, stale_ttl=600, ttls={})
+    loader = Loader([], ['rows'])
+    assert cache.get(1, loader) == []
+    assert cache.get(1, loader) == ['rows']
+
+
+def test_zero_ttl_bypasses_cache_and_invalidate(clock):
+    cache = ResultCache(default_ttl=60, stale_ttl=600, ttls={})
+    loader = Loader(['first'], ['second'], ['third'])
+    assert cache.get(1, loader, ttl=0) == ['first']
+    assert cache.get(1, loader) == ['second']
+    cache.invalidate(1)
+    assert cache.get(1, loader) == ['third']
+    assert cache.stats()['entries'] == 1
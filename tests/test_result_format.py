@@ -0,0 +1,21 @@
+import pytest
+from flask import Flask
+
+from services.result_format import COMPACT_MIMETYPE, wants_compact
+
+app = Flask(__name__)
+
+
+@pytest.mark.parametrize('path, headers, expected', [
+    ('/', {}, False),
+    ('/?format=compact', {}, True),
+    ('/?format=COMPACT', {}, True),
+    ('/?format=json', {}, False),
+    ('/', {'Accept': COMPACT_MIMETYPE}, True),
+    ('/', {'Accept': f'{COMPACT_MIMETYPE}, application/json;q=0.5'}, True),
+    ('/', {'Accept': f'application/json, {COMPACT_MIMETYPE};q=0.5'}, False),
+    ('/', {'Accept': '*/*'}, False),
+])
+def test_wants_compact(path, headers, expected):
+    with app.test_request_context(path, headers=headers):
+        assert wants_compact() is expected
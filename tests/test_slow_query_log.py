@@ -0,0 +1,80 @@
+import threading
+
+import pytest
+
+from services.order_service import LOCK_STOCK_QUERY, RESERVE_STOCK_QUERY
+from services.order_stats import MOVE_ORDER_QUERY, RECORD_ORDER_QUERY
+from services.slow_query_log import SlowQueryLog, is_explainable, normalize_sql, params_shape
+
+
+@pytest.mark.parametrize('query', [
+    "SELECT * FROM Product WHERE ProductID = %s",
+    "  select Name from Vet",
+    "WITH ranked AS (SELECT StoreID FROM Store) SELECT * FROM ranked",
+    "SELECT * FROM Orders WHERE Status = 'Pending'",
+])
+def test_plain_reads_are_explainable(query):
+    assert is_explainable(query)
+
+
+@pytest.mark.parametrize('query', [
+    "INSERT INTO Cart (Username, ProductID, Quantity) VALUES (%s, %s, %s)",
+    "UPDATE Orders SET Status = %s WHERE OrderID = %s",
+    "DELETE FROM Cart WHERE CartID = %s",
+    "WITH moved AS (UPDATE Supplies SET Quantity = Quantity - 1 RETURNING *) SELECT * FROM moved",
+    "WITH gone AS (DELETE FROM Cart RETURNING *) SELECT count(*) FROM gone",
+    "with added as (insert into Orders (Username) values (%s) returning OrderID) select * from added",
+    "SELECT * FROM Supplies WHERE StoreID = %s FOR UPDATE",
+    "SELECT * FROM Supplies WHERE StoreID = %s FOR NO KEY UPDATE",
+    "SELECT * FROM Supplies WHERE StoreID = %s\nFOR   SHARE",
+    "SELECT * FROM Supplies WHERE StoreID = %s FOR KEY SHARE",
+    "SELECT * INTO report_copy FROM Orders",
+    "SELECT nextval('orders_orderid_seq')",
+    "MERGE INTO Cart c USING Product p ON c.ProductID = p.ProductID WHEN MATCHED THEN DELETE",
+    "CREATE TABLE t AS SELECT 1",
+    "EXPLAIN ANALYZE SELECT 1",
+    "",
+    "   ",
+])
+def test_writes_and_locks_are_never_explained(query):
+    assert not is_explainable(query)
+
+
+@pytest.mark.parametrize('query', [LOCK_STOCK_QUERY, RESERVE_STOCK_QUERY, RECORD_ORDER_QUERY, MOVE_ORDER_QUERY])
+def test_checkout_statements_are_never_explained(query):
+    assert not is_explainable(query)
+
+
+def test_normalize_sql():
+    assert normalize_sql("SELECT *\n  FROM Vet\tWHERE Rating >= 4.5 AND City = 'O''Hare'  LIMIT 10") == \
+        "SELECT * FROM Vet WHERE Rating >= ? AND City = ? LIMIT ?"
+    # Placeholders and identifiers with digits are kept
+    assert normalize_sql("SELECT q1 FROM t2 WHERE a = %s") == "SELECT q1 FROM t2 WHERE a = %s"
+
+
+def test_params_shape_hides_values():
+    assert params_shape(None) is None
+    assert params_shape(('alice', 3, 4.5, None)) == ['str', 'int', 'float', None]
+    assert params_shape({'order_id': 7, 'status': 'Shipped'}) == {'order_id': 'int', 'status': 'str'}
+    assert params_shape(('alice', list(range(50)))) == ['str', 'list[50]']
+    assert params_shape([[1, 2]]) == [['int', 'int']]
+
+
+def test_only_sampled_reads_are_explained():
+    log = SlowQueryLog(threshold_ms=10, size=5, explain_rate=1)
+    explained = []
+    done = threading.Event()
+
+    def explain(query, params):
+        explained.append(query)
+        done.set()
+        return 'plan'
+
+    log.record("UPDATE Orders SET Status = %s", ('Shipped',), 0.5, explain=explain)
+    log.record("SELECT 1", None, 0.001, explain=explain)
+    assert len(log.entries()) == 1
+    assert not explained
+
+    log.record("SELECT * FROM Orders", None, 0.5, explain=explain)
+    assert done.wait(5)
+    assert explained == ["SELECT * FROM Orders"]